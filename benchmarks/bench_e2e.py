@@ -0,0 +1,262 @@
+"""
+End-to-end benchmark on a synthetic corpus against a local fake OpenAI server.
+
+    python benchmarks/bench_e2e.py --scenarios parse,ingest,query,chat --concurrency 1,4,16 \\
+        --output bench_results/$(git rev-parse --short HEAD).json
+
+Each run works in a fresh directory (--workdir, default a temp dir): it generates a
+corpus (make_corpus.py), starts the fake server (fake_openai.py) unless --base-url is
+given, and points the OpenAI client, parsed-data folders, caches and vector store there.
+Caches start empty, so parse and ingest are cold runs.
+
+Scenarios:
+    parse   main.parse_source_docs on the corpus (PDF tables go through the fake LLM)
+    ingest  DataIngestor.run, full rebuild
+    query   ChromaManager.query with precomputed embeddings, per concurrency level
+    chat    full turns through RAGPipeline.stream (route, embed, retrieve, generate),
+            per concurrency level, with time to first token
+
+Prints one JSON document: throughput and p50/p95/p99 latency (ms) per scenario and
+concurrency level, the configuration and the fake server's request counts.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+from fake_openai import FakeOpenAIConfig, start_server  # noqa: E402
+from make_corpus import PLANS, SERVICES, make_corpus  # noqa: E402
+
+SCENARIOS = ("parse", "ingest", "query", "chat")
+
+
+def summarize(latencies, wall_s, **extra):
+    """Wall time, plus throughput and latency percentiles when per-call latencies are given."""
+    result = {"wall_s": round(wall_s, 3)}
+    if latencies:
+        ms = np.asarray(latencies, dtype=np.float64) * 1000
+        result.update({"n": len(latencies), "throughput_per_s": round(len(latencies) / wall_s, 2)})
+        result.update({f"p{q}_ms": round(float(np.percentile(ms, q)), 2) for q in (50, 95, 99)})
+        result["mean_ms"] = round(float(ms.mean()), 2)
+    result.update(extra)
+    return result
+
+
+def run_concurrently(fn, items, concurrency):
+    """Call fn(item) for every item on `concurrency` threads. Returns (per-call results, wall seconds)."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(fn, items))
+    return results, time.perf_counter() - start
+
+
+def make_questions(n, faq_path, seed=0):
+    rng = random.Random(seed)
+    with open(faq_path, encoding="utf-8") as f:
+        faq_questions = [item["question"] for item in json.load(f)]
+    questions = []
+    for i in range(n):
+        if i % 2 and faq_questions:
+            questions.append(rng.choice(faq_questions))
+        else:
+            questions.append(f"What do I pay for {rng.choice(SERVICES)} on the {rng.choice(PLANS)} plan?")
+    # Distinct texts, so the query and retrieval caches don't turn later calls into hits.
+    return [f"{q} ({i})" for i, q in enumerate(questions)]
+
+
+def configure_environment(workdir, base_url, source_dir, faq_dir, args):
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": os.environ.get("BENCH_OPENAI_API_KEY", "fake"),
+        "MODEL": args.model,
+        "EMBED_MODEL": args.embed_model,
+        "SOURCE_DOCS_DIR": source_dir,
+        "OUTPUT_DIR_PDF_TEXT": "static/parsed_data/pdf_text",
+        "OUTPUT_DIR_PDF_TABLE": "static/parsed_data/pdf_table",
+        "OUTPUT_DIR_DOCX_TEXT": "static/parsed_data/docx",
+        "OUTPUT_DIR_SCRAPED_JSON": faq_dir,
+        "CHROMA_COLLECTION_NAME": "bench",
+        "VECTOR_BACKEND": args.backend,
+        "PARSE_MANIFEST_PATH": "static/parsed_data/manifest.json",
+        "EMBED_CACHE_PATH": "cache/embeddings.sqlite",
+        "TABLE_CACHE_PATH": "cache/tables.sqlite",
+    })
+    for folder in ("static/parsed_data/pdf_text", "static/parsed_data/pdf_table", "static/parsed_data/docx", "cache"):
+        os.makedirs(os.path.join(workdir, folder), exist_ok=True)
+    os.chdir(workdir)
+
+
+def bench_parse(source_dir):
+    import main
+    start = time.perf_counter()
+    results = main.parse_source_docs(source_dir)
+    wall = time.perf_counter() - start
+    ok = sum(status == "ok" for status, _ in results.values())
+    return [summarize([], wall, files=len(results), files_ok=ok,
+                      files_per_s=round(len(results) / wall, 3) if wall else None)]
+
+
+def bench_ingest():
+    from src.embeddings import DataIngestor
+    ingestor = DataIngestor(
+        pdf_dir=os.environ["OUTPUT_DIR_PDF_TEXT"],
+        table_dir=os.environ["OUTPUT_DIR_PDF_TABLE"],
+        docx_dir=os.environ["OUTPUT_DIR_DOCX_TEXT"],
+        faq_dir=os.environ["OUTPUT_DIR_SCRAPED_JSON"],
+    )
+    start = time.perf_counter()
+    ingestor.run(incremental=False)
+    wall = time.perf_counter() - start
+    chunks = len(ingestor.chroma_manager.get_existing_ids())
+    return [summarize([], wall, chunks=chunks, chunks_per_s=round(chunks / wall, 1) if wall else None)]
+
+
+def bench_query(questions, levels, k):
+    from src.chroma_manager import ChromaManager
+    from src.embeddings import Embedder
+    embeddings = Embedder().embed_user_queries(questions)
+    manager = ChromaManager()
+    manager.query([embeddings[0]], k, query_text=questions[0])  # load the store and BM25 index
+    results = []
+    for concurrency in levels:
+        manager.retrieval_cache.clear()
+
+        def one(i):
+            start = time.perf_counter()
+            manager.query([embeddings[i]], k, query_text=questions[i])
+            return time.perf_counter() - start
+
+        latencies, wall = run_concurrently(one, range(len(questions)), concurrency)
+        results.append(summarize(latencies, wall, concurrency=concurrency, k=k))
+    return results
+
+
+def bench_chat(questions, levels, k):
+    from src.pipeline import RAGPipeline
+    pipeline = RAGPipeline(k=k)
+    pipeline.prepare(questions[0], k)  # load the store, BM25 index and centroids
+    results = []
+    for concurrency in levels:
+        pipeline.embedder.query_cache.clear()
+        pipeline.chroma_manager.retrieval_cache.clear()
+
+        def one(question):
+            start = time.perf_counter()
+            first = None
+            for _ in pipeline.stream(question, k):
+                if first is None:
+                    first = time.perf_counter()
+            end = time.perf_counter()
+            return end - start, (first or end) - start
+
+        timings, wall = run_concurrently(one, questions, concurrency)
+        ttft = np.asarray([t for _, t in timings]) * 1000
+        results.append(summarize(
+            [total for total, _ in timings], wall, concurrency=concurrency, k=k,
+            ttft_p50_ms=round(float(np.percentile(ttft, 50)), 2),
+            ttft_p95_ms=round(float(np.percentile(ttft, 95)), 2),
+            ttft_p99_ms=round(float(np.percentile(ttft, 99)), 2),
+        ))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {sorted(unknown)} (choose from {', '.join(SCENARIOS)})")
+    levels = [int(c) for c in args.concurrency.split(",")]
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="rag_bench_"))
+    os.makedirs(workdir, exist_ok=True)
+
+    source_dir, faq_dir = make_corpus(
+        os.path.join(workdir, "corpus"), args.pdfs, args.pages, args.docx, args.faqs, args.seed
+    )
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server, base_url = start_server(FakeOpenAIConfig(
+            args.embed_latency_ms, args.embed_item_ms, args.chat_latency_ms, args.token_ms,
+            args.rate_limit, dimensions=args.dimensions, seed=args.seed
+        ))
+    configure_environment(workdir, base_url, source_dir, faq_dir, args)
+    questions = make_questions(args.queries, os.path.join(faq_dir, "angelone_faqs.json"), args.seed)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output",)},
+        "workdir": workdir,
+        "results": {},
+    }
+    # Each stage needs the previous stage's output, so parse (and ingest) always run.
+    parse = bench_parse(source_dir)
+    if "parse" in scenarios:
+        report["results"]["parse"] = parse
+    if set(scenarios) - {"parse"}:
+        ingest = bench_ingest()
+        if "ingest" in scenarios:
+            report["results"]["ingest"] = ingest
+    if "query" in scenarios:
+        report["results"]["query"] = bench_query(questions, levels, args.k)
+    if "chat" in scenarios:
+        report["results"]["chat"] = bench_chat(questions, levels, args.k)
+    if server is not None:
+        report["fake_server"] = dict(server.config.counts)
+        server.shutdown()
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks against a fake OpenAI server")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated levels for query and chat")
+    parser.add_argument("--queries", type=int, default=64, help="queries per concurrency level")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--backend", default=os.environ.get('VECTOR_BACKEND', 'chroma'))
+    parser.add_argument("--workdir", default=None, help="default: a new temp directory")
+    parser.add_argument("--output", default=None, help="also write the JSON report here")
+    parser.add_argument("--seed", type=int, default=0)
+    corpus = parser.add_argument_group("corpus")
+    corpus.add_argument("--pdfs", type=int, default=4)
+    corpus.add_argument("--pages", type=int, default=8)
+    corpus.add_argument("--docx", type=int, default=2)
+    corpus.add_argument("--faqs", type=int, default=300)
+    fake = parser.add_argument_group("fake OpenAI server")
+    fake.add_argument("--base-url", default=None, help="use an already running server instead")
+    fake.add_argument("--model", default="fake-chat")
+    fake.add_argument("--embed-model", default="fake-embedding")
+    fake.add_argument("--embed-latency-ms", type=float, default=50.0)
+    fake.add_argument("--embed-item-ms", type=float, default=0.5)
+    fake.add_argument("--chat-latency-ms", type=float, default=300.0)
+    fake.add_argument("--token-ms", type=float, default=10.0)
+    fake.add_argument("--rate-limit", type=float, default=0.0, help="fraction of requests answered with 429")
+    fake.add_argument("--dimensions", type=int, default=256)
+    main(parser.parse_args())
@@ -0,0 +1,95 @@
+"""
+Compare per-page parse CPU of the crawler's HTML extraction on saved pages.
+
+    python benchmarks/bench_html_extract.py --pages benchmarks/fixtures/*.html --repeat 50
+
+"legacy" is the crawler's previous approach: an html.parser BeautifulSoup tree, CSS
+selectors for the FAQ tabs and four sidebar selectors plus a second walk over all
+anchors, each resolving and validating every href. The other rows are the single-pass
+extractors from src/html_extract.py. Every backend's output is checked against legacy
+before timing. Prints JSON.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from urllib.parse import urljoin, urldefrag
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.crawlers import AngelOneFAQCrawler  # noqa: E402
+from src.html_extract import EXTRACTORS, clean_text  # noqa: E402
+
+PAGE_URL = "https://www.angelone.in/support/funds/add-funds"
+
+
+def legacy_extract(html, crawler, url):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    cat = soup.select_one(".active-tax-title") or soup.select_one("h1") or soup.select_one("h2")
+    category = clean_text(cat.text) if cat else ""
+    faqs = []
+    for tab in soup.select('.faqlist .tab'):
+        qelem = tab.select_one('.tab-label span')
+        aelem = tab.select_one('.tab-content .content')
+        if qelem and aelem:
+            faqs.append((clean_text(qelem.text), aelem.get_text(separator='\n', strip=True)))
+
+    def resolve(href):
+        full_url = urldefrag(urljoin(url, href))[0] if href else None
+        if full_url and crawler._is_valid_link(full_url):
+            return full_url
+        return None
+
+    links = set()
+    for sel in ["div.sidebar-section a", "div.list-item ul.vertical.tabs a", "div.shg-search a", "li a"]:
+        links.update(filter(None, (resolve(a.get("href")) for a in soup.select(sel))))
+    links.update(filter(None, (resolve(a.get("href")) for a in soup.find_all("a", href=True))))
+    return category, faqs, sorted(links)
+
+
+def extract(extractor, html, crawler, url):
+    page = extractor.extract(html)
+    return page.category, page.faqs, crawler._page_links(page, url)
+
+
+def time_per_page(fn, pages, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        for html in pages:
+            fn(html)
+    return (time.process_time() - start) / (repeat * len(pages)) * 1000
+
+
+if __name__ == "__main__":
+    default_pages = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "*.html")
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--pages", nargs="+", default=[default_pages], help="Saved HTML pages (globs allowed)")
+    arg_parser.add_argument("--repeat", type=int, default=50)
+    arg_parser.add_argument("--backends", nargs="+", default=sorted(EXTRACTORS))
+    args = arg_parser.parse_args()
+
+    paths = sorted({p for pattern in args.pages for p in glob.glob(pattern)})
+    pages = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append(f.read())
+    if not pages:
+        sys.exit(f"No pages matched {args.pages}")
+
+    crawler = AngelOneFAQCrawler()
+    expected = [legacy_extract(html, crawler, PAGE_URL) for html in pages]
+    results = [{
+        "backend": "legacy",
+        "cpu_ms_per_page": time_per_page(lambda html: legacy_extract(html, crawler, PAGE_URL), pages, args.repeat),
+    }]
+    for name in args.backends:
+        extractor = EXTRACTORS[name]()
+        matches = all(extract(extractor, html, crawler, PAGE_URL) == exp for html, exp in zip(pages, expected))
+        results.append({
+            "backend": name,
+            "matches_legacy": matches,
+            "cpu_ms_per_page": time_per_page(lambda html: extract(extractor, html, crawler, PAGE_URL), pages, args.repeat),
+        })
+    print(json.dumps({"pages": len(pages), "repeat": args.repeat, "results": results}, indent=2))
@@ -0,0 +1,83 @@
+"""
+Compare vector storage backends on a synthetic corpus.
+
+    python benchmarks/bench_vector_store.py --n 5000 --dim 1536 --queries 200
+
+For each backend: ingest time, load time (open the store and answer the first query),
+and p50/p99 latency for single and batched queries. Prints JSON.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.chroma_manager import make_backend  # noqa: E402
+
+
+def percentile(samples, q):
+    return float(np.percentile(np.asarray(samples) * 1000, q))
+
+
+def bench_backend(name, vectors, queries, k, batch_size):
+    with tempfile.TemporaryDirectory() as tmp:
+        n = len(vectors)
+        ids = [f"chunk-{i}" for i in range(n)]
+        docs = [f"document {i}" for i in range(n)]
+        metas = [{"source": ("text", "table", "faq")[i % 3], "chunk_id": i} for i in range(n)]
+
+        store = make_backend(name, "bench", tmp)
+        start = time.perf_counter()
+        for i in range(0, n, 5000):
+            store.upsert(ids[i:i + 5000], docs[i:i + 5000], metas[i:i + 5000], vectors[i:i + 5000].tolist())
+        ingest_s = time.perf_counter() - start
+        del store
+
+        start = time.perf_counter()
+        store = make_backend(name, "bench", tmp)
+        store.query([queries[0].tolist()], k)
+        load_s = time.perf_counter() - start
+
+        single = []
+        for q in queries:
+            t = time.perf_counter()
+            store.query([q.tolist()], k)
+            single.append(time.perf_counter() - t)
+
+        batched = []
+        for i in range(0, len(queries), batch_size):
+            batch = queries[i:i + batch_size].tolist()
+            t = time.perf_counter()
+            store.query(batch, k)
+            batched.append((time.perf_counter() - t) / len(batch))
+
+        return {
+            "backend": name,
+            "ingest_s": ingest_s,
+            "load_s": load_s,
+            "query_p50_ms": percentile(single, 50),
+            "query_p99_ms": percentile(single, 99),
+            "batched_per_query_p50_ms": percentile(batched, 50),
+            "batched_per_query_p99_ms": percentile(batched, 99),
+        }
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--n", type=int, default=5000, help="Number of stored vectors")
+    arg_parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension")
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--batch", type=int, default=32, help="Queries per batched call")
+    arg_parser.add_argument("-k", type=int, default=10)
+    arg_parser.add_argument("--backends", nargs="+", default=["chroma", "numpy"])
+    args = arg_parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(args.n, args.dim)).astype(np.float32)
+    queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    results = [bench_backend(name, vectors, queries, args.k, args.batch) for name in args.backends]
+    print(json.dumps({"n": args.n, "dim": args.dim, "k": args.k, "results": results}, indent=2))
@@ -0,0 +1,197 @@
+"""
+Local stand-in for the OpenAI embeddings and chat completions endpoints, for benchmarks.
+
+    python benchmarks/fake_openai.py --port 8765 --embed-latency-ms 80 --chat-latency-ms 400 --rate-limit 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python cmd_chat.py
+
+Embeddings are deterministic hashed bag-of-words vectors, so texts sharing words are
+near each other and retrieval behaves plausibly. Chat answers echo a fixed sentence
+(streamed word by word when stream=true); table-structuring prompts get the input
+table back as CSV, so parsing produces realistic files. Latency is a fixed cost per
+request plus a cost per embedded text or streamed token. A fraction of requests can be
+answered with 429 and a Retry-After header. Standard library only.
+"""
+import re
+import sys
+import json
+import time
+import zlib
+import base64
+import random
+import argparse
+import threading
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORD_RE = re.compile(r"\w+")
+ANSWER = ("Based on the provided information, the charge depends on the plan and the "
+          "service, as listed in the plan summary [S1].")
+
+
+class FakeOpenAIConfig:
+    def __init__(self, embed_latency_ms=50.0, embed_item_ms=0.5, chat_latency_ms=300.0, token_ms=10.0,
+                 rate_limit=0.0, retry_after=0.5, dimensions=256, seed=0):
+        self.embed_latency_ms = embed_latency_ms
+        self.embed_item_ms = embed_item_ms
+        self.chat_latency_ms = chat_latency_ms
+        self.token_ms = token_ms
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.dimensions = dimensions
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"embeddings": 0, "embedded_texts": 0, "chat": 0, "rate_limited": 0}
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.counts[key] += n
+
+    def should_rate_limit(self) -> bool:
+        with self.lock:
+            return self.rate_limit > 0 and self.random.random() < self.rate_limit
+
+
+def fake_embedding(text: str, dimensions: int):
+    """Unit-length hashed bag-of-words vector."""
+    vector = [0.0] * dimensions
+    for word in WORD_RE.findall(text.lower()):
+        h = zlib.crc32(word.encode("utf-8"))
+        vector[h % dimensions] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+def table_to_csv(prompt: str) -> str:
+    """The markdown table in a table-structuring prompt, as CSV with a filename column."""
+    names = re.findall(r"filename:\s*(\S+)", prompt)
+    file_name = names[-1] if names else ""
+    rows = []
+    for line in prompt.splitlines():
+        line = line.strip()
+        if line.startswith("|") and not re.fullmatch(r"[|:\-\s]+", line):
+            rows.append([cell.strip().replace('"', "'") for cell in line.strip("|").split("|")])
+    if not rows:
+        return "value,filename\n"
+    rows[0] = [cell or f"column_{i}" for i, cell in enumerate(rows[0], start=1)]
+    lines = [",".join(f'"{c}"' for c in rows[0] + ["filename"])]
+    lines += [",".join(f'"{c}"' for c in row + [file_name]) for row in rows[1:]]
+    return "\n".join(lines) + "\n"
+
+
+def make_handler(config: FakeOpenAIConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if config.should_rate_limit():
+                config.count("rate_limited")
+                return self._json(429, {"error": {"message": "Rate limit reached (fake)", "type": "requests",
+                                                  "code": "rate_limit_exceeded"}},
+                                  {"Retry-After": str(config.retry_after)})
+            if self.path.endswith("/embeddings"):
+                return self._embeddings(body)
+            if self.path.endswith("/chat/completions"):
+                return self._chat(body)
+            self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+        def _embeddings(self, body):
+            texts = body.get("input")
+            texts = [texts] if isinstance(texts, str) else texts
+            config.count("embeddings")
+            config.count("embedded_texts", len(texts))
+            time.sleep((config.embed_latency_ms + config.embed_item_ms * len(texts)) / 1000)
+            dimensions = body.get("dimensions") or config.dimensions
+            data = []
+            for i, text in enumerate(texts):
+                vector = fake_embedding(text, dimensions)
+                if body.get("encoding_format") == "base64":
+                    vector = base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+                data.append({"object": "embedding", "index": i, "embedding": vector})
+            tokens = sum(len(WORD_RE.findall(t)) for t in texts)
+            self._json(200, {"object": "list", "data": data, "model": body.get("model") or "fake-embedding",
+                             "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+        def _chat(self, body):
+            config.count("chat")
+            messages = body.get("messages") or []
+            system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+            prompt = "\n".join(m.get("content", "") for m in messages)
+            answer = table_to_csv(prompt) if "cleaning tabular data" in system else ANSWER
+            prompt_tokens = len(WORD_RE.findall(prompt))
+            pieces = re.findall(r"\S+\s*", answer)
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces),
+                     "total_tokens": prompt_tokens + len(pieces)}
+            base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model") or "fake-chat"}
+            time.sleep(config.chat_latency_ms / 1000)
+            if not body.get("stream"):
+                time.sleep(config.token_ms * len(pieces) / 1000)
+                return self._json(200, {**base, "object": "chat.completion", "usage": usage, "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}]})
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            chunk = {**base, "object": "chat.completion.chunk"}
+            for piece in pieces:
+                time.sleep(config.token_ms / 1000)
+                self._event({**chunk, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+            self._event({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (body.get("stream_options") or {}).get("include_usage"):
+                self._event({**chunk, "choices": [], "usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def _event(self, payload):
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_server(config: FakeOpenAIConfig = None, host: str = "127.0.0.1", port: int = 0):
+    """Run the fake server on a background thread. Returns (server, base_url)."""
+    config = config or FakeOpenAIConfig()
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI embeddings/chat server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0)
+    parser.add_argument("--embed-item-ms", type=float, default=0.5, help="extra latency per embedded text")
+    parser.add_argument("--chat-latency-ms", type=float, default=300.0, help="time to first token")
+    parser.add_argument("--token-ms", type=float, default=10.0, help="latency per generated token")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--dimensions", type=int, default=256)
+    args = parser.parse_args()
+
+    server, base_url = start_server(FakeOpenAIConfig(
+        args.embed_latency_ms, args.embed_item_ms, args.chat_latency_ms, args.token_ms,
+        args.rate_limit, dimensions=args.dimensions
+    ), args.host, args.port)
+    print(f"Fake OpenAI API at {base_url}", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
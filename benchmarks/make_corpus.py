@@ -0,0 +1,218 @@
+"""
+Generate a synthetic corpus shaped like the real inputs, for benchmarks.
+
+    python benchmarks/make_corpus.py --out /tmp/corpus --pdfs 4 --pages 8 --docx 2 --faqs 300
+
+Writes <out>/source_docs/*.pdf (multi-page plan documents with a ruled benefits
+table on every page), <out>/source_docs/*.docx and <out>/scraped_data/angelone_faqs.json.
+The PDF and DOCX files are written directly (standard library only), so generating a
+corpus needs none of the parsing dependencies.
+"""
+import os
+import json
+import random
+import hashlib
+import zipfile
+import argparse
+from xml.sax.saxutils import escape
+
+PLANS = ["2500 Gold", "5000 HSA", "5000 Bronze", "7350 Copper", "1500 Platinum", "4000 Silver"]
+SERVICES = [
+    "primary care visit", "specialist visit", "urgent care", "emergency room", "X-ray",
+    "diagnostic test", "outpatient surgery", "generic drugs", "preferred brand drugs",
+    "prenatal care", "hospital stay", "mental health visit", "physical therapy",
+]
+TOPICS = {
+    "Funds": ["add funds", "withdraw funds", "payout", "UPI mandate", "bank account"],
+    "Orders": ["order rejection", "cancelled order", "GTT order", "AMO order", "bracket order"],
+    "Account": ["KYC", "nominee", "account closure", "segment activation", "password reset"],
+    "Charges": ["brokerage", "DP charges", "call and trade", "AMC", "pledge charges"],
+    "Dividends": ["dividend credit", "record date", "corporate action", "bonus shares", "stock split"],
+}
+
+
+def plan_sentence(rng: random.Random, plan: str) -> str:
+    service = rng.choice(SERVICES)
+    return rng.choice([
+        f"Under the {plan} plan a {service} costs ${rng.randint(1, 40) * 5} copay after the deductible.",
+        f"The {plan} plan covers {service} at {rng.choice([10, 20, 30, 40])}% coinsurance.",
+        f"Prior authorization is required for {service} under the {plan} plan.",
+        f"The out-of-pocket limit for the {plan} plan is ${rng.randint(20, 90) * 100} per person.",
+        f"Coverage for {service} is limited to {rng.randint(10, 60)} visits per year.",
+        f"You will pay less if you use a network provider for {service}.",
+    ])
+
+
+def benefit_rows(rng: random.Random, plan: str, n: int):
+    rows = [["Service", "In-network", "Out-of-network", "Limitations"]]
+    for service in rng.sample(SERVICES, n):
+        rows.append([
+            service.capitalize(),
+            f"${rng.randint(1, 30) * 5} copay",
+            f"{rng.choice([30, 40, 50])}% coinsurance",
+            rng.choice(["None", "Prior auth", f"{rng.randint(10, 60)} visits/yr", "Deductible applies"]),
+        ])
+    return rows
+
+
+# ---- PDF -----------------------------------------------------------------------------
+
+def _pdf_text(x: float, y: float, size: int, text: str) -> str:
+    text = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return f"BT /F1 {size} Tf {x:.1f} {y:.1f} Td ({text}) Tj ET\n"
+
+
+def _wrap(text: str, width: int = 95):
+    line = ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            yield line
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    if line:
+        yield line
+
+
+def pdf_page_stream(rng: random.Random, plan: str, page: int) -> str:
+    out = [_pdf_text(50, 800, 14, f"{plan} plan - Summary of Benefits, page {page}")]
+    y = 775
+    for _ in range(3):
+        paragraph = " ".join(plan_sentence(rng, plan) for _ in range(rng.randint(3, 5)))
+        for line in _wrap(paragraph):
+            out.append(_pdf_text(50, y, 9, line))
+            y -= 12
+        y -= 8
+    # Ruled table: pdfplumber's default "lines" strategy needs the grid drawn.
+    rows = benefit_rows(rng, plan, rng.randint(4, 8))
+    col_x = [50, 200, 300, 410, 545]
+    row_h, top = 18, y - 10
+    bottom = top - row_h * len(rows)
+    out.append("0.5 w\n")
+    for i in range(len(rows) + 1):
+        out.append(f"{col_x[0]} {top - i * row_h} m {col_x[-1]} {top - i * row_h} l S\n")
+    for x in col_x:
+        out.append(f"{x} {top} m {x} {bottom} l S\n")
+    for r, row in enumerate(rows):
+        for c, cell in enumerate(row):
+            out.append(_pdf_text(col_x[c] + 3, top - (r + 1) * row_h + 5, 8, cell))
+    return "".join(out)
+
+
+def write_pdf(path: str, page_streams):
+    """Minimal PDF 1.4 writer: one Helvetica font, one content stream per page."""
+    n = len(page_streams)
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(" ".join(f"{4 + 2 * i} 0 R" for i in range(n)), n),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    for i, stream in enumerate(page_streams):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>")
+        data = stream.encode("latin-1", "replace").decode("latin-1")
+        objects.append(f"<< /Length {len(data.encode('latin-1'))} >>\nstream\n{data}endstream")
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+# ---- DOCX ----------------------------------------------------------------------------
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+</Types>"""
+_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+_W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+
+def write_docx(path: str, paragraphs, table):
+    body = "".join(f"<w:p><w:r><w:t xml:space=\"preserve\">{escape(p)}</w:t></w:r></w:p>" for p in paragraphs)
+    body += "<w:tbl>" + "".join(
+        "<w:tr>" + "".join(f"<w:tc><w:p><w:r><w:t>{escape(cell)}</w:t></w:r></w:p></w:tc>" for cell in row) + "</w:tr>"
+        for row in table
+    ) + "</w:tbl>"
+    document = f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:document xmlns:w="{_W}"><w:body>{body}</w:body></w:document>'
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        z.writestr("_rels/.rels", _RELS)
+        z.writestr("word/document.xml", document)
+
+
+# ---- FAQ JSON ------------------------------------------------------------------------
+
+SEGMENTS = ["", " for my demat account", " for my trading account", " on MTF", " in F&O"]
+
+
+def make_faqs(rng: random.Random, n: int):
+    """Up to `n` FAQ entries with distinct (url, question) pairs, in the crawler's output format."""
+    faqs, seen = [], set()
+    for _ in range(n * 20):
+        if len(faqs) >= n:
+            break
+        category = rng.choice(list(TOPICS))
+        topic = rng.choice(TOPICS[category])
+        question = rng.choice([
+            f"How do I check my {topic}", f"Why is my {topic} pending", f"What are the charges for {topic}",
+            f"How long does {topic} take", f"Can I change my {topic} online",
+        ]) + rng.choice(SEGMENTS) + "?"
+        url = f"https://www.angelone.in/support/{category.lower()}/{topic.replace(' ', '-').lower()}"
+        if (url, question) in seen:
+            continue
+        seen.add((url, question))
+        answer = " ".join([
+            f"You can manage {topic} from the Angel One app under Account > {category}.",
+            f"Requests placed before {rng.randint(1, 5)} PM are processed the same working day.",
+            f"A fee of Rs. {rng.randint(0, 50)} plus GST applies where mentioned in the tariff sheet.",
+        ][:rng.randint(1, 3)])
+        faqs.append({
+            "category": category, "question": question, "answer": answer, "url": url,
+            "faq_key": hashlib.sha256(f"{url}\n{question}".encode("utf-8")).hexdigest()[:16],
+        })
+    return faqs
+
+
+def make_corpus(out: str, pdfs: int = 4, pages: int = 8, docx: int = 2, faqs: int = 300, seed: int = 0):
+    rng = random.Random(seed)
+    source_dir = os.path.join(out, "source_docs")
+    faq_dir = os.path.join(out, "scraped_data")
+    os.makedirs(source_dir, exist_ok=True)
+    os.makedirs(faq_dir, exist_ok=True)
+    for i in range(pdfs):
+        plan = PLANS[i % len(PLANS)]
+        streams = [pdf_page_stream(rng, plan, page) for page in range(1, pages + 1)]
+        write_pdf(os.path.join(source_dir, f"plan_{i}_{plan.replace(' ', '_')}.pdf"), streams)
+    for i in range(docx):
+        plan = PLANS[(i + 1) % len(PLANS)]
+        paragraphs = [" ".join(plan_sentence(rng, plan) for _ in range(4)) for _ in range(pages * 3)]
+        write_docx(os.path.join(source_dir, f"policy_{i}.docx"), paragraphs, benefit_rows(rng, plan, 6))
+    with open(os.path.join(faq_dir, "angelone_faqs.json"), "w", encoding="utf-8") as f:
+        json.dump(make_faqs(rng, faqs), f, indent=2)
+    return source_dir, faq_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic benchmark corpus")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--pdfs", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--docx", type=int, default=2)
+    parser.add_argument("--faqs", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    source_dir, faq_dir = make_corpus(args.out, args.pdfs, args.pages, args.docx, args.faqs, args.seed)
+    print(json.dumps({"source_docs": source_dir, "scraped_data": faq_dir}))
@@ -1,20 +1,104 @@
 """
 Run on command prompt
+
+Interactive:  python cmd_chat.py
+Batch:        python cmd_chat.py --batch questions.jsonl --output answers.jsonl --concurrency 8
+
+Batch input is JSONL with one {"question": "...", "id": optional} object per line.
 """
 
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from src.llm_calls import get_llm_answer
-from src.chroma_manager import ChromaManager
-from src.embeddings import Embedder
+from src.pipeline import RAGPipeline
+from src import telemetry
 
 load_dotenv()
-embedder = Embedder()
-chroma_manager = ChromaManager()
-
-choice = True
-while choice:
-    query_text = input("Your Query: ")
-    embeddings = embedder.embed_user_query(query_text)
-    search_results = chroma_manager.query(embeddings)
-    answer = get_llm_answer(query_text, search_results)
-    print("ANSWER", answer)
\ No newline at end of file
+
+
+def interactive(pipeline, k):
+    choice = True
+    while choice:
+        query_text = input("Your Query: ")
+        print("ANSWER ", end="", flush=True)
+        for token in pipeline.stream(query_text, k):
+            print(token, end="", flush=True)
+        print()
+        embed_stats = pipeline.embedder.query_cache.stats()
+        retrieval_stats = pipeline.chroma_manager.retrieval_cache.stats()
+        logging.info(
+            f"Query embedding cache hit ratio {embed_stats['hit_ratio']:.0%} ({embed_stats['saved_seconds']:.1f}s saved), "
+            f"retrieval cache hit ratio {retrieval_stats['hit_ratio']:.0%} ({retrieval_stats['saved_seconds']:.2f}s saved)"
+        )
+
+
+def run_batch(pipeline, input_path, output_path, concurrency, k):
+    """
+    Answer every question in a JSONL file. Small talk is answered by the router;
+    the other questions are embedded in large batches, retrieved with one multi-query
+    call per source filter, and answered with up to `concurrency` LLM calls in flight.
+    Each output line carries the answer, the retrieved chunk ids and per-stage timings
+    (routing, embedding and retrieval are amortized over the batch).
+    """
+    with open(input_path, 'r', encoding='utf-8') as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    questions = [item['question'] for item in items]
+    if not questions:
+        logging.warning(f"No questions found in {input_path}")
+        return
+    start = time.perf_counter()
+
+    prepared = pipeline.prepare_batch(questions, k)
+
+    def answer(i):
+        t = time.perf_counter()
+        try:
+            # The OpenAI client retries rate limits itself (honouring Retry-After)
+            answer_text = pipeline.answer_prepared(prepared[i])
+            return answer_text, None, time.perf_counter() - t
+        except Exception as ex:
+            logging.error(f"Failed to answer question {i}: {ex}")
+            return None, str(ex), time.perf_counter() - t
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor, \
+            open(output_path, 'w', encoding='utf-8') as out:
+        for i, (text, error, llm_s) in enumerate(executor.map(answer, range(len(questions)))):
+            failures += error is not None
+            record = {
+                "id": items[i].get('id', i),
+                "question": questions[i],
+                "answer": text,
+                "route": prepared[i].route.kind,
+                "sources": prepared[i].route.sources,
+                "chunk_ids": prepared[i].results.ids if prepared[i].results is not None else [],
+                "timings": {**prepared[i].timings, "llm_s": llm_s},
+            }
+            if error:
+                record["error"] = error
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    elapsed = time.perf_counter() - start
+    logging.info(
+        f"Answered {len(questions) - failures}/{len(questions)} questions in {elapsed:.1f}s "
+        f"({len(questions) / elapsed:.2f} q/s, concurrency={concurrency}). Output: {output_path}"
+    )
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Chat with the RAG bot from the command line.")
+    arg_parser.add_argument("--batch", help="JSONL file of questions to answer offline")
+    arg_parser.add_argument("--output", default="answers.jsonl", help="JSONL file for batch answers")
+    arg_parser.add_argument("--concurrency", type=int, default=8, help="LLM calls in flight in batch mode")
+    arg_parser.add_argument("-k", type=int, default=10, help="Number of context chunks to retrieve")
+    args = arg_parser.parse_args()
+
+    telemetry.configure()
+    pipeline = RAGPipeline()
+    if args.batch:
+        run_batch(pipeline, args.batch, args.output, args.concurrency, args.k)
+    else:
+        interactive(pipeline, args.k)
@@ -1,12 +1,14 @@
 import os
 import logging
 import json
-from datetime import datetime
 from dotenv import load_dotenv
 
-from src.parsers import Parsers
+from src.parsers import Parsers, parse_files_parallel
+from src.manifest import ParseManifest, file_hash
 from src.crawlers import AngelOneFAQCrawler
-from src.embeddings import DataIngestor
+from src.crawl_state import CrawlState, diff_faqs
+from src.embeddings import DataIngestor, SKIPPED_FAQ_FILE_RE
+from src.run_report import RunReport
 load_dotenv()
 
 source_doc_dir = os.environ.get('SOURCE_DOCS_DIR')
@@ -15,47 +17,128 @@ pdf_table_dir = os.environ.get('OUTPUT_DIR_PDF_TABLE')
 docx_text_dir = os.environ.get('OUTPUT_DIR_DOCX_TEXT')
 json_text_dir = os.environ.get('OUTPUT_DIR_SCRAPED_JSON')
 
-def parse_source_docs(source_doc_folder):
+def parse_source_docs(source_doc_folder, workers=None, timeout=None, report=None):
     """
     This function parses the source docs(pdf, docx)
-    and stores them in text and table(csv) format
+    and stores them in text and table(csv) format.
+
+    With workers > 1 (PARSE_WORKERS) files are parsed in a process pool, and files
+    taking longer than `timeout` seconds (PARSE_TIMEOUT) are stopped. Either way a
+    failing file doesn't stop the others; a summary is logged and returned.
+    Files whose content hash matches the parse manifest are skipped.
+    Per-file results and parse stats are added to `report` (a RunReport) if given.
     """
-    parser = Parsers()
-    for file_name in os.listdir(source_doc_folder):
+    workers = int(workers or os.environ.get('PARSE_WORKERS', 1))
+    timeout = float(timeout or os.environ.get('PARSE_TIMEOUT', 0)) or None
+    jobs = []
+    for file_name in sorted(os.listdir(source_doc_folder)):
         file_path = os.path.join(source_doc_folder, file_name)
-        logging.info(f"Processing: {file_path}")
         if file_name.lower().endswith('.pdf'):
-            prased_data = parser.parse(file_path=file_path, parser="pdfplumber")
+            jobs.append((file_path, "pdfplumber"))
         if file_name.lower().endswith('.docx'):
-            prased_data = parser.parse(file_path=file_path, parser="docx")
+            jobs.append((file_path, "docx"))
+
+    manifest = ParseManifest()
+    hashes = {file_path: file_hash(file_path) for file_path, _ in jobs}
+    skipped = [file_path for file_path, parser_name in jobs
+               if manifest.is_unchanged(file_path, hashes[file_path], parser_name)]
+    if skipped:
+        logging.info(f"Skipping {len(skipped)} unchanged files: {', '.join(os.path.basename(p) for p in skipped)}")
+    jobs = [(file_path, parser_name) for file_path, parser_name in jobs if file_path not in skipped]
+
+    file_stats = {}
+    if workers > 1:
+        logging.info(f"Parsing {len(jobs)} files with {workers} worker processes")
+        results = parse_files_parallel(jobs, workers, timeout, file_stats)
+    else:
+        parser = Parsers()
+        results = {}
+        for file_path, parser_name in jobs:
+            logging.info(f"Processing: {file_path}")
+            try:
+                file_stats[file_path] = parser.parse(file_path=file_path, parser=parser_name)
+                results[file_path] = ("ok", "")
+            except Exception as e:
+                results[file_path] = ("failed", f"{type(e).__name__}: {e}")
+
+    for file_path, parser_name in jobs:
+        if results[file_path][0] == "ok":
+            manifest.record(file_path, hashes[file_path], parser_name)
+    manifest.save()
+    results.update({file_path: ("skipped", "unchanged") for file_path in skipped})
+
+    failed = {path: result for path, result in results.items() if result[0] not in ("ok", "skipped")}
+    logging.info(f"Parsed {len(jobs) - len(failed)}/{len(jobs)} changed source files successfully, "
+                 f"{len(skipped)} unchanged.")
+    for path, (status, detail) in failed.items():
+        logging.error(f"  {status}: {path} ({detail})")
+    if report is not None:
+        for path, (status, detail) in results.items():
+            report.add_file(path, status, detail, file_stats.get(path))
+    return results
 
 def web_scrape_angelone_support():
     """
     This function crawl through the AngelOne support site
     to fetch all the FAQs available on the page and any of it's sub-page.
+
+    Re-crawls are incremental: unchanged pages are answered from the crawl state store.
+    The full FAQ dataset is rewritten to angelone_faqs.json and the entries added,
+    changed or removed since the previous run are written to angelone_faqs_delta.json.
+    Returns the crawl stats and FAQ counts.
     """
-    crawler = AngelOneFAQCrawler()
+    output_dir = json_text_dir or "static/scraped_data"
+    os.makedirs(output_dir, exist_ok=True)
+    file_path = os.path.join(output_dir, "angelone_faqs.json")
+    delta_path = os.path.join(output_dir, "angelone_faqs_delta.json")
+
+    previous = []
+    if os.path.exists(file_path):
+        with open(file_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+
+    crawler = AngelOneFAQCrawler(state=CrawlState())
     data = crawler.crawl()
-    dt = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    file_path = f"static/scraped_data/angelone_faqs_{dt}.json"
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    logging.info(f"Saved {len(data)} FAQ entries to {file_path}.")
+    delta = diff_faqs(previous, data)
+
+    for path, payload in ((file_path, data), (delta_path, delta)):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    logging.info(
+        f"Saved {len(data)} FAQ entries to {file_path} ({len(delta['added'])} added, "
+        f"{len(delta['changed'])} changed, {len(delta['removed'])} removed; see {delta_path})."
+    )
+    legacy = [f for f in os.listdir(output_dir) if SKIPPED_FAQ_FILE_RE.search(f) and f != os.path.basename(delta_path)]
+    if legacy:
+        logging.info(f"Ignoring timestamped FAQ files from earlier crawls, superseded by {file_path}: {sorted(legacy)}")
+    return {**crawler.stats, "faqs": len(data), **{f"faqs_{kind}": len(items) for kind, items in delta.items()}}
 
 if __name__ == "__main__":
 
-    # Parse PDF and Docx
-    parse_source_docs(source_doc_dir)
+    # Timings, tokens and cost of this run, compared with the previous one (RUN_REPORT_PATH)
+    report = RunReport()
 
-    # Scrape source URL
-    web_scrape_angelone_support()
+    try:
+        # Parse PDF and Docx
+        with report.stage("parse"):
+            parse_source_docs(source_doc_dir, report=report)
 
-    # Chunking and Embedding
-    ingestor = DataIngestor(
-        pdf_dir=pdf_table_dir,
-        table_dir=pdf_table_dir,
-        docx_dir=docx_text_dir,
-        faq_dir=json_text_dir
-    )
-    ingestor.run()
+        # Scrape source URL
+        with report.stage("crawl") as stage:
+            stage.update(web_scrape_angelone_support())
+
+        # Chunking and Embedding
+        with report.stage("ingest") as stage:
+            ingestor = DataIngestor(
+                pdf_dir=pdf_text_dir,
+                table_dir=pdf_table_dir,
+                docx_dir=docx_text_dir,
+                faq_dir=json_text_dir
+            )
+            # Set INGEST_FULL_REBUILD=1 to drop and rebuild the collection instead of diffing it
+            stage.update(ingestor.run(incremental=os.environ.get('INGEST_FULL_REBUILD', '0') != '1'))
+    finally:
+        report.finish()
 
@@ -1,13 +1,22 @@
 import streamlit as st
 from dotenv import load_dotenv
-from src.llm_calls import get_llm_answer
-from src.chroma_manager import ChromaManager
-from src.embeddings import Embedder
+from src.llm_calls import format_context
+from src.pipeline import RAGPipeline
+from src import telemetry
 
 load_dotenv()
 top_n_results = 10
-embedder = Embedder()
-chroma_manager = ChromaManager()
+
+
+@st.cache_resource
+def get_pipeline():
+    # Created once per server process, so the query caches survive script reruns
+    telemetry.configure()
+    return RAGPipeline()
+
+
+pipeline = get_pipeline()
+embedder, chroma_manager = pipeline.embedder, pipeline.chroma_manager
 
 # ---- Streamlit UI starts here ----
 
@@ -30,6 +39,12 @@ with st.sidebar:
     st.button("Restart Conversation", on_click=clear_history)
     show_context_chunks = st.toggle("Show retrieved context (sources)", value=True)
     st.markdown("---")
+    embed_stats = embedder.query_cache.stats()
+    retrieval_stats = chroma_manager.retrieval_cache.stats()
+    st.caption(
+        f"Query embedding cache: {embed_stats['hit_ratio']:.0%} hits, {embed_stats['saved_seconds']:.1f}s saved  \n"
+        f"Retrieval cache: {retrieval_stats['hit_ratio']:.0%} hits, {retrieval_stats['saved_seconds']:.2f}s saved"
+    )
     st.info("Built with Streamlit. Backend is your RAG pipeline.")
 
 # Chat message display
@@ -47,18 +62,21 @@ query_text = st.chat_input("Type your question, or say hi...")
 if query_text:
     # Add user message
     st.session_state.messages.append({"role": "user", "content": query_text})
+    with st.chat_message("user"):
+        st.markdown(query_text)
+
+    # RAG retrieval step: route the query and get top K chunks (small talk skips retrieval)
+    prepared = pipeline.prepare(query_text, k)
 
-    # RAG retrieval step: get top K chunks
-    embeddings = embedder.embed_user_query(query_text)
-    search_results = chroma_manager.query(embeddings, k)
-    
-    # LLM Query Result
-    answer = get_llm_answer(query_text, search_results)
+    # LLM Query Result, rendered as tokens arrive
+    with st.chat_message("assistant"):
+        answer = st.write_stream(pipeline.stream_prepared(prepared))
     st.session_state.messages.append({"role": "assistant", "content": answer})
 
     # Show context optionally
-    if show_context_chunks:
+    search_results = prepared.results
+    if show_context_chunks and search_results is not None:
         with st.expander("🔍 Retrieved Context Chunks", expanded=False):
-            st.markdown(f"{search_results}")
+            st.markdown(format_context(search_results))
 
     st.rerun()  # Refresh chat
@@ -0,0 +1,219 @@
+"""
+HTTP API for the chatbot
+
+    python serve.py --host 0.0.0.0 --port 8080
+
+POST /query          {"question": "...", "k": 10}  -> {"answer", "route", "sources", "chunk_ids", "timings"}
+POST /query/stream   same body -> Server-Sent Events: "meta", then "token" events, then "done"
+GET  /ready          200 once the pipeline is loaded, 503 before
+GET  /metrics        Prometheus metrics, when TELEMETRY_SINKS includes 'prometheus'
+
+The pipeline (embedder, vector store, BM25 index, router) and one AsyncOpenAI client are
+created once at startup and shared by every request. Set OPENAI_BASE_URL to point the
+service at a local stub server for load tests.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+
+from aiohttp import web
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from src.pipeline import RAGPipeline
+from src import telemetry
+
+load_dotenv()
+
+# Shared per-process state, filled in at startup: "pipeline", "client", "loader".
+STATE = web.AppKey("state", dict)
+SLOTS = web.AppKey("slots", asyncio.Semaphore)
+TIMEOUT = web.AppKey("timeout", float)
+
+MAX_K = 50
+
+
+def _error(status: int, message: str) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+
+async def _read_query(request: web.Request):
+    """(question, k) from the JSON body, or an error response."""
+    try:
+        body = await request.json()
+    except ValueError:  # malformed JSON, or a body that is not valid UTF-8
+        return None, _error(400, "body must be JSON")
+    if not isinstance(body, dict):
+        return None, _error(400, "body must be a JSON object")
+    question = str(body.get("question") or "").strip()
+    if not question:
+        return None, _error(400, "'question' is required")
+    try:
+        k = int(body["k"]) if body.get("k") is not None else None
+    except (TypeError, ValueError):
+        return None, _error(400, "'k' must be an integer")
+    if k is not None:
+        k = min(max(k, 1), MAX_K)
+    return (question, k), None
+
+
+def _route_info(prepared) -> dict:
+    return {
+        "route": prepared.route.kind,
+        "sources": prepared.route.sources,
+        "chunk_ids": list(prepared.results.ids) if prepared.results is not None else [],
+    }
+
+
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+async def ready(request: web.Request) -> web.Response:
+    state = request.app[STATE]
+    if "pipeline" in state:
+        return web.json_response({"ready": True})
+    loader = state["loader"]
+    if loader.done() and loader.exception() is not None:
+        return _error(503, f"startup failed: {loader.exception()}")
+    return web.json_response({"ready": False}, status=503)
+
+
+async def metrics(request: web.Request) -> web.Response:
+    sink = telemetry.get_sink(telemetry.PrometheusSink)
+    return web.Response(text=sink.render(), content_type="text/plain")
+
+
+async def query(request: web.Request) -> web.Response:
+    state = request.app[STATE]
+    if "pipeline" not in state:
+        return _error(503, "not ready")
+    parsed, error = await _read_query(request)
+    if error:
+        return error
+    question, k = parsed
+    pipeline, timeout = state["pipeline"], request.app[TIMEOUT]
+
+    start = time.perf_counter()
+    try:
+        async with asyncio.timeout(timeout), request.app[SLOTS]:
+            queued = time.perf_counter()
+            prepared = await pipeline.aprepare(question, state["client"], k)
+            retrieved = time.perf_counter()
+            answer = await pipeline.aanswer_prepared(prepared, state["client"])
+    except TimeoutError:
+        return _error(504, f"no answer within {timeout}s")
+    except Exception as e:
+        logging.exception("Query failed")
+        return _error(500, str(e))
+    done = time.perf_counter()
+    return web.json_response({
+        "answer": answer,
+        **_route_info(prepared),
+        "timings": {
+            "queue_s": round(queued - start, 4),
+            "retrieve_s": round(retrieved - queued, 4),
+            "llm_s": round(done - retrieved, 4),
+        },
+    })
+
+
+async def query_stream(request: web.Request) -> web.StreamResponse:
+    state = request.app[STATE]
+    if "pipeline" not in state:
+        return _error(503, "not ready")
+    parsed, error = await _read_query(request)
+    if error:
+        return error
+    question, k = parsed
+    pipeline, timeout = state["pipeline"], request.app[TIMEOUT]
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+    })
+    start = time.perf_counter()
+    first_token_at = None
+    try:
+        async with asyncio.timeout(timeout), request.app[SLOTS]:
+            queued = time.perf_counter()
+            prepared = await pipeline.aprepare(question, state["client"], k)
+            retrieved = time.perf_counter()
+            await response.prepare(request)
+            await response.write(_sse("meta", _route_info(prepared)))
+            async for token in pipeline.astream_prepared(prepared, state["client"]):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                await response.write(_sse("token", {"text": token}))
+            done = time.perf_counter()
+            await response.write(_sse("done", {"timings": {
+                "queue_s": round(queued - start, 4),
+                "retrieve_s": round(retrieved - queued, 4),
+                "first_token_s": round((first_token_at or done) - start, 4),
+                "total_s": round(done - start, 4),
+            }}))
+    except (ConnectionResetError, asyncio.CancelledError):
+        raise
+    except Exception as e:
+        message = f"no answer within {timeout}s" if isinstance(e, TimeoutError) else str(e)
+        if not isinstance(e, TimeoutError):
+            logging.exception("Streaming query failed")
+        if not response.prepared:
+            return _error(504 if isinstance(e, TimeoutError) else 500, message)
+        await response.write(_sse("error", {"error": message}))
+    await response.write_eof()
+    return response
+
+
+async def _load_pipeline(app: web.Application):
+    start = time.perf_counter()
+    pipeline = await asyncio.to_thread(RAGPipeline)
+    # Load the BM25 index and source centroids now rather than on the first request.
+    await asyncio.to_thread(pipeline.chroma_manager.get_source_centroids)
+    app[STATE]["pipeline"] = pipeline
+    logging.info(f"Pipeline ready in {time.perf_counter() - start:.2f}s")
+
+
+async def _startup(app: web.Application):
+    app[STATE]["client"] = AsyncOpenAI()
+    app[STATE]["loader"] = asyncio.create_task(_load_pipeline(app))
+
+
+async def _cleanup(app: web.Application):
+    app[STATE]["loader"].cancel()
+    await app[STATE]["client"].close()
+
+
+def create_app(max_concurrency: int = None, timeout: float = None) -> web.Application:
+    """
+    The service app. `max_concurrency` queries are answered at a time (SERVE_MAX_CONCURRENCY),
+    the rest wait their turn; each request gets `timeout` seconds in total, waiting included
+    (SERVE_REQUEST_TIMEOUT).
+    """
+    app = web.Application()
+    app[STATE] = {}
+    app[SLOTS] = asyncio.Semaphore(int(max_concurrency or os.environ.get('SERVE_MAX_CONCURRENCY', 32)))
+    app[TIMEOUT] = float(timeout or os.environ.get('SERVE_REQUEST_TIMEOUT', 60))
+    app.on_startup.append(_startup)
+    app.on_cleanup.append(_cleanup)
+    app.router.add_get("/ready", ready)
+    app.router.add_post("/query", query)
+    app.router.add_post("/query/stream", query_stream)
+    if telemetry.get_sink(telemetry.PrometheusSink) is not None:
+        app.router.add_get("/metrics", metrics)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the chatbot over HTTP")
+    parser.add_argument("--host", default=os.environ.get('SERVE_HOST', '127.0.0.1'))
+    parser.add_argument("--port", type=int, default=int(os.environ.get('SERVE_PORT', 8080)))
+    parser.add_argument("--concurrency", type=int, default=None, help="queries answered at a time")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds per request")
+    args = parser.parse_args()
+
+    telemetry.configure()
+    web.run_app(create_app(args.concurrency, args.timeout), host=args.host, port=args.port)
@@ -0,0 +1,132 @@
+import os
+import re
+import json
+import math
+import heapq
+import logging
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+# Keeps plan names such as "7350" and amounts such as "2.5" as single tokens.
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    In-process inverted index with Okapi BM25 scoring.
+
+    Built from (id, text, source) triples and persisted as JSON, so it can be loaded
+    next to the Chroma collection it mirrors.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.sources: List[str] = []
+        self.doc_len: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.avgdl = 0.0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def build(self, docs: Iterable[Tuple[str, str, str]]):
+        """Index (id, text, source) triples, replacing any previous content."""
+        postings = defaultdict(list)
+        self.ids, self.sources, self.doc_len = [], [], []
+        for doc_idx, (doc_id, text, source) in enumerate(docs):
+            terms = Counter(tokenize(text))
+            for term, tf in terms.items():
+                postings[term].append((doc_idx, tf))
+            self.ids.append(doc_id)
+            self.sources.append(source or "")
+            self.doc_len.append(sum(terms.values()))
+        self.postings = dict(postings)
+        self.avgdl = sum(self.doc_len) / len(self.doc_len) if self.doc_len else 0.0
+        return self
+
+    def _allowed_sources(self, where: Optional[Dict[str, Any]]):
+        """
+        Translate a Chroma `where` filter on `source` into a set of allowed sources.
+        Returns None for no filter; raises ValueError for filters the index can't evaluate.
+        """
+        if not where:
+            return None
+        if set(where) != {"source"}:
+            raise ValueError(f"Unsupported filter for BM25 index: {where}")
+        cond = where["source"]
+        if isinstance(cond, str):
+            return {cond}
+        if isinstance(cond, dict) and set(cond) == {"$in"}:
+            return set(cond["$in"])
+        if isinstance(cond, dict) and set(cond) == {"$eq"}:
+            return {cond["$eq"]}
+        raise ValueError(f"Unsupported filter for BM25 index: {where}")
+
+    def search(self, query: str, k: int = 10, where: Dict[str, Any] = None) -> List[Tuple[str, float]]:
+        """Return the top `k` (id, score) pairs for `query`, best first."""
+        if not self.ids:
+            return []
+        allowed = self._allowed_sources(where)
+        n = len(self.ids)
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_idx, tf in posting:
+                if allowed is not None and self.sources[doc_idx] not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_idx] / self.avgdl)
+                scores[doc_idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.ids[doc_idx], score) for doc_idx, score in top]
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "ids": self.ids,
+                "sources": self.sources,
+                "doc_len": self.doc_len,
+                "postings": self.postings,
+            }, f)
+        os.replace(tmp_path, path)
+        logging.info(f"Saved BM25 index with {len(self.ids)} chunks to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """Load a saved index, or return None if there is none at `path`."""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(data["k1"], data["b"])
+        index.ids = data["ids"]
+        index.sources = data["sources"]
+        index.doc_len = data["doc_len"]
+        index.postings = data["postings"]
+        index.avgdl = sum(index.doc_len) / len(index.doc_len) if index.doc_len else 0.0
+        return index
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Merge several ranked id lists: each id scores sum(1 / (k + rank)) over the lists it
+    appears in. Returns (id, score) pairs, best first.
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,239 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+from dotenv import load_dotenv
+
+from src.tokens import estimate_tokens
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+load_dotenv()
+
+# SQLite caps the number of host parameters in a single statement.
+_SQL_BATCH = 500
+
+# Returned by LRUCache.get on a miss, since None can be a cached value.
+MISSING = object()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a user query, used as a cache key."""
+    return " ".join(text.lower().split())
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache.
+
+    Each entry remembers how long it took to compute, so hits can report the
+    latency they saved.
+    """
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._data = OrderedDict()  # key -> (value, cost_seconds)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[1]
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, cost_seconds: float = 0.0):
+        with self._lock:
+            self._data[key] = (value, cost_seconds)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "saved_seconds": self.saved_seconds,
+        }
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding cache backed by SQLite.
+
+    Entries are keyed by (embed model, dimensions, sha256 of the text) and stored
+    as float32 blobs. When the cache grows past `max_entries`, the least recently
+    used entries are evicted.
+
+    `table` separates caches sharing one file: query embeddings (QUERY_CACHE_SHARED)
+    live in their own table, so they neither evict chunk embeddings nor count in the
+    ingest hit/miss stats.
+    """
+    def __init__(self, path: str = None, max_entries: int = None, table: str = "embeddings"):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: '{table}'")
+        self.path = path or os.environ.get('EMBED_CACHE_PATH', 'cache/embeddings.sqlite')
+        self.max_entries = int(max_entries or os.environ.get('EMBED_CACHE_MAX_ENTRIES', 200000))
+        self.table = table
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        # The chunk table keeps the index name it had before tables could be chosen
+        index = "idx_last_used" if table == "embeddings" else f"idx_{table}_last_used"
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table}(last_used)")
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.hit_tokens = 0
+
+    @staticmethod
+    def make_key(model: str, dimensions: Optional[int], text: str) -> str:
+        return f"{model}:{dimensions or 'default'}:{text_hash(text)}"
+
+    def get_many(self, model: str, dimensions: Optional[int], texts: List[str]) -> Dict[int, List[float]]:
+        """
+        Look up embeddings for `texts`. Returns {index in texts: embedding} for hits only.
+        """
+        keys = [self.make_key(model, dimensions, t) for t in texts]
+        found = {}
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            for i in range(0, len(unique_keys), _SQL_BATCH):
+                batch = unique_keys[i:i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM {self.table} WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET last_used = ? WHERE key = ?",
+                    [(now, k) for k in found]
+                )
+                self._conn.commit()
+
+        results = {i: found[key] for i, key in enumerate(keys) if key in found}
+        hit_tokens = sum(estimate_tokens(texts[i]) for i in results)
+        with self._lock:
+            self.hits += len(results)
+            self.misses += len(keys) - len(results)
+            self.hit_tokens += hit_tokens
+        return results
+
+    def put_many(self, model: str, dimensions: Optional[int], texts: List[str], embeddings: List[List[float]]):
+        """Store embeddings for `texts`, then evict if the cache is over capacity."""
+        now = time.time()
+        rows = [
+            (self.make_key(model, dimensions, t), array('f', e).tobytes(), now)
+            for t, e in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+            self._evict()
+
+    def _evict(self):
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        # Evict down to 90% of capacity so we don't evict again on every insert.
+        to_remove = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN ("
+            f" SELECT key FROM {self.table} ORDER BY last_used ASC LIMIT ?)",
+            (to_remove,)
+        )
+        self._conn.commit()
+        logging.info(f"Evicted {to_remove} entries from embedding cache {self.path} ({self.table})")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "tokens_saved": self.hit_tokens,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TableCache:
+    """
+    Persistent cache of cleaned CSV output from LLM table structuring, backed by SQLite.
+
+    Keys combine the model, the prompt version and a hash of the table input, so
+    changing any of them is a miss.
+    """
+    def __init__(self, path: str = None):
+        self.path = path or os.environ.get('TABLE_CACHE_PATH', 'cache/tables.sqlite')
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS tables (key TEXT PRIMARY KEY, csv TEXT NOT NULL)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, prompt_version: str, table_input: str) -> str:
+        return f"{model}:{prompt_version}:{text_hash(table_input)}"
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT csv FROM tables WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def put(self, key: str, csv_text: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO tables (key, csv) VALUES (?, ?)", (key, csv_text))
+            self._conn.commit()
@@ -1,54 +1,467 @@
 import os
+import json
+import time
+import hashlib
 import logging
-from typing import List, Dict, Any
-import chromadb
+from array import array
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Iterable, Optional, Set
+import numpy as np
 from dotenv import load_dotenv
 
+from src.bm25 import BM25Index, reciprocal_rank_fusion
+from src.cache import LRUCache, MISSING
+from src import telemetry
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 load_dotenv()
 
+# Chroma rejects add/upsert/delete calls above its max batch size (~5k records).
+WRITE_BATCH_SIZE = 5000
+
+
+@dataclass(frozen=True)
+class QueryResult:
+    """Ranked chunks returned for a single query embedding, best match first."""
+    ids: List[str] = field(default_factory=list)
+    documents: List[str] = field(default_factory=list)
+    metadatas: List[Dict[str, Any]] = field(default_factory=list)
+    distances: List[Optional[float]] = field(default_factory=list)
+    # (n, dim) float32 matrix of the chunks' embeddings, when the backend returned them
+    embeddings: Optional[np.ndarray] = field(default=None, compare=False, repr=False)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class ChromaBackend:
+    """
+    Vector storage in a Chroma PersistentClient collection.
+
+    The collection uses cosine distance, like NumpyVectorStore, so distances mean the
+    same thing whichever backend is configured. A collection created with another space
+    is refused until it is rebuilt.
+    """
+    def __init__(self, collection_name: str, persist_path: str):
+        # Imported here so VECTOR_BACKEND=numpy works without chromadb installed
+        import chromadb
+
+        self.collection_name = collection_name
+        self.chroma_client = chromadb.PersistentClient(path=persist_path)
+        self._collection = None
+
+    def get_or_create_collection(self):
+        """Collection handle, resolved once and reused until the collection is reset."""
+        if self._collection is None:
+            collection = self.chroma_client.get_or_create_collection(
+                name=self.collection_name, metadata={"hnsw:space": "cosine"}
+            )
+            space = self._space(collection)
+            if space != "cosine":
+                raise RuntimeError(
+                    f"Chroma collection '{self.collection_name}' uses '{space}' distance, not cosine; "
+                    f"rebuild it with INGEST_FULL_REBUILD=1"
+                )
+            self._collection = collection
+        return self._collection
+
+    @staticmethod
+    def _space(collection) -> str:
+        return (collection.metadata or {}).get("hnsw:space", "l2")
+
+    def needs_rebuild(self) -> bool:
+        """True when the stored collection was created with a distance other than cosine."""
+        try:
+            collection = self.chroma_client.get_collection(name=self.collection_name)
+        except Exception:
+            return False
+        return self._space(collection) != "cosine"
+
+    def refresh(self):
+        """Forget the collection handle; another process may have rebuilt the collection."""
+        self._collection = None
+
+    def reset(self):
+        try:
+            self.chroma_client.delete_collection(self.collection_name)
+            logging.info(f"Deleted Chroma collection '{self.collection_name}'")
+        except Exception:
+            pass
+        self._collection = None
+
+    def iter_documents(self, page_size: int = WRITE_BATCH_SIZE):
+        collection = self.get_or_create_collection()
+        offset = 0
+        while True:
+            page = collection.get(include=['documents', 'metadatas'], limit=page_size, offset=offset)
+            yield from zip(page['ids'], page['documents'], page['metadatas'])
+            if len(page['ids']) < page_size:
+                return
+            offset += page_size
+
+    def iter_source_embeddings(self, page_size: int = WRITE_BATCH_SIZE):
+        """Yield (source, embedding) for every stored chunk."""
+        collection = self.get_or_create_collection()
+        offset = 0
+        while True:
+            page = collection.get(include=['metadatas', 'embeddings'], limit=page_size, offset=offset)
+            for meta, embedding in zip(page['metadatas'], page['embeddings']):
+                yield (meta or {}).get("source", ""), embedding
+            if len(page['ids']) < page_size:
+                return
+            offset += page_size
+
+    def get_existing_ids(self, page_size: int = WRITE_BATCH_SIZE) -> Set[str]:
+        collection = self.get_or_create_collection()
+        ids = set()
+        offset = 0
+        while True:
+            page = collection.get(include=[], limit=page_size, offset=offset)
+            ids.update(page['ids'])
+            if len(page['ids']) < page_size:
+                return ids
+            offset += page_size
+
+    def get(self, ids: List[str], include_embeddings: bool = False):
+        """(id, document, metadata[, embedding]) for the given ids that exist."""
+        include = ['documents', 'metadatas'] + (['embeddings'] if include_embeddings else [])
+        fetched = self.get_or_create_collection().get(ids=ids, include=include)
+        if include_embeddings:
+            return list(zip(fetched['ids'], fetched['documents'], fetched['metadatas'], fetched['embeddings']))
+        return list(zip(fetched['ids'], fetched['documents'], fetched['metadatas']))
+
+    def upsert(self, ids, chunks, metadatas, embeddings):
+        collection = self.get_or_create_collection()
+        for i in range(0, len(ids), WRITE_BATCH_SIZE):
+            collection.upsert(
+                ids=ids[i:i + WRITE_BATCH_SIZE],
+                embeddings=embeddings[i:i + WRITE_BATCH_SIZE],
+                documents=chunks[i:i + WRITE_BATCH_SIZE],
+                metadatas=metadatas[i:i + WRITE_BATCH_SIZE]
+            )
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        collection = self.get_or_create_collection()
+        for i in range(0, len(ids), WRITE_BATCH_SIZE):
+            collection.update(ids=ids[i:i + WRITE_BATCH_SIZE], metadatas=metadatas[i:i + WRITE_BATCH_SIZE])
+
+    def delete(self, ids: List[str]):
+        collection = self.get_or_create_collection()
+        for i in range(0, len(ids), WRITE_BATCH_SIZE):
+            collection.delete(ids=ids[i:i + WRITE_BATCH_SIZE])
+
+    def query(self, embeddings, n_results: int, where: Optional[Dict[str, Any]] = None) -> List[QueryResult]:
+        raw = self.get_or_create_collection().query(
+            query_embeddings=embeddings,
+            n_results=n_results,
+            where=where,
+            include=['documents', 'metadatas', 'distances', 'embeddings']
+        )
+        return [
+            QueryResult(
+                ids=raw['ids'][j],
+                documents=raw['documents'][j],
+                metadatas=raw['metadatas'][j],
+                distances=raw['distances'][j],
+                embeddings=np.asarray(raw['embeddings'][j], dtype=np.float32)
+            )
+            for j in range(len(embeddings))
+        ]
+
+
+def make_backend(name: str, collection_name: str, persist_path: str):
+    """Vector storage backend by name: 'chroma' (default) or 'numpy'."""
+    name = (name or "chroma").strip().lower()
+    if name == "chroma":
+        return ChromaBackend(collection_name, persist_path)
+    if name == "numpy":
+        from src.numpy_store import NumpyVectorStore
+        return NumpyVectorStore(collection_name, persist_path)
+    raise ValueError(f"Unknown vector backend: '{name}'. Valid: ['chroma', 'numpy']")
+
 
 class ChromaManager:
     """
     Handles ChromaDB ingestion and storage.
+
+    Storage is delegated to a pluggable backend (VECTOR_BACKEND=chroma|numpy); retrieval
+    caching, versioning and hybrid search work the same on top of either.
     """
-    def __init__(self, collection_name: str = None, persist_path: str = "chroma"):
+    def __init__(self, collection_name: str = None, persist_path: str = "chroma", backend: str = None):
         self.collection_name = collection_name or os.environ.get('CHROMA_COLLECTION_NAME')
         self.persist_path = persist_path
-        self.chroma_client = chromadb.PersistentClient(path=self.persist_path)
+        self.backend = make_backend(
+            backend or os.environ.get('VECTOR_BACKEND', 'chroma'), self.collection_name, self.persist_path
+        )
+        self.retrieval_cache = LRUCache(int(os.environ.get('RETRIEVAL_CACHE_SIZE', 1024)))
+        self._cache_version = None
+        self.hybrid = os.environ.get('HYBRID_SEARCH', '1') == '1'
+        self.hybrid_candidates = int(os.environ.get('HYBRID_CANDIDATE_MULTIPLIER', 2))
+        self._lexical_index = MISSING
+        self._source_centroids = MISSING
 
-    def get_or_create_collection(self):
+    @property
+    def version_path(self) -> str:
+        return os.path.join(self.persist_path, f"{self.collection_name}.version")
+
+    def _bump_version(self):
+        """Write a new version stamp; every process's retrieval cache drops entries from older versions."""
+        os.makedirs(self.persist_path, exist_ok=True)
+        with open(self.version_path, "w", encoding="utf-8") as f:
+            f.write(str(time.time_ns()))
+
+    @property
+    def lexical_index_path(self) -> str:
+        return os.path.join(self.persist_path, f"{self.collection_name}.bm25.json")
+
+    def get_version(self) -> str:
         try:
-            return self.chroma_client.get_collection(self.collection_name)
-        except Exception:
-            logging.info(f"Creating new Chroma collection: {self.collection_name}")
-            return self.chroma_client.create_collection(name=self.collection_name)
+            with open(self.version_path, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return ""
 
-    def ingest(self, chunks: List[str], metadatas: List[Dict[str, Any]], embeddings: List[List[float]]):
+    def _sync_version(self):
         """
-        Store everything in Chroma collection.
+        Drop cached results (and the backend's handles, which a rebuild invalidates)
+        if the collection was written to since we last looked.
         """
-        collection = self.get_or_create_collection()
-        ids = [str(i) for i in range(len(chunks))]
-        collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            documents=chunks,
-            metadatas=metadatas
-        )
-        logging.info(f"Added {len(chunks)} chunks to Chroma collection '{self.collection_name}'")
-        return collection
-    
-    def query(self, embeddings, n_results: int = 10):
-        collection = self.get_or_create_collection()
-        results = collection.query(
-            query_embeddings=embeddings,
-            n_results=n_results,              
-            include=['documents', 'metadatas', 'distances'] 
+        version = self.get_version()
+        if version != self._cache_version:
+            self.retrieval_cache.clear()
+            self.backend.refresh()
+            self._lexical_index = MISSING
+            self._source_centroids = MISSING
+            self._cache_version = version
+
+    def get_lexical_index(self) -> Optional[BM25Index]:
+        """The BM25 index persisted next to the collection, or None if it hasn't been built."""
+        if self._lexical_index is MISSING:
+            self._lexical_index = BM25Index.load(self.lexical_index_path)
+        return self._lexical_index
+
+    def iter_documents(self, page_size: int = WRITE_BATCH_SIZE):
+        """Yield (id, document, metadata) for every stored chunk, one page at a time."""
+        return self.backend.iter_documents(page_size)
+
+    def build_lexical_index(self) -> BM25Index:
+        """Rebuild the BM25 index from the stored chunks and persist it next to the collection."""
+        index = BM25Index().build(
+            (chunk_id, doc, (meta or {}).get("source", "")) for chunk_id, doc, meta in self.iter_documents()
         )
+        index.save(self.lexical_index_path)
+        self._lexical_index = index
+        self._bump_version()
+        return index
+
+    @property
+    def centroids_path(self) -> str:
+        return os.path.join(self.persist_path, f"{self.collection_name}.centroids.json")
+
+    def build_source_centroids(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Average the unit-normalized embeddings of each source type ('text', 'table',
+        'faq') and persist the centroids next to the collection, for query routing.
+        """
+        sums, counts = {}, {}
+        for source, embedding in self.backend.iter_source_embeddings():
+            vector = np.asarray(embedding, dtype=np.float64)
+            norm = np.linalg.norm(vector)
+            if norm:
+                sums[source] = sums.get(source, 0) + vector / norm
+                counts[source] = counts.get(source, 0) + 1
+        centroids = {
+            source: {"centroid": (sums[source] / counts[source]).tolist(), "count": counts[source]}
+            for source in sorted(sums)
+        }
+        os.makedirs(self.persist_path, exist_ok=True)
+        tmp_path = f"{self.centroids_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(centroids, f)
+        os.replace(tmp_path, self.centroids_path)
+        self._source_centroids = centroids
+        self._bump_version()
+        logging.info(f"Saved centroids for sources {sorted(centroids)} to {self.centroids_path}")
+        return centroids
+
+    def get_source_centroids(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """The per-source centroids persisted next to the collection, or None if not built."""
+        self._sync_version()
+        if self._source_centroids is MISSING:
+            try:
+                with open(self.centroids_path, "r", encoding="utf-8") as f:
+                    self._source_centroids = json.load(f)
+            except FileNotFoundError:
+                self._source_centroids = None
+        return self._source_centroids
+
+    def reset(self):
+        """Drop the collection so the next write starts from an empty one."""
+        self.backend.reset()
+        self._bump_version()
+
+    def needs_rebuild(self) -> bool:
+        """True when the stored vectors cannot be reused and must be rebuilt from scratch."""
+        return self.backend.needs_rebuild()
+
+    def get_existing_ids(self, page_size: int = WRITE_BATCH_SIZE) -> Set[str]:
+        """Return the ids of every chunk already stored in the collection."""
+        return self.backend.get_existing_ids(page_size)
+
+    def ingest(
+        self,
+        chunks: List[str],
+        metadatas: List[Dict[str, Any]],
+        embeddings: List[List[float]],
+        ids: List[str] = None
+    ):
+        """
+        Store everything in Chroma collection.
+        Chunks with an id that already exists are overwritten.
+        """
+        ids = ids or [str(i) for i in range(len(chunks))]
+        self.backend.upsert(ids, chunks, metadatas, embeddings)
+        self._bump_version()
+        logging.info(f"Upserted {len(chunks)} chunks to collection '{self.collection_name}'")
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Replace the metadata of stored chunks, keeping their documents and embeddings."""
+        if ids:
+            self.backend.update_metadatas(ids, metadatas)
+            self._bump_version()
+            logging.info(f"Updated metadata of {len(ids)} chunks in collection '{self.collection_name}'")
+
+    def delete(self, ids: Iterable[str]):
+        """Remove chunks by id."""
+        ids = list(ids)
+        if ids:
+            self.backend.delete(ids)
+            self._bump_version()
+            logging.info(f"Deleted {len(ids)} stale chunks from collection '{self.collection_name}'")
+
+    @staticmethod
+    def _retrieval_key(
+        embedding: List[float], n_results: int, where: Dict[str, Any] = None, query_text: str = None
+    ) -> str:
+        digest = hashlib.sha256(array('d', embedding).tobytes()).hexdigest()
+        return f"{digest}:{n_results}:{json.dumps(where, sort_keys=True)}:{query_text or ''}"
+
+    def query(
+        self, embeddings, n_results: int = 10, where: Dict[str, Any] = None, query_text: str = None
+    ) -> QueryResult:
+        """
+        Top `n_results` chunks for a query embedding, optionally filtered by metadata.
+        `embeddings` is a list holding one embedding, as returned by Embedder.embed_user_query.
+        Pass `query_text` to fuse in BM25 results (see query_batch).
+        """
+        query_texts = [query_text] if query_text else None
+        return self.query_batch(embeddings[:1], n_results, where, query_texts)[0]
+
+    def query_batch(
+        self,
+        embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        query_texts: Optional[List[str]] = None
+    ) -> List[QueryResult]:
+        """
+        Top `n_results` chunks for each of many query embeddings, in one backend call.
+
+        When `query_texts` are given and a BM25 index has been built (HYBRID_SEARCH=1),
+        dense and lexical candidates are merged with reciprocal rank fusion. Chunks found
+        only lexically have a distance of None.
+        Results are cached per query until the collection is next written to.
+        """
+        with telemetry.span("retrieve", k=n_results, queries=len(embeddings), filtered=where is not None) as span:
+            results = self._query_batch(embeddings, n_results, where, query_texts)
+            if telemetry.enabled():
+                span.set(chunks=sum(len(r.ids) for r in results))
+                if len(results) == 1:
+                    span.set(distances=[round(d, 4) if d is not None else None for d in results[0].distances])
+            return results
+
+    def _query_batch(self, embeddings, n_results, where, query_texts) -> List[QueryResult]:
+        self._sync_version()
+        lexical_index = self.get_lexical_index() if self.hybrid and query_texts else None
+        if lexical_index is None:
+            query_texts = None
+        texts = query_texts or [None] * len(embeddings)
+        results: List[Optional[QueryResult]] = [None] * len(embeddings)
+        keys = [self._retrieval_key(e, n_results, where, t) for e, t in zip(embeddings, texts)]
+        for i, key in enumerate(keys):
+            cached = self.retrieval_cache.get(key)
+            if cached is not MISSING:
+                results[i] = cached
+        missing = [i for i, r in enumerate(results) if r is None]
+        telemetry.current_span().set(cache_hits=len(embeddings) - len(missing), hybrid=query_texts is not None)
+        if not missing:
+            return results
+
+        start = time.perf_counter()
+        n_candidates = n_results * self.hybrid_candidates if query_texts else n_results
+        dense = self.backend.query([embeddings[i] for i in missing], n_candidates, where)
+        if query_texts:
+            dense = self._fuse_lexical(lexical_index, dense, [texts[i] for i in missing], n_results, where)
+
+        cost = (time.perf_counter() - start) / len(missing)
+        for j, i in enumerate(missing):
+            results[i] = dense[j]
+            self.retrieval_cache.put(keys[i], results[i], cost)
+        return results
+
+    def _fuse_lexical(self, lexical_index, dense_results, query_texts, n_results, where):
+        """Merge dense results with BM25 hits for the same queries using reciprocal rank fusion."""
+        try:
+            lexical = [
+                [chunk_id for chunk_id, _ in lexical_index.search(text, len(dense.ids) or n_results, where)]
+                for dense, text in zip(dense_results, query_texts)
+            ]
+        except ValueError as ex:
+            logging.warning(f"Skipping lexical search: {ex}")
+            return [QueryResult(r.ids[:n_results], r.documents[:n_results], r.metadatas[:n_results],
+                                r.distances[:n_results],
+                                r.embeddings[:n_results] if r.embeddings is not None else None)
+                    for r in dense_results]
+
+        fused_ids = [
+            [chunk_id for chunk_id, _ in reciprocal_rank_fusion([dense.ids, lex_ids])[:n_results]]
+            for dense, lex_ids in zip(dense_results, lexical)
+        ]
+
+        # Each query keeps its own dense distances; a chunk another query found densely is
+        # still lexical-only (distance None) here.
+        dense_by_query = []
+        for dense in dense_results:
+            embeddings = dense.embeddings if dense.embeddings is not None else [None] * len(dense.ids)
+            dense_by_query.append({
+                chunk_id: (doc, meta, dist, emb)
+                for chunk_id, doc, meta, dist, emb in zip(
+                    dense.ids, dense.documents, dense.metadatas, dense.distances, embeddings
+                )
+            })
+
+        # Fetch the chunks that only the lexical index found, in one call for the whole batch
+        lexical_only = list({
+            chunk_id for ids, dense in zip(fused_ids, dense_by_query) for chunk_id in ids if chunk_id not in dense
+        })
+        fetched = {}
+        if lexical_only:
+            for chunk_id, doc, meta, emb in self.backend.get(lexical_only, include_embeddings=True):
+                fetched[chunk_id] = (doc, meta, None, emb)
 
-        search_results = ""
-        for i, doc in enumerate(results['documents'][0]):
-            content = f"<Rank {i+1}>\n{doc}\n</Rank {i+1}\n>"
-            search_results += content
-        return search_results
+        fused = []
+        for ids, dense in zip(fused_ids, dense_by_query):
+            known = {**fetched, **dense}
+            ids = [chunk_id for chunk_id in ids if chunk_id in known]
+            embeddings = [known[chunk_id][3] for chunk_id in ids]
+            fused.append(QueryResult(
+                ids=ids,
+                documents=[known[chunk_id][0] for chunk_id in ids],
+                metadatas=[known[chunk_id][1] for chunk_id in ids],
+                distances=[known[chunk_id][2] for chunk_id in ids],
+                embeddings=(
+                    np.asarray(embeddings, dtype=np.float32)
+                    if ids and all(e is not None for e in embeddings) else None
+                )
+            ))
+        return fused
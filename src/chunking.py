@@ -0,0 +1,101 @@
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.tokens import count_tokens, split_by_tokens
+
+# Page markers written by Parsers.parse_pdfplumber.
+PAGE_MARKER_RE = re.compile(r"^--- Page: (\d+) ---[ \t]*$", re.MULTILINE)
+PARAGRAPH_RE = re.compile(r"\n[ \t]*\n+")
+# A sentence ends at . ! or ? followed by whitespace and a capital letter, so amounts
+# such as "Rs. 20" or "0.5%" are not split.
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z])")
+
+
+def split_pages(text: str) -> Iterator[Tuple[Optional[int], str]]:
+    """Yield (page number, page text); text before the first marker has page None."""
+    page, start = None, 0
+    for match in PAGE_MARKER_RE.finditer(text):
+        yield page, text[start:match.start()]
+        page, start = int(match.group(1)), match.end()
+    yield page, text[start:]
+
+
+class TextChunker:
+    """
+    Token-budgeted chunker that only cuts at natural boundaries.
+
+    Text is broken into units, each as large as fits the budget: paragraphs, or else
+    their sentences, or else their lines, and only as a last resort fixed token windows.
+    Units are then packed greedily into chunks of at most `max_tokens`. A page break is
+    a preferred cut once a chunk is half full. Page markers are removed from the text
+    and reported as `page_start`/`page_end` metadata. Each unit is tokenized once, so
+    the cost is linear in the document size.
+    """
+    def __init__(self, max_tokens: int = 400, overlap_tokens: int = 0):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def _units(self, text: str) -> Iterator[Tuple[str, int, str]]:
+        """Yield (unit, tokens, separator before it) for one page of text."""
+        for paragraph in PARAGRAPH_RE.split(text):
+            paragraph = paragraph.strip()
+            if paragraph:
+                yield from self._split(paragraph, "\n\n", 0)
+
+    def _split(self, text: str, sep: str, level: int) -> Iterator[Tuple[str, int, str]]:
+        tokens = count_tokens(text)
+        if tokens <= self.max_tokens:
+            yield text, tokens, sep
+            return
+        if level == 0:
+            parts, part_sep = SENTENCE_RE.split(text), " "
+        elif level == 1:
+            parts, part_sep = text.split("\n"), "\n"
+        else:
+            for i, piece in enumerate(split_by_tokens(text, self.max_tokens)):
+                yield piece, count_tokens(piece), sep if i == 0 else " "
+            return
+        if len(parts) == 1:
+            yield from self._split(text, sep, level + 1)
+            return
+        for i, part in enumerate(p.strip() for p in parts):
+            if part:
+                yield from self._split(part, sep if i == 0 else part_sep, level + 1)
+
+    def chunk(self, text: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Split `text` into (chunk, metadata) pairs."""
+        chunks = []
+        current: List[Tuple[str, int, str, Optional[int]]] = []  # (unit, tokens, sep, page)
+        size = 0
+        carried = 0  # leading units of `current` already emitted with the previous chunk
+
+        def flush():
+            nonlocal current, size, carried
+            text_out = current[0][0] + "".join(sep + unit for unit, _, sep, _ in current[1:])
+            pages = [page for *_, page in current if page is not None]
+            meta = {"page_start": pages[0], "page_end": pages[-1]} if pages else {}
+            chunks.append((text_out, meta))
+            # Carry whole trailing units, up to overlap_tokens, into the next chunk.
+            tail, tail_size = [], 0
+            for unit in reversed(current[1:]):
+                if tail_size + unit[1] > self.overlap_tokens:
+                    break
+                tail.insert(0, unit)
+                tail_size += unit[1]
+            current, size, carried = tail, tail_size, len(tail)
+
+        for page, page_text in split_pages(text):
+            for unit, tokens, sep in self._units(page_text):
+                if current:
+                    new_page = page != current[-1][3]
+                    if size + tokens + 1 > self.max_tokens or (new_page and size >= self.max_tokens // 2):
+                        flush()
+                        if size + tokens + 1 > self.max_tokens:
+                            current, size, carried = [], 0, 0
+                    if new_page:
+                        sep = "\n\n"
+                current.append((unit, tokens, sep, page))
+                size += tokens + (1 if len(current) > 1 else 0)
+        if len(current) > carried:
+            flush()
+        return chunks
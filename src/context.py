@@ -0,0 +1,145 @@
+import os
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.tokens import count_tokens
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+load_dotenv()
+
+# Positions where a chunk can be cut without splitting a sentence or a table row.
+_CUT_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def source_name(metadata: Optional[Dict[str, Any]]) -> str:
+    """
+    Short human-readable origin of a chunk, e.g. 'plan.txt p.3-4' or an FAQ page URL.
+    Chunks that stand in for deduplicated copies also list where those came from, so
+    text shared by several plan documents is attributed to every plan.
+    """
+    metadata = metadata or {}
+    name = (
+        metadata.get("file") or metadata.get("table_csv") or metadata.get("url")
+        or metadata.get("faq_file") or metadata.get("source", "")
+    )
+    start, end = metadata.get("page_start"), metadata.get("page_end")
+    if start is not None:
+        name += f" p.{start}" if start == end else f" p.{start}-{end}"
+    duplicates = [label for label in (metadata.get("duplicate_sources") or "").split("; ") if label and label != name]
+    if duplicates:
+        name += f"; also in {'; '.join(duplicates)}"
+    return name
+
+
+@dataclass
+class AssembledContext:
+    """Context blocks chosen for the answer prompt, with the bookkeeping to log them."""
+    text: str = ""
+    source_ids: List[str] = field(default_factory=list)  # S1, S2, ... in prompt order
+    chunk_ids: List[str] = field(default_factory=list)
+    tokens: int = 0
+    candidates: int = 0
+    truncated: int = 0
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def mmr_order(
+    query_embedding, embeddings: np.ndarray, lambda_mult: float = 0.7, redundancy_threshold: float = 0.95
+) -> List[int]:
+    """
+    Order candidates by maximal marginal relevance: each step picks the chunk with the
+    best `lambda * sim(query) - (1 - lambda) * max sim(already picked)`. Candidates at
+    least `redundancy_threshold` similar to a picked chunk are dropped.
+    """
+    docs = _unit_rows(np.asarray(embeddings, dtype=np.float32))
+    query = _unit_rows(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+    relevance = docs @ query
+    max_similarity = np.full(len(docs), -np.inf, dtype=np.float32)
+    remaining = np.ones(len(docs), dtype=bool)
+    order = []
+    while remaining.any():
+        penalty = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+        scores = np.where(remaining, lambda_mult * relevance - (1 - lambda_mult) * penalty, -np.inf)
+        best = int(np.argmax(scores))
+        order.append(best)
+        remaining[best] = False
+        max_similarity = np.maximum(max_similarity, docs @ docs[best])
+        remaining &= max_similarity < redundancy_threshold
+    return order
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of `text` that ends at a sentence or line boundary and fits `max_tokens`."""
+    cuts = [m.start() for m in _CUT_RE.finditer(text)]
+    best, lo, hi = "", 0, len(cuts) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        prefix = text[:cuts[mid]].rstrip()
+        if count_tokens(prefix) <= max_tokens:
+            best, lo = prefix, mid + 1
+        else:
+            hi = mid - 1
+    return best
+
+
+class ContextAssembler:
+    """
+    Sits between retrieval and generation: re-ranks retrieved chunks with MMR using
+    their stored embeddings, drops near-identical ones and packs the rest, best first,
+    into a token budget. A chunk that doesn't fit is skipped in favour of smaller ones,
+    and the last block may be cut at a sentence boundary to use the remaining budget.
+    Each block is labelled with a compact source id (S1, S2, ...) the answer can cite.
+    """
+    def __init__(
+        self,
+        token_budget: int = None,
+        lambda_mult: float = None,
+        redundancy_threshold: float = None,
+        min_truncated_tokens: int = 40
+    ):
+        self.token_budget = int(token_budget or os.environ.get('CONTEXT_TOKEN_BUDGET', 1500))
+        self.lambda_mult = float(lambda_mult or os.environ.get('CONTEXT_MMR_LAMBDA', 0.7))
+        self.redundancy_threshold = float(redundancy_threshold or os.environ.get('CONTEXT_REDUNDANCY_THRESHOLD', 0.95))
+        self.min_truncated_tokens = min_truncated_tokens
+
+    def order(self, search_results, query_embedding=None) -> List[int]:
+        if query_embedding is None or search_results.embeddings is None or not len(search_results.ids):
+            return list(range(len(search_results.documents)))
+        return mmr_order(query_embedding, search_results.embeddings, self.lambda_mult, self.redundancy_threshold)
+
+    def assemble(self, search_results, query_embedding=None) -> AssembledContext:
+        context = AssembledContext(candidates=len(search_results.documents))
+        metadatas = search_results.metadatas or [None] * len(search_results.documents)
+        ids = search_results.ids or [""] * len(search_results.documents)
+        blocks = []
+        for i in self.order(search_results, query_embedding):
+            remaining = self.token_budget - context.tokens
+            if remaining < self.min_truncated_tokens:
+                break
+            source_id = f"S{len(blocks) + 1}"
+            header = f"[{source_id}] ({source_name(metadatas[i])})\n"
+            doc = search_results.documents[i]
+            header_tokens = count_tokens(header)
+            doc_tokens = count_tokens(doc)
+            if header_tokens + doc_tokens > remaining:
+                doc = truncate_to_tokens(doc, remaining - header_tokens)
+                if count_tokens(doc) < self.min_truncated_tokens:
+                    continue
+                doc_tokens = count_tokens(doc)
+                context.truncated += 1
+            blocks.append(header + doc)
+            context.source_ids.append(source_id)
+            context.chunk_ids.append(ids[i])
+            context.tokens += header_tokens + doc_tokens
+        context.text = "\n\n".join(blocks)
+        return context
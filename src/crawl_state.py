@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+
+from src.cache import text_hash
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+load_dotenv()
+
+
+def faq_key(url: str, question: str) -> str:
+    """Stable identity of an FAQ entry across crawls: the page it is on and its question."""
+    return text_hash(f"{url}\n{question}")[:16]
+
+
+def diff_faqs(previous: List[Dict[str, Any]], current: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Compare two FAQ datasets by `faq_key`. Returns the added and changed entries
+    (as they are now) and the removed entries (as they were).
+    """
+    before = {item["faq_key"]: item for item in previous if "faq_key" in item}
+    after = {item["faq_key"]: item for item in current}
+    return {
+        "added": [item for key, item in after.items() if key not in before],
+        "changed": [item for key, item in after.items() if key in before and before[key] != item],
+        "removed": [item for key, item in before.items() if key not in after],
+    }
+
+
+class CrawlState:
+    """
+    Persistent per-page crawl state backed by SQLite.
+
+    For every crawled URL it keeps the validators from the last response (ETag,
+    Last-Modified), a hash of the page body, and the FAQs and links extracted from it,
+    so a re-crawl can send conditional requests and skip parsing unchanged pages.
+    """
+    def __init__(self, path: str = None):
+        self.path = path or os.environ.get('CRAWL_STATE_PATH', 'cache/crawl_state.sqlite')
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " content_hash TEXT,"
+            " faqs TEXT NOT NULL,"
+            " links TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, faqs, links FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, content_hash, faqs, links = row
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_hash": content_hash,
+            "faqs": json.loads(faqs),
+            "links": json.loads(links),
+        }
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], content_hash: str,
+            faqs: List[Dict[str, Any]], links: List[str]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, content_hash, faqs, links, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, content_hash, json.dumps(faqs, ensure_ascii=False), json.dumps(links), time.time())
+            )
+            self._conn.commit()
+
+    def touch(self, url: str, etag: Optional[str], last_modified: Optional[str]):
+        """Record fresh validators for a page whose content did not change."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pages SET etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified), fetched_at = ?"
+                " WHERE url = ?",
+                (etag, last_modified, time.time(), url)
+            )
+            self._conn.commit()
+
+    def urls(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT url FROM pages ORDER BY url")]
+
+    def remove(self, urls: List[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM pages WHERE url = ?", [(url,) for url in urls])
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
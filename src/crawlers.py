@@ -1,14 +1,35 @@
-import requests
+import os
 import time
+import random
 import logging
-from bs4 import BeautifulSoup
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urljoin, urlparse
-from typing import Set, List, Dict
+from email.utils import parsedate_to_datetime
+from typing import Set, List, Dict, Optional
+
+from src.cache import text_hash
+from src.crawl_state import CrawlState, faq_key
+from src.html_extract import PageExtract, get_extractor, resolve_url
+from src.rate_limit import TokenBucket
+
+# Rate limits and transient server errors: retried with backoff before a page is given up.
+RETRY_STATUSES = (429, 502, 503, 504)
 
 class AngelOneFAQCrawler:
     """
     Crawler for the Angel One FAQ/Support static website.
     Scrapes categories, questions, answers into structured JSON.
+
+    Pages are crawled breadth-first: up to `concurrency` fetches run on a thread pool
+    over one pooled (keep-alive) session, while the main thread parses pages in the
+    order they were discovered, so the output order does not depend on fetch timing.
+    Each host is throttled by a token bucket instead of a fixed sleep; 429 and 5xx
+    gateway answers pause the host's bucket (for Retry-After when given) and are retried.
+    Pages are read with a single-pass extractor (HTML_PARSER, see src/html_extract.py).
     """
     BASE_URL = "https://www.angelone.in"
     START_PATH = "/support"
@@ -24,123 +45,270 @@ class AngelOneFAQCrawler:
         self,
         start_url: str = None,
         max_depth: int = 10,
-        sleep_between_requests: float = 1.5
+        concurrency: int = None,
+        requests_per_second: float = None,
+        max_pages: int = None,
+        max_time: float = None,
+        timeout: float = 15,
+        state: Optional[CrawlState] = None,
+        max_retries: int = None
     ):
         """
         :param start_url: URL to begin crawling (defaults to Angel One support)
         :param max_depth: Maximum crawl depth
-        :param sleep_between_requests: Politeness delay (seconds)
+        :param concurrency: Number of concurrent fetches (CRAWL_CONCURRENCY)
+        :param requests_per_second: Politeness budget per host (CRAWL_RATE_PER_HOST)
+        :param max_pages: Stop after this many pages, 0 = no limit (CRAWL_MAX_PAGES)
+        :param max_time: Stop after this many seconds, 0 = no limit (CRAWL_MAX_TIME)
+        :param timeout: Per-request timeout (seconds)
+        :param state: Crawl state store for incremental re-crawls (optional)
+        :param max_retries: Retries of a page answering 429/502/503/504 (CRAWL_MAX_RETRIES)
         """
         self.start_url = start_url or urljoin(self.BASE_URL, self.START_PATH)
         self.max_depth = max_depth
-        self.sleep_between_requests = sleep_between_requests
+        self.concurrency = concurrency or int(os.environ.get('CRAWL_CONCURRENCY', 8))
+        self.requests_per_second = requests_per_second or float(os.environ.get('CRAWL_RATE_PER_HOST', 4))
+        self.max_pages = max_pages if max_pages is not None else int(os.environ.get('CRAWL_MAX_PAGES', 0))
+        self.max_time = max_time if max_time is not None else float(os.environ.get('CRAWL_MAX_TIME', 0))
+        self.timeout = timeout
+        self.state = state
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get('CRAWL_MAX_RETRIES', 3))
+        self.extractor = get_extractor()
+        # Links are followed on the start URL's host, so fixture servers can be crawled too.
+        self.host = self._bare_host(urlparse(self.start_url).netloc)
+
+        self.session = requests.Session()
+        self.session.headers.update(self.DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+        self._valid_links: Dict[str, bool] = {}
 
         self.visited: Set[str] = set()
         self.faq_data: List[Dict[str, str]] = []
+        self.stats: Dict[str, int] = {}
         logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
+    @staticmethod
+    def _bare_host(netloc: str) -> str:
+        return netloc[4:] if netloc.startswith("www.") else netloc
+
     def crawl(self):
         """
-        Start crawling from the initial URL, recursively.
+        Start crawling from the initial URL, breadth-first.
+
+        With a `state` store, pages are fetched conditionally and only re-parsed when
+        their content changed. The returned dataset always covers every known page:
+        pages that could not be fetched this time keep their previous FAQs, and pages
+        that are gone (404/410, or no longer linked after a complete crawl) are dropped.
         """
-        logging.info(f"Starting crawl from {self.start_url} (max_depth={self.max_depth}) ...")
-        self._crawl_recursive(self.start_url)
-        logging.info(f"Crawl complete. {len(self.faq_data)} FAQ entries found.")
+        logging.info(
+            f"Starting crawl from {self.start_url} (max_depth={self.max_depth}, concurrency={self.concurrency}, "
+            f"{self.requests_per_second}/s per host) ..."
+        )
+        start = time.monotonic()
+        deadline = start + self.max_time if self.max_time else None
+        self.visited = set()
+        self.faq_data = []
+        self.stats = {"parsed": 0, "unchanged": 0, "kept": 0, "gone": 0, "removed": 0}
+        seen = set()  # pages that are part of this crawl's dataset
+        complete = True
+        pending = deque()  # (url, depth, future) in discovery order
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            def schedule(url: str, depth: int):
+                nonlocal complete
+                if url in self.visited or depth > self.max_depth:
+                    return
+                if self.max_pages and len(self.visited) >= self.max_pages:
+                    complete = False
+                    return
+                self.visited.add(url)
+                pending.append((url, depth, executor.submit(self._fetch, url, deadline)))
+
+            schedule(resolve_url(self.start_url, ""), 0)
+            while pending:
+                if deadline and time.monotonic() > deadline:
+                    logging.warning(f"Crawl time budget of {self.max_time}s exhausted; {len(pending)} pages not processed.")
+                    for _, _, future in pending:
+                        future.cancel()
+                    complete = False
+                    break
+                url, depth, future = pending.popleft()
+                response = future.result()
+                if response is None or response.status_code in RETRY_STATUSES:
+                    # Pages only linked from this one were not reached, so they are not gone
+                    complete = False
+                page = self._process_response(url, response)
+                if page is None:
+                    continue
+                faqs, links = page
+                seen.add(url)
+                self.faq_data.extend(faqs)
+                for link in links:
+                    if link not in self.visited:
+                        schedule(link, depth + 1)
+
+        if self.max_pages and not complete:
+            logging.info(f"Crawl page budget of {self.max_pages} reached.")
+        if self.state is not None:
+            self._reconcile_state(seen, complete)
+        logging.info(
+            f"Crawl complete. {len(self.faq_data)} FAQ entries found on {len(self.visited)} pages "
+            f"in {time.monotonic() - start:.1f}s. "
+            + ", ".join(f"{name}: {count}" for name, count in self.stats.items())
+        )
         return self.faq_data
 
-    def _crawl_recursive(self, url: str, depth: int = 0):
-        if url in self.visited or depth > self.max_depth:
-            return
-        self.visited.add(url)
+    def _process_response(self, url: str, response: Optional[requests.Response]):
+        """
+        Turn a fetch result into (faqs, links) for the page, or None if the page has
+        nothing to contribute. Parses only when the body changed since the last crawl.
+        """
+        record = self.state.get(url) if self.state is not None else None
+        if response is not None and response.status_code in (404, 410):
+            self.stats["gone"] += 1
+            return None
+        if response is None or not (response.ok or response.status_code == 304):
+            if record:
+                self.stats["kept"] += 1
+                return record["faqs"], record["links"]
+            return None
+
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if response.status_code == 304 and record:
+            self.state.touch(url, etag, last_modified)
+            self.stats["unchanged"] += 1
+            return record["faqs"], record["links"]
+
+        html = response.text
+        content_hash = text_hash(html)
+        if record and record["content_hash"] == content_hash:
+            self.state.touch(url, etag, last_modified)
+            self.stats["unchanged"] += 1
+            return record["faqs"], record["links"]
         try:
-            response = requests.get(url, headers=self.DEFAULT_HEADERS, timeout=15)
-            if not response.ok:
-                logging.warning(f"Failed to fetch {url} (status {response.status_code})")
-                return
-            soup = BeautifulSoup(response.text, "html.parser")
-            self._parse_faqs_from_page(soup, url)
-
-            # Get both sidebar and internal links related to support
-            links = self._get_all_sidebar_links(soup, url) | self._get_internal_links(soup, url)
-            links -= self.visited  # avoid revisiting
-
-            time.sleep(self.sleep_between_requests)
-            for link in links:
-                self._crawl_recursive(link, depth + 1)
+            page = self.extractor.extract(html)
+            faqs = self._page_faqs(page, url)
+            links = self._page_links(page, url)
         except Exception as ex:
             logging.error(f"Exception while processing {url}: {ex}")
+            return (record["faqs"], record["links"]) if record else None
+        self.stats["parsed"] += 1
+        if self.state is not None:
+            self.state.put(url, etag, last_modified, content_hash, faqs, links)
+        return faqs, links
+
+    def _reconcile_state(self, seen: Set[str], complete: bool):
+        """
+        Drop pages that are gone from the state store. After a partial crawl, only pages
+        that answered 404/410 are gone; the FAQs of pages not reached are carried over.
+        """
+        known = self.state.urls()
+        if complete:
+            removed = [url for url in known if url not in seen]
+        else:
+            removed = [url for url in known if url in self.visited and url not in seen]
+            for url in known:
+                if url not in self.visited:
+                    self.faq_data.extend(self.state.get(url)["faqs"])
+        self.state.remove(removed)
+        self.stats["removed"] = len(removed)
+
+    def _bucket_for(self, url: str) -> TokenBucket:
+        host = urlparse(url).netloc
+        with self._buckets_lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.requests_per_second)
+            return self._buckets[host]
 
     @staticmethod
-    def _clean(text: str) -> str:
-        return " ".join(text.strip().split()) if text else ""
-
-    def _extract_context_category(self, soup: BeautifulSoup) -> str:
-        cat = (
-            soup.select_one(".active-tax-title")
-            or soup.select_one("h1")
-            or soup.select_one("h2")
-        )
-        return self._clean(cat.text) if cat else ""
-
-    def _parse_faqs_from_page(self, soup: BeautifulSoup, url: str) -> bool:
-        category = self._extract_context_category(soup)
-        found = False
-        for tab in soup.select('.faqlist .tab'):
-            qelem = tab.select_one('.tab-label span')
-            aelem = tab.select_one('.tab-content .content')
-            if not qelem or not aelem:
+    def _retry_delay(response: requests.Response, attempt: int) -> float:
+        """Seconds to wait before retrying: Retry-After (seconds or HTTP date), else exponential backoff."""
+        retry_after = response.headers.get("Retry-After", "").strip()
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+        return min(60.0, 2.0 * 2 ** attempt) * (1 + random.random() * 0.25)
+
+    def _fetch(self, url: str, deadline: Optional[float] = None) -> Optional[requests.Response]:
+        """
+        Fetch one page under its host's rate limit, conditionally if the state store has
+        validators for it. Rate limits and transient server errors are retried up to
+        `max_retries` times. Returns the response, or None if the request failed.
+        """
+        bucket = self._bucket_for(url)
+        headers = {}
+        record = self.state.get(url) if self.state is not None else None
+        if record:
+            if record["etag"]:
+                headers["If-None-Match"] = record["etag"]
+            if record["last_modified"]:
+                headers["If-Modified-Since"] = record["last_modified"]
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            if deadline and time.monotonic() > deadline:
+                return None
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException as ex:
+                logging.error(f"Exception while fetching {url}: {ex}")
+                return None
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                break
+            delay = self._retry_delay(response, attempt)
+            if deadline and time.monotonic() + delay > deadline:
+                break
+            logging.warning(f"{url} answered {response.status_code}, retrying in {delay:.1f}s "
+                            f"(attempt {attempt + 1}/{self.max_retries})")
+            # Pauses every fetch from this host; the next acquire() waits it out
+            bucket.penalize(delay)
+        if not (response.ok or response.status_code == 304):
+            logging.warning(f"Failed to fetch {url} (status {response.status_code})")
+        return response
+
+    def _page_faqs(self, page: PageExtract, url: str) -> List[Dict[str, str]]:
+        faqs = {}
+        for question, answer in page.faqs:
+            key = faq_key(url, question)
+            if key in faqs:
                 continue
-            question = self._clean(qelem.text)
-            answer = aelem.get_text(separator='\n', strip=True)
-            self.faq_data.append({
-                "category": category,
+            faqs[key] = {
+                "category": page.category,
                 "question": question,
                 "answer": answer,
-                "url": url
-            })
-            found = True
-        return found
-
-    def _is_valid_link(self, href: str) -> bool:
-        if not href:
-            return False
-        href_full = href if href.startswith("http") else urljoin(self.BASE_URL, href)
-        parsed = urlparse(href_full)
-        if "angelone.in/support" not in href_full:
-            return False
-        if "/support/hindi" in href_full or "/support/" not in href_full:
-            return False
-        if parsed.scheme not in ("http", "https"):
-            return False
-        return True
-
-    def _get_all_sidebar_links(self, soup: BeautifulSoup, curr_url: str) -> Set[str]:
-        selectors = [
-            "div.sidebar-section a",
-            "div.list-item ul.vertical.tabs a",
-            "div.shg-search a",
-            "li a"
-        ]
-        links = set()
-        for sel in selectors:
-            for a in soup.select(sel):
-                href = a.get("href")
-                if self._is_valid_link(href):
-                    full_url = urljoin(curr_url, href)
-                    if "/hindi" not in full_url:
-                        links.add(full_url)
-        return links
-
-    def _get_internal_links(self, soup: BeautifulSoup, curr_url: str) -> Set[str]:
-        links = set()
-        for a in soup.find_all("a", href=True):
-            href = a.get("href")
-            if self._is_valid_link(href):
-                full_url = urljoin(curr_url, href)
-                if "/hindi" not in full_url:
-                    links.add(full_url)
-        return links
+                "url": url,
+                "faq_key": key
+            }
+        return list(faqs.values())
 
-    
+    def _is_valid_link(self, full_url: str) -> bool:
+        valid = self._valid_links.get(full_url)
+        if valid is None:
+            parsed = urlparse(full_url)
+            valid = (
+                parsed.scheme in ("http", "https")
+                and self._bare_host(parsed.netloc) == self.host
+                and parsed.path.startswith(f"{self.START_PATH}/")
+                and "/hindi" not in full_url
+            )
+            self._valid_links[full_url] = valid
+        return valid
 
-    
\ No newline at end of file
+    def _page_links(self, page: PageExtract, curr_url: str) -> List[str]:
+        """Support links on the page (sidebar and body anchors alike), resolved and sorted."""
+        links = set()
+        for href in page.hrefs:
+            if href:
+                full_url = resolve_url(curr_url, href)
+                if self._is_valid_link(full_url):
+                    links.add(full_url)
+        return sorted(links)
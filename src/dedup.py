@@ -0,0 +1,140 @@
+import os
+import zlib
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.bm25 import tokenize
+from src.cache import text_hash
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+load_dotenv()
+
+# Prime just above 2**32 for the (a * x + b) % p hash family over 32-bit shingle hashes.
+_PRIME = np.uint64(4294967311)
+# Cap on the duplicate sources listed in a canonical chunk's metadata.
+MAX_LISTED_SOURCES = 20
+
+
+def source_label(metadata: Dict[str, Any]) -> str:
+    """Compact origin of a chunk for the `duplicate_sources` metadata field."""
+    label = (
+        metadata.get("url") or metadata.get("file") or metadata.get("table_csv")
+        or metadata.get("faq_file") or metadata.get("source", "")
+    )
+    if metadata.get("page_start") is not None:
+        label += f" p.{metadata['page_start']}"
+    elif metadata.get("row_idx") is not None:
+        label += f" row {metadata['row_idx']}"
+    return label
+
+
+class DuplicateSources:
+    """How many duplicates a canonical chunk has, and the first distinct places they came from."""
+    __slots__ = ("count", "labels")
+
+    def __init__(self):
+        self.count = 0
+        self.labels: Dict[str, None] = {}  # insertion-ordered set, capped at MAX_LISTED_SOURCES
+
+    def add(self, metadata: Dict[str, Any]):
+        self.count += 1
+        if len(self.labels) < MAX_LISTED_SOURCES:
+            self.labels.setdefault(source_label(metadata))
+
+
+def merge_duplicate_sources(metadata: Dict[str, Any], duplicates: Optional[DuplicateSources]) -> Dict[str, Any]:
+    """
+    Canonical chunk metadata extended with where its duplicates came from. With no
+    duplicates the fields are reset rather than dropped, since a Chroma metadata update
+    keeps keys it isn't given.
+    """
+    merged = dict(metadata)
+    merged["duplicate_count"] = duplicates.count if duplicates is not None else 0
+    merged["duplicate_sources"] = "; ".join(duplicates.labels) if duplicates is not None else ""
+    return merged
+
+
+class ChunkDeduplicator:
+    """
+    Streaming duplicate filter: the first chunk seen with some content is canonical,
+    and later chunks are matched against it.
+
+    Exact duplicates are found by hashing the normalized token stream (case,
+    whitespace and punctuation ignored). Near duplicates use MinHash over word
+    `shingle_size`-grams with LSH banding. Candidates that share a band are confirmed
+    when the estimated Jaccard similarity reaches `threshold`. Near duplicates must
+    also contain exactly the same numbers, so two plan sheets that differ only in
+    their fees or limits are both kept. Chunks shorter than `min_tokens` are matched
+    exactly only.
+    """
+    def __init__(
+        self,
+        threshold: float = None,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 3,
+        min_tokens: int = None,
+        seed: int = 1
+    ):
+        self.threshold = float(threshold or os.environ.get('DEDUP_THRESHOLD', 0.8))
+        self.min_tokens = int(min_tokens or os.environ.get('DEDUP_MIN_TOKENS', 20))
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+
+        self._exact: Dict[str, str] = {}  # normalized text hash -> canonical id
+        self._buckets: Dict[tuple, List[str]] = {}  # (numbers, band, band values) -> canonical ids
+        self._signatures: Dict[str, np.ndarray] = {}
+        self.removed = {"exact": 0, "near": 0}
+
+    def _signature(self, tokens: List[str]) -> np.ndarray:
+        k = self.shingle_size
+        shingles = {" ".join(tokens[i:i + k]) for i in range(max(1, len(tokens) - k + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((np.outer(hashes, self._a) + self._b) % _PRIME).min(axis=0)
+
+    def check(self, chunk_id: str, text: str) -> Optional[str]:
+        """
+        Register a chunk. Returns None if it is new (it becomes canonical), or the id
+        of the canonical chunk it duplicates.
+        """
+        tokens = tokenize(text)
+        exact_key = text_hash(" ".join(tokens))
+        canonical = self._exact.get(exact_key)
+        if canonical is not None:
+            self.removed["exact"] += 1
+            return canonical
+        self._exact[exact_key] = chunk_id
+        if len(tokens) < self.min_tokens:
+            return None
+
+        numbers = text_hash(" ".join(t for t in tokens if any(c.isdigit() for c in t)))
+        signature = self._signature(tokens)
+        band_keys = [
+            (numbers, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+        candidates = set()
+        for key in band_keys:
+            candidates.update(self._buckets.get(key, ()))
+        best, best_similarity = None, self.threshold
+        for candidate in sorted(candidates):
+            similarity = float(np.mean(self._signatures[candidate] == signature))
+            if similarity >= best_similarity and (best is None or similarity > best_similarity):
+                best, best_similarity = candidate, similarity
+        if best is not None:
+            self._exact[exact_key] = best
+            self.removed["near"] += 1
+            return best
+
+        for key in band_keys:
+            self._buckets.setdefault(key, []).append(chunk_id)
+        self._signatures[chunk_id] = signature
+        return None
@@ -1,108 +1,328 @@
 import os
+import re
 import json
 import csv
+import time
+import queue
 import logging
-from typing import List
+import threading
+from typing import List, Dict, Any, Iterator, Tuple, Set
 from openai import OpenAI
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.cache import EmbeddingCache, LRUCache, MISSING, normalize_query, text_hash
 from src.chroma_manager import ChromaManager
+from src.rate_limit import RateLimiter, call_with_backoff
+from src.tokens import estimate_tokens
+from src.chunking import TextChunker
+from src.dedup import ChunkDeduplicator, DuplicateSources, merge_duplicate_sources
+from src.microbatch import MicroBatcher
+from src import telemetry
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 load_dotenv()
 
+# Sentinel marking the end of a pipeline queue.
+_DONE = object()
+
+# FAQ files that repeat entries of the full dataset: per-crawl deltas and the timestamped
+# dumps (angelone_faqs_<YYYY-MM-DD_HH-MM-SS>.json) written before angelone_faqs.json.
+SKIPPED_FAQ_FILE_RE = re.compile(r"(?:_delta|_\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.json$", re.I)
+
+
+def make_chunk_id(chunk: str, metadata: Dict[str, Any]) -> str:
+    """
+    Deterministic chunk id: source type + source file + position in that file + content hash.
+    The same chunk always gets the same id, and any edit to it produces a new one.
+    FAQs carry a stable `faq_key` that replaces the position, so adding or removing one
+    FAQ doesn't change the ids of the others.
+    """
+    source_file = metadata.get("file") or metadata.get("table_csv") or metadata.get("faq_file") or ""
+    position = metadata.get("faq_key", metadata["chunk_id"])
+    return f"{metadata['source']}:{source_file}:{position}:{text_hash(chunk)[:16]}"
+
+
 class Embedder:
     """
     Handles text chunking, embedding, and metadata creation.
     """
-    def __init__(self, chunk_size: int = None, chunk_overlap: int = None, embed_model: str = None):
-        self.chunk_size = int(chunk_size or os.environ.get('PDF_CHUNK_SIZE', 1000))
-        self.chunk_overlap = int(chunk_overlap or os.environ.get('PDF_CHUNK_OVERLAP', 150))
+    def __init__(
+        self,
+        chunk_size: int = None,
+        chunk_overlap: int = None,
+        embed_model: str = None,
+        embed_dimensions: int = None,
+        use_cache: bool = True
+    ):
+        # Chunk budget in tokens; overlap is whole sentences/paragraphs up to that many tokens.
+        self.chunk_size = int(chunk_size or os.environ.get('CHUNK_MAX_TOKENS', 400))
+        self.chunk_overlap = int(chunk_overlap or os.environ.get('CHUNK_OVERLAP_TOKENS', 0))
+        self.chunker = TextChunker(self.chunk_size, self.chunk_overlap)
         self.embed_model = embed_model or os.environ.get('EMBED_MODEL')
-        self.client = OpenAI()
-
-    def chunk_text(self, text: str, filename: str = "") -> List[str]:
-        """Chunk long text with overlap."""
-        chunks = []
-        start = 0
-        while start < len(text):
-            end = min(start + self.chunk_size, len(text))
-            chunk = f'{filename} {text[start:end]}'
-            chunks.append(chunk)
-            if end == len(text):
-                break
-            start += self.chunk_size - self.chunk_overlap
-        return chunks
+        dimensions = embed_dimensions or os.environ.get('EMBED_DIMENSIONS')
+        self.embed_dimensions = int(dimensions) if dimensions else None
+        # Retries are handled by call_with_backoff so that 429s slow down every worker.
+        self.client = OpenAI(max_retries=0)
+        self.max_concurrency = int(os.environ.get('EMBED_MAX_CONCURRENCY', 4))
+        self.batch_max_tokens = int(os.environ.get('EMBED_BATCH_MAX_TOKENS', 20000))
+        self.batch_max_items = int(os.environ.get('EMBED_BATCH_MAX_ITEMS', 512))
+        rpm = os.environ.get('EMBED_RPM')
+        tpm = os.environ.get('EMBED_TPM')
+        self.rate_limiter = RateLimiter(int(rpm) if rpm else None, int(tpm) if tpm else None)
+        self.cache = EmbeddingCache() if use_cache else None
+        self.query_cache = LRUCache(int(os.environ.get('QUERY_CACHE_SIZE', 1024)))
+        # Query embeddings get their own table so they don't evict chunk embeddings or skew ingest stats
+        self.shared_query_cache = (
+            EmbeddingCache(self.cache.path, int(os.environ.get('QUERY_CACHE_SHARED_MAX_ENTRIES', 50000)),
+                           table="query_embeddings")
+            if self.cache is not None and os.environ.get('QUERY_CACHE_SHARED', '0') == '1' else None
+        )
+        # Embedding API usage by get_openai_embeddings, for run reports
+        self.usage = {"requests": 0, "texts": 0, "tokens": 0}
+        self._usage_lock = threading.Lock()
+        # Opt-in: concurrent query embeddings within the window share one API call.
+        window_ms = float(os.environ.get('EMBED_MICROBATCH_WINDOW_MS', 0))
+        self.query_batcher = MicroBatcher(
+            self._embed_batch, window_ms, int(os.environ.get('EMBED_MICROBATCH_MAX', 64)),
+            max_in_flight=self.max_concurrency, name="query-embed"
+        ) if window_ms > 0 else None
 
-    def process_text_folder(self, folder: str):
-        """Process all .txt files in a folder."""
-        all_chunks, all_metadata = [], []
-        for fname in os.listdir(folder):
+    def chunk_text(self, text: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Chunk long text at paragraph/sentence/page boundaries. Returns (chunk, page metadata) pairs."""
+        return self.chunker.chunk(text)
+
+    def iter_text_folder(self, folder: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (chunk, metadata) for all .txt files in a folder, one file at a time."""
+        for fname in sorted(os.listdir(folder)):
             if fname.lower().endswith('.txt'):
                 fpath = os.path.join(folder, fname)
                 with open(fpath, 'r', encoding='utf-8') as f:
                     pdf_text = f.read()
-                chunks = self.chunk_text(pdf_text, fname)
-                meta = [{"source": "text", "chunk_id": i, "file": fname} for i in range(len(chunks))]
-                all_chunks.extend(chunks)
-                all_metadata.extend(meta)
-        return all_chunks, all_metadata
+                for i, (chunk, page_meta) in enumerate(self.chunk_text(pdf_text)):
+                    yield chunk, {"source": "text", "chunk_id": i, "file": fname, **page_meta}
 
-    def process_tables_folder(self, folder: str):
-        """Process all .csv files in a folder."""
-        all_chunks, all_metadata = [], []
-        for fname in os.listdir(folder):
+    def iter_tables_folder(self, folder: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (chunk, metadata) for every row of all .csv files in a folder."""
+        for fname in sorted(os.listdir(folder)):
             if fname.lower().endswith('.csv'):
                 fpath = os.path.join(folder, fname)
                 with open(fpath, newline='', encoding='utf-8') as f:
                     reader = csv.DictReader(f)
                     for row_idx, row in enumerate(reader):
                         as_text = " | ".join(f"{k}: {v}" for k, v in row.items())
-                        all_chunks.append(as_text)
-                        all_metadata.append({
+                        yield as_text, {
                             "source": "table",
-                            "chunk_id": len(all_chunks) - 1,
+                            "chunk_id": row_idx,
                             "table_csv": fname,
                             "row_idx": row_idx
-                        })
-        return all_chunks, all_metadata
+                        }
 
-    def process_faq_folder(self, folder: str):
-        """Process all .json files as FAQ files in a folder."""
-        all_chunks, all_metadata = [], []
-        for fname in os.listdir(folder):
-            if fname.lower().endswith('.json'):
+    def iter_faq_folder(self, folder: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (chunk, metadata) for every FAQ in all .json files in a folder (crawl deltas and legacy dumps excluded)."""
+        for fname in sorted(os.listdir(folder)):
+            if fname.lower().endswith('.json') and not SKIPPED_FAQ_FILE_RE.search(fname):
                 fpath = os.path.join(folder, fname)
                 with open(fpath, 'r', encoding='utf-8') as f:
                     faqs = json.load(f)
                 for i, item in enumerate(faqs):
                     chunk = f"Question: {item['question'].strip()}\nAnswer: {item['answer'].strip()}\nCategory: {item.get('category','').strip()}"
-                    all_chunks.append(chunk)
-                    all_metadata.append({"source": "faq", "chunk_id": len(all_chunks) - 1, "faq_file": fname})
+                    meta = {"source": "faq", "chunk_id": i, "faq_file": fname}
+                    if item.get('faq_key'):
+                        meta["faq_key"] = item['faq_key']
+                    if item.get('url'):
+                        meta["url"] = item['url']
+                    yield chunk, meta
+
+    @staticmethod
+    def _collect(pairs):
+        all_chunks, all_metadata = [], []
+        for chunk, meta in pairs:
+            all_chunks.append(chunk)
+            all_metadata.append(meta)
         return all_chunks, all_metadata
 
+    def process_text_folder(self, folder: str):
+        """Process all .txt files in a folder."""
+        return self._collect(self.iter_text_folder(folder))
+
+    def process_tables_folder(self, folder: str):
+        """Process all .csv files in a folder."""
+        return self._collect(self.iter_tables_folder(folder))
+
+    def process_faq_folder(self, folder: str):
+        """Process all .json files as FAQ files in a folder."""
+        return self._collect(self.iter_faq_folder(folder))
+
+    def _embedding_kwargs(self, texts) -> Dict[str, Any]:
+        kwargs = {"model": self.embed_model, "input": texts}
+        if self.embed_dimensions:
+            kwargs["dimensions"] = self.embed_dimensions
+        return kwargs
+
+    def _create_embeddings(self, texts):
+        kwargs = self._embedding_kwargs(texts)
+        tokens = estimate_tokens(texts) if isinstance(texts, str) else sum(estimate_tokens(t) for t in texts)
+        return call_with_backoff(
+            self.client.embeddings.create, limiter=self.rate_limiter, tokens=tokens, **kwargs
+        )
+
+    def _token_batches(self, indices: List[int], texts: List[str]):
+        """Group text indices into request batches bounded by estimated tokens and item count."""
+        batch, batch_tokens = [], 0
+        for i in indices:
+            tokens = estimate_tokens(texts[i])
+            if batch and (batch_tokens + tokens > self.batch_max_tokens or len(batch) >= self.batch_max_items):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(i)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def _embed_batch(self, batch: List[str]):
+        response = self._create_embeddings(batch)
+        usage = getattr(response, "usage", None)
+        tokens = usage.prompt_tokens if usage is not None else sum(estimate_tokens(t) for t in batch)
+        with self._usage_lock:
+            self.usage["requests"] += 1
+            self.usage["texts"] += len(batch)
+            self.usage["tokens"] += tokens
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
     def get_openai_embeddings(self, texts: List[str]):
         """
-        Call OpenAI embedding endpoint in batches. Returns list of list-of-floats.
+        Call OpenAI embedding endpoint in batches. Returns list of list-of-floats,
+        in the same order as `texts`.
+        Texts already present in the embedding cache are not sent to the API. Batches are
+        sized by estimated tokens and sent concurrently (EMBED_MAX_CONCURRENCY in flight),
+        within the EMBED_RPM / EMBED_TPM budgets.
         """
-        embeddings = []
-        batch_size = 100
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i+batch_size]
-            response = self.client.embeddings.create(
-                model=self.embed_model,
-                input=batch
+        embeddings = [None] * len(texts)
+        if self.cache is not None:
+            for i, emb in self.cache.get_many(self.embed_model, self.embed_dimensions, texts).items():
+                embeddings[i] = emb
+        missing = [i for i, emb in enumerate(embeddings) if emb is None]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = {
+                executor.submit(self._embed_batch, [texts[j] for j in batch_idx]): batch_idx
+                for batch_idx in self._token_batches(missing, texts)
+            }
+            for future in as_completed(futures):
+                batch_idx = futures[future]
+                batch_embs = future.result()
+                for j, emb in zip(batch_idx, batch_embs):
+                    embeddings[j] = emb
+                if self.cache is not None:
+                    self.cache.put_many(
+                        self.embed_model, self.embed_dimensions, [texts[j] for j in batch_idx], batch_embs
+                    )
+        api_seconds = time.perf_counter() - start
+        if missing:
+            logging.info(f"Embedded {len(missing)} texts in {len(futures)} requests ({api_seconds:.1f}s)")
+
+        if self.cache is not None and texts:
+            hits = len(texts) - len(missing)
+            # Estimate the wall time saved from the per-text cost of the texts we did send.
+            saved = hits * api_seconds / len(missing) if missing else 0.0
+            stats = self.cache.stats()
+            logging.info(
+                f"Embedding cache: {hits} hits, {len(missing)} misses "
+                f"(~{saved:.1f}s saved this call; lifetime hit ratio {stats['hit_ratio']:.1%}, "
+                f"~{stats['tokens_saved']} tokens saved)"
             )
-            batch_embs = [item.embedding for item in response.data]
-            embeddings.extend(batch_embs)
         return embeddings
     
     def embed_user_query(self, query_text):
-        embedding = self.client.embeddings.create(
-                model=self.embed_model,
-                input=query_text
+        """
+        Embed a user query. Results are cached by normalized query text in an in-process
+        LRU and, with QUERY_CACHE_SHARED=1, in the shared on-disk embedding cache.
+        With EMBED_MICROBATCH_WINDOW_MS set, cache misses from concurrent callers are
+        embedded together in one request.
+        """
+        with telemetry.span("embed_query") as span:
+            return [self._embed_queries([query_text], span)[0]]
+
+    def embed_user_queries(self, query_texts: List[str]) -> List[List[float]]:
+        """
+        embed_user_query() for many queries, one embedding per query in input order.
+        Misses are submitted to the micro-batcher together, or sent in as few requests
+        as the EMBED_BATCH_* limits allow.
+        """
+        with telemetry.span("embed_queries", queries=len(query_texts)) as span:
+            return self._embed_queries(query_texts, span)
+
+    async def aembed_user_query(self, query_text: str, async_client):
+        """
+        embed_user_query() for the event loop: the same caches, with a miss embedded by
+        `async_client` (an AsyncOpenAI shared by the caller, which retries rate limits).
+        """
+        with telemetry.span("embed_query") as span:
+            found, pending = self._cached_queries([query_text], span)
+            if pending:
+                start = time.perf_counter()
+                response = await async_client.embeddings.create(**self._embedding_kwargs([query_text]))
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    span.set(prompt_tokens=usage.prompt_tokens)
+                self._store_queries(pending, [response.data[0].embedding], found, time.perf_counter() - start)
+            return [found[normalize_query(query_text)]]
+
+    def _cached_queries(self, query_texts: List[str], span):
+        """
+        ({normalized query: embedding} for the queries found in the query caches, and the
+        distinct (normalized query, query text) pairs still to embed).
+        """
+        keys = [normalize_query(q) for q in query_texts]
+        found = {}
+        for key in keys:
+            cached = self.query_cache.get(key)
+            if cached is not MISSING:
+                found[key] = cached[0]
+        hits = len(found)
+
+        start = time.perf_counter()
+        pending = list({key: q for key, q in zip(keys, query_texts) if key not in found}.items())
+        if pending and self.shared_query_cache is not None:
+            shared = self.shared_query_cache.get_many(self.embed_model, self.embed_dimensions, [k for k, _ in pending])
+            for i, embedding in shared.items():
+                found[pending[i][0]] = embedding
+                self.query_cache.put(pending[i][0], [embedding], time.perf_counter() - start)
+            pending = [item for item in pending if item[0] not in found]
+        span.set(hits=hits, shared_hits=len(found) - hits, misses=len(pending))
+        if len(keys) == 1:
+            span.set(cache="hit" if hits else "shared_hit" if not pending else "miss")
+        return found, pending
+
+    def _store_queries(self, pending, embeddings: List[List[float]], found: Dict[str, List[float]], seconds: float):
+        """Put freshly embedded queries in `found` and in the query caches."""
+        for (key, _), embedding in zip(pending, embeddings):
+            found[key] = embedding
+            self.query_cache.put(key, [embedding], seconds / len(pending))
+        if self.shared_query_cache is not None:
+            self.shared_query_cache.put_many(
+                self.embed_model, self.embed_dimensions, [key for key, _ in pending], embeddings
             )
 
-        q_embedding = [item.embedding for item in embedding.data]
-        return q_embedding
+    def _embed_queries(self, query_texts: List[str], span) -> List[List[float]]:
+        found, pending = self._cached_queries(query_texts, span)
+        if pending:
+            span.set(batched=self.query_batcher is not None)
+            start = time.perf_counter()
+            texts = [q for _, q in pending]
+            if self.query_batcher is not None:
+                futures = [self.query_batcher.submit(q) for q in texts]
+                embeddings = [future.result() for future in futures]
+            else:
+                embeddings, prompt_tokens = [], 0
+                for batch_idx in self._token_batches(list(range(len(texts))), texts):
+                    response = self._create_embeddings([texts[i] for i in batch_idx])
+                    embeddings.extend(item.embedding for item in sorted(response.data, key=lambda d: d.index))
+                    usage = getattr(response, "usage", None)
+                    prompt_tokens += usage.prompt_tokens if usage is not None else 0
+                span.set(prompt_tokens=prompt_tokens)
+            self._store_queries(pending, embeddings, found, time.perf_counter() - start)
+        return [found[normalize_query(q)] for q in query_texts]
 
 
 class DataIngestor:
@@ -128,25 +348,188 @@ class DataIngestor:
 
         self.embedder = Embedder(chunk_size, chunk_overlap, embed_model)
         self.chroma_manager = ChromaManager(chroma_collection, chroma_path)
+        self.batch_size = int(os.environ.get('INGEST_BATCH_SIZE', 500))
+        self.queue_size = int(os.environ.get('INGEST_QUEUE_SIZE', 2))
+        self.dedup = os.environ.get('DEDUP_ENABLED', '1') == '1'
+
+    def iter_chunks(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (chunk, metadata) from every source folder, lazily."""
+        # 1. PDFs and Docx text
+        yield from self.embedder.iter_text_folder(self.pdf_dir)
+        yield from self.embedder.iter_text_folder(self.docx_dir)
+        # 2. Tables
+        yield from self.embedder.iter_tables_folder(self.table_dir)
+        # 3. FAQs
+        yield from self.embedder.iter_faq_folder(self.faq_dir)
+
+    def _iter_new_batches(
+        self,
+        existing_ids: Set[str],
+        seen_ids: Set[str],
+        stats: Dict[str, int],
+        duplicates: Dict[str, DuplicateSources] = None
+    ):
+        """
+        Assign stable ids, drop chunks that are already stored (or repeated in this run)
+        and group the rest into batches of (chunks, metadatas, ids).
+
+        When `duplicates` is given, exact and near-duplicate chunks are dropped too, and
+        each one's origin is counted under the id of the canonical chunk it repeats.
+        """
+        deduplicator = ChunkDeduplicator() if duplicates is not None else None
+        chunks, metadatas, ids = [], [], []
+        for chunk, meta in self.iter_chunks():
+            chunk_id = make_chunk_id(chunk, meta)
+            # Identical ids mean identical content, so keep the first
+            if chunk_id in seen_ids:
+                continue
+            if deduplicator is not None:
+                canonical = deduplicator.check(chunk_id, chunk)
+                if canonical is not None:
+                    duplicates.setdefault(canonical, DuplicateSources()).add(meta)
+                    stats["duplicates"] += 1
+                    continue
+            seen_ids.add(chunk_id)
+            source = meta.get("source", "")
+            stats["by_source"][source] = stats["by_source"].get(source, 0) + 1
+            if chunk_id in existing_ids:
+                stats["unchanged"] += 1
+                continue
+            chunks.append(chunk)
+            metadatas.append(meta)
+            ids.append(chunk_id)
+            if len(ids) >= self.batch_size:
+                yield chunks, metadatas, ids
+                chunks, metadatas, ids = [], [], []
+        if ids:
+            yield chunks, metadatas, ids
+
+    def _update_duplicate_sources(self, duplicates: Dict[str, DuplicateSources]):
+        """
+        Duplicates can turn up after their canonical chunk was written, so their sources
+        are merged into the stored metadata once everything has been read. Canonical
+        chunks whose duplicates have all gone are cleared; unchanged metadata is not rewritten.
+        """
+        ids, metadatas = [], []
+        for chunk_id, _, meta in self.chroma_manager.iter_documents():
+            meta = meta or {}
+            if chunk_id not in duplicates and not meta.get("duplicate_count"):
+                continue
+            merged = merge_duplicate_sources(meta, duplicates.get(chunk_id))
+            if merged != meta:
+                ids.append(chunk_id)
+                metadatas.append(merged)
+        self.chroma_manager.update_metadatas(ids, metadatas)
+
+    def run(self, incremental: bool = True) -> Dict[str, Any]:
+        """
+        Chunk, embed and store every source folder as a streaming pipeline:
+        folder readers -> embedding -> Chroma writes, connected by bounded queues, so
+        memory stays flat with corpus size and each batch is queryable once written.
+
+        With `incremental=True` chunks whose id is already stored are skipped and, once
+        every folder has been processed, chunks that no longer exist are deleted. Because
+        ids are content-derived, an interrupted run resumes from the last committed batch
+        when run again. With `incremental=False`, or when the stored collection uses a
+        distance other than cosine, the collection is rebuilt from scratch.
+        Returns the run's chunk counts (by source type too) and embedding API usage.
+        """
+        if incremental and self.chroma_manager.needs_rebuild():
+            logging.warning("Stored collection does not use cosine distance; rebuilding it from scratch")
+            incremental = False
+        if incremental:
+            existing_ids = self.chroma_manager.get_existing_ids()
+        else:
+            self.chroma_manager.reset()
+            existing_ids = set()
 
-    def run(self):
-        # 1. Process PDFs and Docx text
-        pdf_chunks, pdf_metadata = self.embedder.process_text_folder(self.pdf_dir)
-        docx_chunks, docx_metadata = self.embedder.process_text_folder(self.docx_dir)
+        seen_ids = set()
+        stats = {"unchanged": 0, "written": 0, "duplicates": 0, "by_source": {}}
+        duplicates = {} if self.dedup else None
+        embed_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
 
-        # 2. Process tables
-        table_chunks, table_metadata = self.embedder.process_tables_folder(self.table_dir)
+        def put(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
 
-        # 3. Process FAQs
-        faq_chunks, faq_metadata = self.embedder.process_faq_folder(self.faq_dir)
+        def get(q):
+            while True:
+                try:
+                    return q.get(timeout=0.5)
+                except queue.Empty:
+                    if stop.is_set():
+                        return _DONE
 
-        # 4. Combine
-        all_chunks = pdf_chunks + docx_chunks + table_chunks + faq_chunks
-        all_metadata = pdf_metadata + docx_metadata + table_metadata + faq_metadata
+        def read_stage():
+            try:
+                for batch in self._iter_new_batches(existing_ids, seen_ids, stats, duplicates):
+                    put(embed_queue, batch)
+            except Exception as ex:
+                errors.append(ex)
+            finally:
+                put(embed_queue, _DONE)
 
-        logging.info(f"Total chunks to embed: {len(all_chunks)}")
+        def write_stage():
+            while True:
+                item = write_queue.get()
+                if item is _DONE:
+                    return
+                if errors:
+                    continue
+                chunks, metadatas, ids, embeddings = item
+                try:
+                    self.chroma_manager.ingest(chunks, metadatas, embeddings, ids=ids)
+                    stats["written"] += len(ids)
+                except Exception as ex:
+                    errors.append(ex)
+                    stop.set()
 
-        embeddings = self.embedder.get_openai_embeddings(all_chunks)
+        reader = threading.Thread(target=read_stage, name="ingest-reader", daemon=True)
+        writer = threading.Thread(target=write_stage, name="ingest-writer", daemon=True)
+        reader.start()
+        writer.start()
+        try:
+            while not errors:
+                batch = get(embed_queue)
+                if batch is _DONE:
+                    break
+                chunks, metadatas, ids = batch
+                embeddings = self.embedder.get_openai_embeddings(chunks)
+                put(write_queue, (chunks, metadatas, ids, embeddings))
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            write_queue.put(_DONE)
+            writer.join()
+            stop.set()
+        if errors:
+            raise errors[0]
 
-        self.chroma_manager.ingest(all_chunks, all_metadata, embeddings)
-        logging.info("Ingestion completed.")
+        # Only delete once every folder has been read, otherwise an interrupted
+        # run would remove chunks it simply hadn't reached yet.
+        stale_ids = existing_ids - seen_ids
+        self.chroma_manager.delete(stale_ids)
+        self._update_duplicate_sources(duplicates or {})
+        self.chroma_manager.build_lexical_index()
+        self.chroma_manager.build_source_centroids()
+        logging.info(
+            f"Ingestion completed. Total chunks: {len(seen_ids)}, written: {stats['written']}, "
+            f"unchanged: {stats['unchanged']}, duplicates removed: {stats['duplicates']}, "
+            f"stale removed: {len(stale_ids)}"
+        )
+        return {
+            "chunks": len(seen_ids),
+            **stats,
+            "stale_removed": len(stale_ids),
+            "embedding_requests": self.embedder.usage["requests"],
+            "embedding_texts": self.embedder.usage["texts"],
+            "embedding_tokens": self.embedder.usage["tokens"],
+        }
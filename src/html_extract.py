@@ -0,0 +1,185 @@
+import os
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Iterator, List, Tuple
+from urllib.parse import urljoin, urldefrag, urlparse
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+# Text inside these elements is not page content (matches BeautifulSoup's get_text).
+_SKIP_TEXT_TAGS = {"script", "style", "template"}
+
+
+def clean_text(text: str) -> str:
+    return " ".join(text.split()) if text else ""
+
+
+@dataclass
+class PageExtract:
+    """Everything the FAQ crawler needs from one support page."""
+    category: str = ""
+    faqs: List[Tuple[str, str]] = field(default_factory=list)  # (question, answer)
+    hrefs: List[str] = field(default_factory=list)  # every anchor href, in document order
+
+
+@lru_cache(maxsize=4096)
+def _origin(url: str) -> str:
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}/"
+
+
+@lru_cache(maxsize=65536)
+def _resolve(base: str, href: str) -> str:
+    return urldefrag(urljoin(base, href))[0]
+
+
+def resolve_url(base: str, href: str) -> str:
+    """
+    Absolute URL for `href` on page `base`, without its fragment. Memoized; hrefs that
+    don't depend on the page's path (absolute URLs and root-relative paths) share one
+    cache entry across all pages of a site.
+    """
+    href = href.strip()
+    if href.startswith(("http://", "https://")):
+        return _resolve("", href)
+    if href.startswith("/") and not href.startswith("//"):
+        return _resolve(_origin(base), href)
+    return _resolve(base, href)
+
+
+class LxmlExtractor:
+    """
+    Single-pass extractor on lxml's C parser. One walk over the document collects the
+    category candidates, the FAQ tabs and every anchor; each tab is then searched
+    for its question and answer within its own subtree.
+    """
+    name = "lxml"
+
+    def __init__(self):
+        import lxml.html
+        self._fromstring = lxml.html.fromstring
+
+    @staticmethod
+    def _classes(el) -> List[str]:
+        return (el.get("class") or "").split()
+
+    def _strings(self, el) -> Iterator[str]:
+        if isinstance(el.tag, str) and el.tag not in _SKIP_TEXT_TAGS:
+            if el.text:
+                yield el.text
+            for child in el:
+                yield from self._strings(child)
+                if child.tail:
+                    yield child.tail
+
+    def _first_descendant(self, tab, container_class: str, tag: str = None, cls: str = None):
+        for container in tab.iter():
+            if not isinstance(container.tag, str) or container_class not in self._classes(container):
+                continue
+            for el in container.iterdescendants():
+                if not isinstance(el.tag, str):
+                    continue
+                if (tag and el.tag == tag) or (cls and cls in self._classes(el)):
+                    return el
+        return None
+
+    def extract(self, html: str) -> PageExtract:
+        page = PageExtract()
+        if not html or not html.strip():
+            return page
+        root = self._fromstring(html)
+        title = h1 = h2 = None
+        tabs = []
+        for el in root.iter():
+            tag = el.tag
+            if not isinstance(tag, str):
+                continue
+            if tag == "a":
+                href = el.get("href")
+                if href is not None:
+                    page.hrefs.append(href)
+            elif tag == "h1" and h1 is None:
+                h1 = el
+            elif tag == "h2" and h2 is None:
+                h2 = el
+            classes = self._classes(el)
+            if not classes:
+                continue
+            if title is None and "active-tax-title" in classes:
+                title = el
+            if "tab" in classes and any("faqlist" in self._classes(a) for a in el.iterancestors()):
+                tabs.append(el)
+
+        cat = title if title is not None else h1 if h1 is not None else h2
+        page.category = clean_text("".join(self._strings(cat))) if cat is not None else ""
+        for tab in tabs:
+            qelem = self._first_descendant(tab, "tab-label", tag="span")
+            aelem = self._first_descendant(tab, "tab-content", cls="content")
+            if qelem is None or aelem is None:
+                continue
+            question = clean_text("".join(self._strings(qelem)))
+            answer = "\n".join(s.strip() for s in self._strings(aelem) if s.strip())
+            page.faqs.append((question, answer))
+        return page
+
+
+class Bs4Extractor:
+    """The same single-pass extraction on BeautifulSoup's pure-Python html.parser."""
+    name = "bs4"
+
+    def __init__(self):
+        from bs4 import BeautifulSoup
+        self._soup = BeautifulSoup
+
+    def extract(self, html: str) -> PageExtract:
+        page = PageExtract()
+        soup = self._soup(html or "", "html.parser")
+        title = h1 = h2 = None
+        tabs = []
+        for el in soup.find_all(True):
+            if el.name == "a":
+                href = el.get("href")
+                if href is not None:
+                    page.hrefs.append(href)
+            elif el.name == "h1" and h1 is None:
+                h1 = el
+            elif el.name == "h2" and h2 is None:
+                h2 = el
+            classes = el.get("class") or []
+            if not classes:
+                continue
+            if title is None and "active-tax-title" in classes:
+                title = el
+            if "tab" in classes and any("faqlist" in (p.get("class") or []) for p in el.parents):
+                tabs.append(el)
+
+        cat = title or h1 or h2
+        page.category = clean_text(cat.get_text()) if cat else ""
+        for tab in tabs:
+            qelem = tab.select_one(".tab-label span")
+            aelem = tab.select_one(".tab-content .content")
+            if not qelem or not aelem:
+                continue
+            page.faqs.append((clean_text(qelem.get_text()), aelem.get_text(separator="\n", strip=True)))
+        return page
+
+
+EXTRACTORS = {"lxml": LxmlExtractor, "bs4": Bs4Extractor}
+
+
+def get_extractor(name: str = None):
+    """
+    Build the HTML extractor named by `name` or HTML_PARSER ('lxml' by default).
+    Falls back to 'bs4' when lxml is not installed.
+    """
+    name = name or os.environ.get('HTML_PARSER', 'lxml')
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown HTML parser '{name}', expected one of {sorted(EXTRACTORS)}")
+    try:
+        return EXTRACTORS[name]()
+    except ImportError:
+        if name == "bs4":
+            raise
+        logging.warning(f"HTML parser '{name}' is not installed, falling back to bs4.")
+        return Bs4Extractor()
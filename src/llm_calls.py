@@ -1,20 +1,33 @@
 from openai import OpenAI
 import os
+import time
+import logging
 from dotenv import load_dotenv
 from src.prompts import TABLE_DATA_PARSING_PROMPT, TABLE_DATA_TUNING_PROMPT
+from src.cache import text_hash
+from src.context import AssembledContext, ContextAssembler, source_name
+from src.tokens import count_tokens
+from src import telemetry
 
 load_dotenv()
 model = os.environ.get("MODEL")
 client = OpenAI()
+# Table structuring retries through call_with_backoff (Parsers.structure_table), so the
+# SDK's own retries are off there; otherwise every backoff attempt could be 3 requests.
+table_client = client.with_options(max_retries=0)
+context_assembler = ContextAssembler()
+# Changes whenever the table prompt is edited, invalidating cached table output
+TABLE_PROMPT_VERSION = text_hash(TABLE_DATA_PARSING_PROMPT)[:12]
 
-def structure_table_data(data, text, file_name, as_markdown=True):
+def structure_table_data(data, text, file_name, as_markdown=True, usage=None):
 
-    output = structure_only_table_data(data, file_name, as_markdown)
+    output = structure_only_table_data(data, file_name, as_markdown, usage)
     # Thought of using a combination of text and table data to find exact table structure.
     # structured_data = structure_table_data_using_text(output, text)
     return output
 
-def structure_only_table_data(data, file_name, as_markdown):
+def structure_only_table_data(data, file_name, as_markdown, usage=None):
+    """`usage`, if given, is a dict whose prompt_tokens/completion_tokens are incremented."""
     # Format the dataframe
     if as_markdown:
         table = data.to_markdown(index=False)
@@ -30,10 +43,13 @@ def structure_only_table_data(data, file_name, as_markdown):
         {"role": "user", "content": query}
     ]
 
-    response = client.chat.completions.create(
+    response = table_client.chat.completions.create(
         model=model,
         messages=messages,
     )
+    if usage is not None and getattr(response, "usage", None) is not None:
+        usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + response.usage.prompt_tokens
+        usage["completion_tokens"] = usage.get("completion_tokens", 0) + response.usage.completion_tokens
     return response.choices[0].message.content.strip()
 
 
@@ -49,14 +65,35 @@ def structure_table_data_using_text(data, text):
         {"role": "user", "content": query}
     ]
 
-    response = client.chat.completions.create(
+    response = table_client.chat.completions.create(
         model=model,
         messages=messages,
     )
     return response.choices[0].message.content.strip()
 
 
-def get_llm_answer(user_query, search_results):
+def format_context(search_results) -> str:
+    """Render retrieved chunks as ranked context blocks for the answer prompt."""
+    metadatas = search_results.metadatas or [None] * len(search_results.documents)
+    return "".join(
+        f"<Rank {i}>\nSource: {source_name(meta)}\n{doc}\n</Rank {i}>\n"
+        for i, (doc, meta) in enumerate(zip(search_results.documents, metadatas), start=1)
+    )
+
+
+def prepare_context(search_results, query_embedding=None) -> AssembledContext:
+    """
+    Pick and pack the retrieved chunks for the answer prompt (see ContextAssembler).
+    A string is taken as ready-made context.
+    """
+    if isinstance(search_results, str):
+        return AssembledContext(text=search_results, tokens=count_tokens(search_results))
+    return context_assembler.assemble(search_results, query_embedding)
+
+
+def build_answer_messages(user_query, search_results, query_embedding=None):
+    if not isinstance(search_results, str):
+        search_results = prepare_context(search_results, query_embedding).text
     prompt = f"""
         You are an expert assistant for a chatbot. Here are the instructions:
 
@@ -66,8 +103,9 @@ def get_llm_answer(user_query, search_results):
         - You have to carefully analyse if the questions can be answered
         - otherwise do not use any external information beyond the context. 
         - HIf the answer is not contained in the context, respond with "I don't know based on the provided information."
+        - Cite the ids of the passages you used in square brackets, e.g. [S1] or [S2][S4].
 
-        Context: (retrieved results, ordered by relevance: Rank 1 is most relevant)
+        Context: (retrieved passages, most relevant first; each starts with its source id, e.g. [S1])
         {search_results}
 
         User's question:
@@ -79,7 +117,7 @@ def get_llm_answer(user_query, search_results):
         2. 5000 HSA SOB
         3. 5000 Bronze SOB
         4. 7350 Copper SOB
-        You will find this information in the filename given with context, If the user talks about then you may have to talk about those specific plans based on the context provided.
+        You will find this information in the source name given with each passage, If the user talks about then you may have to talk about those specific plans based on the context provided.
         But do not quote the filename as such.
 
     """
@@ -88,10 +126,117 @@ def get_llm_answer(user_query, search_results):
             {"role": "system", "content": "You are a helpful assistant. You will answer accuratly ONLY based on the provided information."},
             {"role": "user", "content": prompt}
         ]
-    
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages
+    return messages
+
+
+def _record_usage(span, context: AssembledContext, usage):
+    """Context packing and token usage of one answer, as span attributes."""
+    span.set(context_tokens=context.tokens, context_chunks=len(context.source_ids),
+             candidates=context.candidates, truncated=context.truncated)
+    if usage is not None:
+        span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+
+
+def _context_summary(context: AssembledContext, usage) -> str:
+    prompt_tokens = getattr(usage, "prompt_tokens", None) if usage is not None else None
+    return (
+        f"prompt {prompt_tokens if prompt_tokens is not None else '?'} tokens "
+        f"(context {context.tokens} tokens from {len(context.source_ids)}/{context.candidates} chunks, "
+        f"{context.truncated} truncated)"
     )
-    result = response.choices[0].message.content
-    return result
+
+
+def _answer_request(user_query, search_results, query_embedding=None, stream=False):
+    """The packed context and the chat.completions.create() arguments for one answer."""
+    context = prepare_context(search_results, query_embedding)
+    request = {"model": model, "messages": build_answer_messages(user_query, context.text)}
+    if stream:
+        request.update(stream=True, stream_options={"include_usage": True})
+    return context, request
+
+
+def _answer_result(span, context: AssembledContext, response, start: float) -> str:
+    """Record and log a finished answer, and return its text."""
+    usage = getattr(response, 'usage', None)
+    _record_usage(span, context, usage)
+    logging.info(f"LLM answer: {_context_summary(context, usage)}, total {time.perf_counter() - start:.2f}s")
+    return response.choices[0].message.content
+
+
+class _StreamProgress:
+    """Usage and time to first token of a streamed answer, fed one chunk at a time."""
+    def __init__(self, span, context: AssembledContext):
+        self.span = span
+        self.context = context
+        self.start = time.perf_counter()
+        self.first_token_at = None
+        self.usage = None
+
+    def delta(self, chunk):
+        """The text a stream chunk adds, if any."""
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return None
+        delta = chunk.choices[0].delta.content
+        if delta and self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        return delta
+
+    def finish(self):
+        total = time.perf_counter() - self.start
+        ttft = (self.first_token_at - self.start) if self.first_token_at is not None else total
+        _record_usage(self.span, self.context, self.usage)
+        self.span.set(ttft_s=round(ttft, 4))
+        logging.info(
+            f"LLM answer (streamed): {_context_summary(self.context, self.usage)}, "
+            f"time to first token {ttft:.2f}s, total {total:.2f}s"
+        )
+
+
+def get_llm_answer(user_query, search_results, query_embedding=None):
+    """
+    Answer `user_query` from the retrieved chunks. Pass the query embedding to re-rank
+    them with MMR before they are packed into the context token budget.
+    """
+    context, request = _answer_request(user_query, search_results, query_embedding)
+    start = time.perf_counter()
+    with telemetry.span("llm", model=model, streamed=False) as span:
+        response = client.chat.completions.create(**request)
+        return _answer_result(span, context, response, start)
+
+
+def stream_llm_answer(user_query, search_results, query_embedding=None):
+    """
+    Streaming variant of get_llm_answer: yields the answer text piece by piece as tokens arrive.
+    Prompt size, time-to-first-token and total latency are logged once the stream is consumed.
+    """
+    context, request = _answer_request(user_query, search_results, query_embedding, stream=True)
+    with telemetry.span("llm", model=model, streamed=True) as span:
+        progress = _StreamProgress(span, context)
+        for chunk in client.chat.completions.create(**request):
+            delta = progress.delta(chunk)
+            if delta:
+                yield delta
+        progress.finish()
+
+
+async def aget_llm_answer(async_client, user_query, search_results, query_embedding=None):
+    """Async get_llm_answer on a shared AsyncOpenAI client, for the HTTP service."""
+    context, request = _answer_request(user_query, search_results, query_embedding)
+    start = time.perf_counter()
+    with telemetry.span("llm", model=model, streamed=False) as span:
+        response = await async_client.chat.completions.create(**request)
+        return _answer_result(span, context, response, start)
+
+
+async def astream_llm_answer(async_client, user_query, search_results, query_embedding=None):
+    """Async stream_llm_answer on a shared AsyncOpenAI client, for the HTTP service."""
+    context, request = _answer_request(user_query, search_results, query_embedding, stream=True)
+    with telemetry.span("llm", model=model, streamed=True) as span:
+        progress = _StreamProgress(span, context)
+        async for chunk in await async_client.chat.completions.create(**request):
+            delta = progress.delta(chunk)
+            if delta:
+                yield delta
+        progress.finish()
@@ -0,0 +1,50 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+
+def file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParseManifest:
+    """
+    Records the content hash of every successfully parsed source file, so unchanged
+    files can be skipped on the next run. Stored as JSON next to the parsed output.
+    """
+    def __init__(self, path: str = None):
+        self.path = path or os.environ.get('PARSE_MANIFEST_PATH', 'static/parsed_data/manifest.json')
+        self.entries: Dict[str, Dict[str, str]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def is_unchanged(self, file_path: str, content_hash: str, parser: str) -> bool:
+        entry = self.entries.get(os.path.basename(file_path))
+        return bool(entry) and entry["sha256"] == content_hash and entry["parser"] == parser
+
+    def record(self, file_path: str, content_hash: str, parser: str):
+        self.entries[os.path.basename(file_path)] = {
+            "sha256": content_hash,
+            "parser": parser,
+            "parsed_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def get(self, file_path: str) -> Optional[Dict[str, str]]:
+        return self.entries.get(os.path.basename(file_path))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,88 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item calls into batched calls of `fn(items) -> results`.
+
+    The first request to arrive opens a batch; requests arriving within `window_ms`
+    after it, up to `max_batch` of them, join it. The batch is then sent as one `fn`
+    call (up to `max_in_flight` calls run at once) and each caller gets its own result,
+    or the batch's exception. Identical items in a batch are sent once. At low traffic
+    a request waits at most `window_ms` longer than it would unbatched.
+    """
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], window_ms: float = 10, max_batch: int = 64,
+                 max_in_flight: int = 4, name: str = "microbatch"):
+        self.fn = fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self.name = name
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_in_flight)), thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.requests = 0
+        self.batches = 0
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item: Hashable) -> Future:
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Hashable) -> Any:
+        return self.submit(item).result()
+
+    def _collect(self) -> List[tuple]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            self._executor.submit(self._dispatch, self._collect())
+
+    def _dispatch(self, batch: List[tuple]):
+        waiting: Dict[Hashable, List[Future]] = {}
+        for item, future in batch:
+            if future.set_running_or_notify_cancel():
+                waiting.setdefault(item, []).append(future)
+        if not waiting:
+            return
+        items = list(waiting)
+        with self._lock:
+            self.requests += len(batch)
+            self.batches += 1
+        try:
+            results = self.fn(items)
+        except Exception as e:
+            for futures in waiting.values():
+                for future in futures:
+                    future.set_exception(e)
+            return
+        for item, result in zip(items, results):
+            for future in waiting[item]:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch": self.requests / self.batches if self.batches else 0.0,
+        }
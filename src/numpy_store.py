@@ -0,0 +1,302 @@
+import os
+import glob
+import json
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.chroma_manager import QueryResult, WRITE_BATCH_SIZE
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+load_dotenv()
+
+# Rows scored per matmul block; bounds the float32 working set for float16 stores.
+SCORE_BLOCK_ROWS = 65536
+
+
+class NumpyVectorStore:
+    """
+    Vector storage as a contiguous, memory-mapped float32/float16 matrix.
+
+    Layout under `<persist_path>/<collection>.npstore/`:
+        vectors.bin   unit-normalized embeddings, one row per chunk, append-only
+                      (vectors.<generation>.bin once the store has been compacted)
+        meta.sqlite   row number -> id, document, metadata, source; dim, dtype and
+                      the current matrix generation
+
+    Upserts append rows and deletes drop the sidecar record, leaving a dead row in the
+    matrix until it is compacted. Compaction writes the next generation's file and
+    switches the generation and row numbers in one SQLite transaction, so the row map
+    always matches the file it names. Queries score every row with a blocked dot product
+    and take the top k with argpartition; distances are cosine distances (1 - cosine).
+    The matrix is opened read-only with np.memmap, so every process serving queries
+    shares the same pages of the OS cache instead of holding its own copy.
+    """
+    def __init__(self, collection_name: str, persist_path: str, dtype: str = None):
+        self.collection_name = collection_name
+        self.dir = os.path.join(persist_path, f"{collection_name}.npstore")
+        os.makedirs(self.dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.dir, "meta.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " row INTEGER PRIMARY KEY,"
+            " id TEXT UNIQUE NOT NULL,"
+            " document TEXT,"
+            " metadata TEXT,"
+            " source TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+        self._default_dtype = np.dtype(dtype or os.environ.get('NUMPY_STORE_DTYPE', 'float32'))
+        self._read_info()
+        self._matrix = None
+
+    def _get_info(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_info(self, key: str, value):
+        self._conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _vectors_path(self, generation: int) -> str:
+        return os.path.join(self.dir, "vectors.bin" if not generation else f"vectors.{generation}.bin")
+
+    def _read_info(self):
+        """Dim, dtype and matrix file as last committed; another process may have changed them."""
+        dim, dtype, generation = (self._get_info(key) for key in ("dim", "dtype", "generation"))
+        self.dim = int(dim) if dim else None
+        self.dtype = np.dtype(dtype) if dtype else self._default_dtype
+        self.generation = int(generation) if generation else 0
+        self.vectors_path = self._vectors_path(self.generation)
+
+    def _n_rows(self) -> int:
+        if not self.dim or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (self.dim * self.dtype.itemsize)
+
+    def refresh(self):
+        """Drop the mapped matrix and row table so the next query sees the latest writes."""
+        with self._lock:
+            self._matrix = None
+
+    def _load(self):
+        """
+        Map the matrix and build the row -> (id, source) table for the rows that are alive.
+        The info and row table are read in one transaction, so a compaction committed by
+        another process is seen either entirely or not at all.
+        """
+        if self._matrix is not None:
+            return
+        self._conn.execute("BEGIN")
+        try:
+            self._read_info()
+            n_rows = self._n_rows()
+            alive = np.zeros(n_rows, dtype=bool)
+            row_ids = np.empty(n_rows, dtype=object)
+            row_sources = np.empty(n_rows, dtype=object)
+            for row, chunk_id, source in self._conn.execute(
+                "SELECT row, id, source FROM chunks WHERE row < ?", (n_rows,)
+            ):
+                alive[row] = True
+                row_ids[row] = chunk_id
+                row_sources[row] = source
+        finally:
+            self._conn.execute("COMMIT")
+        matrix = (
+            np.memmap(self.vectors_path, dtype=self.dtype, mode='r', shape=(n_rows, self.dim))
+            if n_rows else np.zeros((0, self.dim or 0), dtype=self.dtype)
+        )
+        self._alive, self._row_ids, self._row_sources = alive, row_ids, row_sources
+        self._matrix = matrix
+
+    def needs_rebuild(self) -> bool:
+        return False
+
+    def reset(self):
+        with self._lock:
+            self._matrix = None
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM info")
+            self._conn.commit()
+            for path in glob.glob(os.path.join(self.dir, "vectors*.bin*")):
+                os.remove(path)
+            self._read_info()
+        logging.info(f"Deleted numpy vector store '{self.collection_name}'")
+
+    def iter_documents(self, page_size: int = WRITE_BATCH_SIZE):
+        cursor = self._conn.execute("SELECT id, document, metadata FROM chunks ORDER BY row")
+        while True:
+            rows = cursor.fetchmany(page_size)
+            if not rows:
+                return
+            for chunk_id, doc, meta in rows:
+                yield chunk_id, doc, json.loads(meta)
+
+    def iter_source_embeddings(self, page_size: int = WRITE_BATCH_SIZE):
+        with self._lock:
+            self._load()
+            matrix, alive, sources = self._matrix, self._alive, self._row_sources
+        for row in np.flatnonzero(alive):
+            yield sources[row], matrix[row]
+
+    def get_existing_ids(self, page_size: int = WRITE_BATCH_SIZE) -> Set[str]:
+        return {row[0] for row in self._conn.execute("SELECT id FROM chunks")}
+
+    def get(self, ids: List[str], include_embeddings: bool = False):
+        found = []
+        with self._lock:
+            if include_embeddings:
+                self._load()
+                matrix = self._matrix
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT id, document, metadata, row FROM chunks WHERE id IN ({placeholders})", batch
+                ).fetchall()
+                for chunk_id, doc, meta, row in rows:
+                    if include_embeddings:
+                        found.append((chunk_id, doc, json.loads(meta), np.asarray(matrix[row], dtype=np.float32)))
+                    else:
+                        found.append((chunk_id, doc, json.loads(meta)))
+        return found
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def upsert(self, ids, chunks, metadatas, embeddings):
+        with self._lock:
+            self._read_info()
+            vectors = self._normalize(np.asarray(embeddings, dtype=np.float32)).astype(self.dtype)
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._set_info("dim", self.dim)
+                self._set_info("dtype", self.dtype.name)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self.dim}")
+            first_row = self._n_rows()
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (row, id, document, metadata, source) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (first_row + i, chunk_id, doc, json.dumps(meta), (meta or {}).get("source", ""))
+                    for i, (chunk_id, doc, meta) in enumerate(zip(ids, chunks, metadatas))
+                ]
+            )
+            self._conn.commit()
+            self._matrix = None
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET metadata = ?, source = ? WHERE id = ?",
+                [(json.dumps(meta), (meta or {}).get("source", ""), chunk_id) for chunk_id, meta in zip(ids, metadatas)]
+            )
+            self._conn.commit()
+            self._matrix = None
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            self._read_info()
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", batch)
+            self._conn.commit()
+            self._matrix = None
+            alive = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            if alive < self._n_rows() // 2:
+                self._compact()
+
+    def _compact(self):
+        """
+        Rewrite the matrix without dead rows into the next generation's file, then switch
+        the generation and renumber the rows in one transaction. A crash before the commit
+        leaves the old file and row map in use; after it, the new ones. The previous file
+        is kept for readers that mapped it and removed by the next compaction.
+        """
+        rows = [row for (row,) in self._conn.execute("SELECT row FROM chunks ORDER BY row")]
+        n_rows = self._n_rows()
+        old = np.memmap(self.vectors_path, dtype=self.dtype, mode='r', shape=(n_rows, self.dim)) if n_rows else None
+        previous_path = self.vectors_path
+        generation = self.generation + 1
+        new_path = self._vectors_path(generation)
+        with open(new_path, "wb") as f:
+            for i in range(0, len(rows), SCORE_BLOCK_ROWS):
+                f.write(np.ascontiguousarray(old[rows[i:i + SCORE_BLOCK_ROWS]]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        del old
+        # Rows only move down, so renumbering in ascending order never collides
+        self._conn.executemany(
+            "UPDATE chunks SET row = ? WHERE row = ?", [(new, old_row) for new, old_row in enumerate(rows)]
+        )
+        self._set_info("generation", generation)
+        self._conn.commit()
+        self.generation, self.vectors_path = generation, new_path
+        for path in glob.glob(os.path.join(self.dir, "vectors*.bin")):
+            if path not in (new_path, previous_path):
+                os.remove(path)
+        logging.info(f"Compacted numpy vector store '{self.collection_name}' from {n_rows} to {len(rows)} rows")
+
+    def _filter_mask(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        mask = self._alive
+        if not where:
+            return mask
+        if set(where) != {"source"}:
+            raise ValueError(f"Unsupported filter for numpy vector store: {where}")
+        cond = where["source"]
+        if isinstance(cond, dict) and set(cond) == {"$in"}:
+            allowed = list(cond["$in"])
+        elif isinstance(cond, dict) and set(cond) == {"$eq"}:
+            allowed = [cond["$eq"]]
+        elif isinstance(cond, str):
+            allowed = [cond]
+        else:
+            raise ValueError(f"Unsupported filter for numpy vector store: {where}")
+        return mask & np.isin(self._row_sources, allowed)
+
+    def query(self, embeddings, n_results: int, where: Optional[Dict[str, Any]] = None) -> List[QueryResult]:
+        with self._lock:
+            self._load()
+            matrix, row_ids = self._matrix, self._row_ids
+            mask = self._filter_mask(where)
+        if not len(matrix) or not mask.any():
+            return [QueryResult() for _ in embeddings]
+
+        queries = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        scores = np.empty((len(queries), len(matrix)), dtype=np.float32)
+        for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+            block = matrix[start:start + SCORE_BLOCK_ROWS]
+            scores[:, start:start + len(block)] = queries @ block.T.astype(np.float32, copy=False)
+        scores[:, ~mask] = -np.inf
+
+        k = min(n_results, int(mask.sum()))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for qi in range(len(queries)):
+            rows = top[qi][np.argsort(-scores[qi, top[qi]])]
+            by_id = {chunk_id: (doc, meta) for chunk_id, doc, meta in self.get([row_ids[row] for row in rows])}
+            # Skip chunks deleted by a concurrent write since the snapshot was taken
+            rows = [row for row in rows if row_ids[row] in by_id]
+            ids = [row_ids[row] for row in rows]
+            results.append(QueryResult(
+                ids=ids,
+                documents=[by_id[chunk_id][0] for chunk_id in ids],
+                metadatas=[by_id[chunk_id][1] for chunk_id in ids],
+                distances=[float(1.0 - scores[qi, row]) for row in rows],
+                embeddings=np.asarray(matrix[rows], dtype=np.float32)
+            ))
+        return results
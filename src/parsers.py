@@ -1,6 +1,11 @@
 import os
+import time
 import logging
-from typing import Optional, Optional
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from enum import auto, Enum
 
 import pdfplumber
@@ -12,7 +17,9 @@ from paddleocr import PPStructureV3
 from docx import Document
 
 from src.utils import clean_llm_csv
-from src.llm_calls import structure_table_data
+from src.cache import TableCache
+from src.rate_limit import RateLimiter, call_with_backoff
+from src.llm_calls import structure_table_data, TABLE_PROMPT_VERSION, model as llm_model
 
 
 class ParserType(Enum):
@@ -44,20 +51,38 @@ class Parsers:
     def __init__(self, 
                  folder_path: str = "static/insurace_data", 
                  output_dir: str = "static/parsed_data/pdf_table",
-                 poppler_path: Optional[str] = None):
+                 poppler_path: Optional[str] = None,
+                 rate_share: int = 1):
+        # rate_share: number of worker processes splitting the TABLE_LLM_RPM budget
         self.folder_path = folder_path
         self.output_dir = output_dir
         self.poppler_path = poppler_path
+        self.table_cache = TableCache()
+        self.table_concurrency = int(os.environ.get('TABLE_LLM_CONCURRENCY', 4))
+        rpm = os.environ.get('TABLE_LLM_RPM')
+        self.llm_rate_limiter = RateLimiter(max(1, int(rpm) // max(1, rate_share)) if rpm else None)
+        self.stats = {}
+        self._stats_lock = threading.Lock()
 
         os.makedirs(self.output_dir, exist_ok=True)
         logging.basicConfig(level=logging.INFO, 
                             format='%(asctime)s - %(levelname)s - %(message)s')
         
 
-    def parse(self, file_path: str, parser: str):
+    def _count(self, **increments):
+        with self._stats_lock:
+            for key, n in increments.items():
+                self.stats[key] = self.stats.get(key, 0) + n
+
+    def parse(self, file_path: str, parser: str) -> Dict[str, float]:
         """
         Dispatches to the selected parser according to the parser type string.
+        Returns stats for the file: parse time, pages, tables, and the table-structuring
+        LLM calls, cache hits and tokens.
         """
+        self.stats = {"parse_s": 0.0, "pages": 0, "tables": 0, "table_llm_calls": 0, "table_cache_hits": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0}
+        start = time.perf_counter()
         try:
             parser_enum = ParserType.from_str(parser)
         except ValueError as ve:
@@ -74,12 +99,18 @@ class Parsers:
             self.parse_paddleocr(file_path)
         elif parser_enum == ParserType.DOCX:
             self.parse_docx(file_path)
+        self.stats["parse_s"] = round(time.perf_counter() - start, 3)
+        return dict(self.stats)
 
     def parse_pdfplumber(self, file_path: str):
         """
         Parses PDF using pdfplumber.
         Extracts text and tables, saves results to output_dir.
+        Tables are structured by the LLM on a thread pool (TABLE_LLM_CONCURRENCY) while
+        the following pages are extracted; each CSV is written as soon as it is ready.
         """
+        executor = ThreadPoolExecutor(max_workers=self.table_concurrency)
+        futures = []
         try:
             output_dir_txt = 'static/parsed_data/pdf_text'
             output_dir_csv = 'static/parsed_data/pdf_table'
@@ -87,6 +118,7 @@ class Parsers:
             full_text = ""
             with pdfplumber.open(file_path) as pdf:
                 for page_number, page in enumerate(pdf.pages, start=1):
+                    self._count(pages=1)
                     text = page.extract_text()
 
                     if text and text.strip():
@@ -94,20 +126,18 @@ class Parsers:
                         tables = page.extract_tables()
 
                         if tables:
+                            self._count(tables=len(tables))
                             for t_idx, table in enumerate(tables, start=1):
                                 df = pd.DataFrame(table)
-                                structured_data = structure_table_data(df, text, file_name)
-                                cleaned_data = clean_llm_csv(structured_data)
                                 out_file = os.path.join(
                                     output_dir_csv, f"{file_name.replace('.pdf', '')}_page{page_number}_table{t_idx}.csv")
-                                os.makedirs(os.path.dirname(out_file), exist_ok=True)
-                                with open(out_file, "w", encoding="utf-8") as f:
-                                    f.write(cleaned_data)
-                                logging.info(f"Saved structured table to {out_file}")
+                                futures.append(executor.submit(self._save_structured_table, df, text, file_name, out_file))
                         else:
                             logging.info(f"No tables found on page {page_number} of {file_name}.")
                     else:
                         logging.info(f"No extractable text on page {page_number} of {file_name}.")
+            for future in futures:
+                future.result()
             output_file_path = os.path.join(output_dir_txt, file_name.replace('.pdf', '.txt'))
             os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
             with open(output_file_path, 'w', encoding='utf-8') as f:
@@ -115,8 +145,38 @@ class Parsers:
             print(f"Text written to {output_file_path}")
         except Exception as e:
             logging.error(f"Failed on {file_name}: {e}")
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
         logging.info("Completed pdfplumber parsing.")
 
+    def _save_structured_table(self, df: pd.DataFrame, text: str, file_name: str, out_file: str):
+        cleaned_data = self.structure_table(df, text, file_name)
+        os.makedirs(os.path.dirname(out_file), exist_ok=True)
+        with open(out_file, "w", encoding="utf-8") as f:
+            f.write(cleaned_data)
+        logging.info(f"Saved structured table to {out_file}")
+
+
+    def structure_table(self, df: pd.DataFrame, text: str, file_name: str) -> str:
+        """
+        Cleaned CSV for a raw pdfplumber table, from the table cache when the same table
+        (same file name, model and prompt version) has been structured before.
+        """
+        # The file name is part of the prompt and of every output row, so it is part of the key
+        cache_key = TableCache.make_key(llm_model, TABLE_PROMPT_VERSION, f"{file_name}\n{df.to_markdown(index=False)}")
+        cleaned_data = self.table_cache.get(cache_key)
+        if cleaned_data is None:
+            usage = {}
+            structured_data = call_with_backoff(
+                structure_table_data, df, text, file_name, usage=usage, limiter=self.llm_rate_limiter
+            )
+            cleaned_data = clean_llm_csv(structured_data)
+            self.table_cache.put(cache_key, cleaned_data)
+            self._count(table_llm_calls=1, **usage)
+        else:
+            self._count(table_cache_hits=1)
+        return cleaned_data
 
     def parse_docx(self, file_path: str) -> str:
         """
@@ -131,6 +191,7 @@ class Parsers:
         output_dir = 'static/parsed_data/docx'
         file_name = os.path.basename(file_path)
         doc = Document(file_path)
+        self._count(tables=len(doc.tables))
         # Extract from paragraphs
         full_text = [para.text for para in doc.paragraphs]
 
@@ -215,3 +276,72 @@ class Parsers:
                 logging.info(f"PaddleOCR results written for page {idx+1}")
         except Exception as e:
             logging.error(f"PaddleOCR failed on {file_name}: {e}")
+
+
+def _parse_worker(file_path: str, parser: str, conn, rate_share: int = 1):
+    """Process-pool entry point: parse one file and report success or the error."""
+    try:
+        stats = Parsers(rate_share=rate_share).parse(file_path=file_path, parser=parser)
+        conn.send(("ok", "", stats))
+    except Exception as e:
+        conn.send(("failed", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def parse_files_parallel(
+    jobs: List[Tuple[str, str]],
+    workers: int,
+    timeout: Optional[float] = None,
+    file_stats: Optional[Dict[str, Dict[str, float]]] = None
+) -> Dict[str, Tuple[str, str]]:
+    """
+    Parse (file_path, parser) jobs in up to `workers` child processes.
+
+    Every file runs in its own process, so a crash only affects that file and a file
+    that exceeds `timeout` seconds is terminated instead of stalling the batch.
+    Returns {file_path: (status, detail)} with status 'ok', 'failed' or 'timeout'.
+    The stats returned by Parsers.parse for each parsed file are put in `file_stats`.
+    Each process gets an equal share of TABLE_LLM_RPM, so together they stay within it.
+    """
+    ctx = multiprocessing.get_context()
+    rate_share = max(1, min(workers, len(jobs)))
+    pending = list(jobs)
+    running = {}  # sentinel -> (file_path, process, conn, started)
+    results = {}
+    while pending or running:
+        while pending and len(running) < workers:
+            file_path, parser = pending.pop(0)
+            recv_conn, send_conn = ctx.Pipe(duplex=False)
+            process = ctx.Process(target=_parse_worker, args=(file_path, parser, send_conn, rate_share), daemon=True)
+            process.start()
+            send_conn.close()
+            running[process.sentinel] = (file_path, process, recv_conn, time.monotonic())
+
+        now = time.monotonic()
+        wait_for = None
+        if timeout:
+            wait_for = max(0.0, min(started + timeout for _, _, _, started in running.values()) - now)
+        for sentinel in wait(list(running), timeout=wait_for):
+            file_path, process, conn, _ = running.pop(sentinel)
+            process.join()
+            try:
+                status, detail, *stats = conn.recv()
+                results[file_path] = (status, detail)
+                if stats and file_stats is not None:
+                    file_stats[file_path] = stats[0]
+            except EOFError:
+                results[file_path] = ("failed", f"worker exited with code {process.exitcode}")
+            conn.close()
+
+        if timeout:
+            now = time.monotonic()
+            for sentinel, (file_path, process, conn, started) in list(running.items()):
+                if now - started > timeout:
+                    process.terminate()
+                    process.join()
+                    conn.close()
+                    del running[sentinel]
+                    results[file_path] = ("timeout", f"exceeded {timeout}s")
+                    logging.error(f"Parsing {file_path} timed out after {timeout}s")
+    return {file_path: results[file_path] for file_path, _ in jobs}
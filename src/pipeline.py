@@ -0,0 +1,175 @@
+import os
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+from src.chroma_manager import ChromaManager, QueryResult
+from src.embeddings import Embedder
+from src.llm_calls import get_llm_answer, stream_llm_answer, aget_llm_answer, astream_llm_answer
+from src.router import QueryRouter, Route
+from src import telemetry
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+load_dotenv()
+
+
+async def _in_thread(fn, *args):
+    """asyncio.to_thread() that, if cancelled, waits for the thread to finish before re-raising."""
+    future = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait([future])
+        raise
+
+
+@dataclass
+class PreparedQuery:
+    """A query after routing and retrieval, ready for answer generation."""
+    query_text: str
+    route: Route
+    embedding: Optional[List[float]] = None
+    results: Optional[QueryResult] = None
+    span: Any = None  # telemetry span of the retrieval half; the answer joins its trace
+    timings: Dict[str, float] = field(default_factory=dict)  # embed_s, retrieve_s
+    widened: bool = False  # the preferred sources held nothing, so every source was searched
+
+
+class RAGPipeline:
+    """
+    The query path shared by every front-end: route -> embed -> retrieve -> answer.
+
+    Small talk is answered by the router without retrieval. Other queries are searched
+    within the source types the router prefers, and across every source only when those
+    hold no match; spans record that as `widened`.
+    """
+    def __init__(self, embedder: Embedder = None, chroma_manager: ChromaManager = None,
+                 router: QueryRouter = None, k: int = None):
+        self.embedder = embedder or Embedder()
+        self.chroma_manager = chroma_manager or ChromaManager()
+        self.router = router or QueryRouter(self.chroma_manager)
+        self.k = int(k or os.environ.get('RETRIEVAL_TOP_K', 10))
+
+    def _widen(self, prepared: PreparedQuery, results: QueryResult, k: int) -> QueryResult:
+        """Search every source instead when the sources the router preferred hold no match."""
+        if not prepared.route.where or len(results):
+            return results
+        logging.info(f"Sources {prepared.route.sources} returned no chunks; searching all sources")
+        prepared.widened = True
+        return self.chroma_manager.query([prepared.embedding], k, query_text=prepared.query_text)
+
+    def _search(self, prepared: PreparedQuery, k: int) -> QueryResult:
+        results = self.chroma_manager.query([prepared.embedding], k, where=prepared.route.where,
+                                            query_text=prepared.query_text)
+        return self._widen(prepared, results, k)
+
+    def _route(self, query_text: str, span) -> PreparedQuery:
+        route = self.router.classify(query_text)
+        span.set(route=route.kind)
+        if route.kind == "chitchat":
+            logging.info("Routed query to a canned reply, no retrieval")
+        return PreparedQuery(query_text, route, span=span)
+
+    def _retrieve(self, prepared: PreparedQuery, k: int, embed_s: float):
+        start = time.perf_counter()
+        self.router.route_sources(prepared.route, prepared.embedding, prepared.query_text)
+        prepared.results = self._search(prepared, k)
+        prepared.timings = {"embed_s": embed_s, "retrieve_s": time.perf_counter() - start}
+        prepared.span.set(sources=prepared.route.sources, chunks=len(prepared.results), widened=prepared.widened)
+        logging.info(f"Routed query to sources {prepared.route.sources or 'all'}")
+
+    def prepare(self, query_text: str, k: int = None) -> PreparedQuery:
+        with telemetry.span("prepare", k=k or self.k) as span:
+            prepared = self._route(query_text, span)
+            if prepared.route.kind != "chitchat":
+                start = time.perf_counter()
+                prepared.embedding = self.embedder.embed_user_query(query_text)[0]
+                self._retrieve(prepared, k or self.k, time.perf_counter() - start)
+            return prepared
+
+    def prepare_batch(self, questions: List[str], k: int = None) -> List[PreparedQuery]:
+        """
+        prepare() for many questions: query embeddings come from the query caches, with
+        the misses embedded together, and there is one retrieval call per distinct source
+        filter. Each query's timings are the batch's embedding and retrieval time divided
+        by the number of queries that needed them.
+        """
+        k = k or self.k
+        with telemetry.span("prepare_batch", k=k, queries=len(questions)) as span:
+            prepared = [PreparedQuery(q, self.router.classify(q), span=span) for q in questions]
+            pending = [p for p in prepared if p.route.kind != "chitchat"]
+            span.set(chitchat=len(prepared) - len(pending))
+            if not pending:
+                return prepared
+            t0 = time.perf_counter()
+            embeddings = self.embedder.embed_user_queries([p.query_text for p in pending])
+            t1 = time.perf_counter()
+            groups = defaultdict(list)
+            for p, embedding in zip(pending, embeddings):
+                p.embedding = embedding
+                self.router.route_sources(p.route, embedding, p.query_text)
+                groups[tuple(p.route.sources)].append(p)
+            for group in groups.values():
+                where = group[0].route.where
+                results = self.chroma_manager.query_batch(
+                    [p.embedding for p in group], k, where, query_texts=[p.query_text for p in group]
+                )
+                for p, result in zip(group, results):
+                    p.results = self._widen(p, result, k)
+            timings = {"embed_s": (t1 - t0) / len(pending), "retrieve_s": (time.perf_counter() - t1) / len(pending)}
+            for p in pending:
+                p.timings = dict(timings)
+            span.set(widened=sum(p.widened for p in pending))
+            return prepared
+
+    def answer_prepared(self, prepared: PreparedQuery) -> str:
+        if prepared.route.kind == "chitchat":
+            return prepared.route.reply
+        with telemetry.span("answer", parent=prepared.span):
+            return get_llm_answer(prepared.query_text, prepared.results, prepared.embedding)
+
+    def stream_prepared(self, prepared: PreparedQuery) -> Iterator[str]:
+        if prepared.route.kind == "chitchat":
+            yield prepared.route.reply
+            return
+        with telemetry.span("answer", parent=prepared.span):
+            yield from stream_llm_answer(prepared.query_text, prepared.results, prepared.embedding)
+
+    async def aprepare(self, query_text: str, async_client, k: int = None) -> PreparedQuery:
+        """
+        prepare() for the event loop: the query is embedded through `async_client` and
+        retrieval runs on a worker thread. A cancelled caller still waits for that thread,
+        so a concurrency slot held around the call isn't freed while retrieval runs.
+        """
+        with telemetry.span("prepare", k=k or self.k) as span:
+            prepared = self._route(query_text, span)
+            if prepared.route.kind != "chitchat":
+                start = time.perf_counter()
+                prepared.embedding = (await self.embedder.aembed_user_query(query_text, async_client))[0]
+                await _in_thread(self._retrieve, prepared, k or self.k, time.perf_counter() - start)
+            return prepared
+
+    async def aanswer_prepared(self, prepared: PreparedQuery, async_client) -> str:
+        if prepared.route.kind == "chitchat":
+            return prepared.route.reply
+        with telemetry.span("answer", parent=prepared.span):
+            return await aget_llm_answer(async_client, prepared.query_text, prepared.results, prepared.embedding)
+
+    async def astream_prepared(self, prepared: PreparedQuery, async_client):
+        if prepared.route.kind == "chitchat":
+            yield prepared.route.reply
+            return
+        with telemetry.span("answer", parent=prepared.span):
+            async for token in astream_llm_answer(async_client, prepared.query_text, prepared.results, prepared.embedding):
+                yield token
+
+    def answer(self, query_text: str, k: int = None) -> str:
+        return self.answer_prepared(self.prepare(query_text, k))
+
+    def stream(self, query_text: str, k: int = None) -> Iterator[str]:
+        yield from self.stream_prepared(self.prepare(query_text, k))
@@ -0,0 +1,144 @@
+import time
+import random
+import logging
+import threading
+from collections import deque
+from typing import Callable, Optional
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+
+class RateLimiter:
+    """
+    Thread-safe requests-per-minute / tokens-per-minute budget over a sliding 60s window.
+
+    `acquire` blocks until a request of the given token size fits in both budgets.
+    `penalize` pauses every caller, e.g. after the server answered with a 429.
+    A budget of None means unlimited.
+    """
+    WINDOW = 60.0
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._events = deque()  # (timestamp, tokens)
+        self._tokens_in_window = 0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        while self._events and self._events[0][0] <= now - self.WINDOW:
+            _, tokens = self._events.popleft()
+            self._tokens_in_window -= tokens
+
+    def _fits(self, tokens: int) -> bool:
+        if self.requests_per_minute and len(self._events) >= self.requests_per_minute:
+            return False
+        if self.tokens_per_minute and self._events:
+            # A single request larger than the whole budget is let through on an empty window.
+            return self._tokens_in_window + tokens <= self.tokens_per_minute
+        return True
+
+    def acquire(self, tokens: int = 0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._prune(now)
+                if now >= self._paused_until and self._fits(tokens):
+                    self._events.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    wait = max(self._events[0][0] + self.WINDOW - now, 0.01)
+            time.sleep(wait)
+
+    def penalize(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills at `rate` tokens per second up to `capacity`.
+
+    `acquire` blocks until a token is available, so bursts up to `capacity` go out
+    immediately and the long-run rate stays at `rate`. `penalize` empties the bucket
+    and pauses it, e.g. after a 429.
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self, seconds: float):
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self.rate)
+            self._updated = time.monotonic()
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    """True for rate limits (429) and transient server errors (5xx, connection errors)."""
+    status = getattr(exc, "status_code", None)
+    if status is None and getattr(exc, "response", None) is not None:
+        status = getattr(exc.response, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(exc).__name__ in ("RateLimitError", "APIConnectionError", "APITimeoutError")
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def call_with_backoff(
+    fn: Callable,
+    *args,
+    limiter: Optional[RateLimiter] = None,
+    tokens: int = 0,
+    max_retries: int = 6,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    **kwargs
+):
+    """
+    Call `fn(*args, **kwargs)` under an optional rate limiter, retrying rate limits and
+    transient errors with exponential backoff and jitter. A server-provided Retry-After
+    is honoured, and the limiter is paused so that concurrent callers back off too.
+    """
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire(tokens)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as ex:
+            if attempt == max_retries or not is_retryable_error(ex):
+                raise
+            delay = _retry_after(ex) or min(max_delay, base_delay * 2 ** attempt)
+            delay *= 1 + random.random() * 0.25
+            logging.warning(f"Retryable error ({ex.__class__.__name__}), retrying in {delay:.1f}s "
+                            f"(attempt {attempt + 1}/{max_retries})")
+            if limiter is not None:
+                limiter.penalize(delay)
+            time.sleep(delay)
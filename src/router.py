@@ -0,0 +1,95 @@
+import os
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+load_dotenv()
+
+# Whole-message small talk: matched on the full query, so "hi, how do I add funds?" is
+# still treated as a question.
+_FILLER = r"(?:\s+(?:there|team|bot|all|everyone|again|so much|a lot))*"
+CHITCHAT_RULES = [
+    (re.compile(rf"^(?:hi+|hello+|hey+|hiya|namaste|greetings|good\s+(?:morning|afternoon|evening|day)){_FILLER}[\s!.,:)]*$", re.I),
+     "Hello! How can I help you today?"),
+    (re.compile(rf"^(?:thanks|thank\s+you|thx|ty){_FILLER}[\s!.,:)]*$", re.I),
+     "You're welcome! Let me know if there's anything else I can help with."),
+    (re.compile(rf"^(?:ok(?:ay)?|cool|great|got\s+it|perfect|sounds\s+good|alright){_FILLER}[\s!.,:)]*$", re.I),
+     "Glad that helps! Is there anything else you'd like to know?"),
+    (re.compile(rf"^(?:bye|goodbye|see\s+you|see\s+ya|good\s*night){_FILLER}[\s!.,:)]*$", re.I),
+     "Goodbye! Feel free to come back with any questions."),
+]
+
+# Questions about numbers or amounts (copays, deductibles, plan codes, ...) are answered
+# from tables, so the table source is always searched for them.
+NUMERIC_SOURCE = "table"
+NUMERIC_QUERY_RE = re.compile(
+    r"\d|[$%₹]|\b(?:how\s+much|cost|costs|price|fee|fees|charge|charges|co-?pays?|coinsurance|"
+    r"deductibles?|premiums?|amounts?|limits?|maximum|minimum|rates?|percent(?:age)?)\b",
+    re.I
+)
+
+
+@dataclass
+class Route:
+    """How a query is handled: a canned `reply` (no retrieval), or a retrieval filter."""
+    kind: str = "retrieve"  # 'chitchat' or 'retrieve'
+    reply: Optional[str] = None
+    sources: List[str] = field(default_factory=list)  # empty = search every source
+    where: Optional[Dict[str, Any]] = None
+
+
+class QueryRouter:
+    """
+    Local, rule-plus-centroid query router in front of retrieval.
+
+    Small talk is recognized by rules on the raw text and answered without an embedding
+    call, a search or an LLM call. Other queries are compared with the centroid of each
+    source type's chunk embeddings (built at ingest time by ChromaManager). The sources
+    whose centroid is within `margin` cosine similarity of the best one are preferred;
+    the table source is always among them for questions about numbers or amounts. When
+    every source is that close the query is ambiguous and nothing is preferred.
+
+    The preference is soft: RAGPipeline searches every source when the preferred ones
+    return no chunks.
+    """
+    def __init__(self, chroma_manager=None, margin: float = None, source_routing: bool = None):
+        self.chroma_manager = chroma_manager
+        self.margin = float(margin if margin is not None else os.environ.get('ROUTER_MARGIN', 0.05))
+        self.source_routing = (
+            source_routing if source_routing is not None
+            else os.environ.get('ROUTER_SOURCE_ROUTING', '1') == '1'
+        )
+
+    def classify(self, query_text: str) -> Route:
+        """Rule-based first pass on the raw query text."""
+        text = query_text.strip()
+        for pattern, reply in CHITCHAT_RULES:
+            if pattern.match(text):
+                return Route(kind="chitchat", reply=reply)
+        return Route()
+
+    def route_sources(self, route: Route, query_embedding, query_text: str = "") -> Route:
+        """Fill in the preferred sources of a retrieval route from the query embedding and text."""
+        centroids = self.chroma_manager.get_source_centroids() if self.chroma_manager and self.source_routing else None
+        if not centroids or len(centroids) < 2:
+            return route
+        names = list(centroids)
+        matrix = np.asarray([centroids[name]["centroid"] for name in names], dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        similarity = matrix @ query
+        best = float(similarity.max())
+        sources = [name for name, sim in zip(names, similarity) if sim >= best - self.margin]
+        if NUMERIC_SOURCE in names and NUMERIC_SOURCE not in sources and NUMERIC_QUERY_RE.search(query_text or ""):
+            sources.append(NUMERIC_SOURCE)
+        if len(sources) == len(names):
+            return route
+        route.sources = sources
+        route.where = {"source": sources[0]} if len(sources) == 1 else {"source": {"$in": sources}}
+        return route
@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+load_dotenv()
+
+# Totals and per-stage metrics compared with the previous run.
+COMPARED_TOTALS = ("wall_s", "cpu_s", "chunks", "embedding_tokens", "table_llm_calls",
+                   "table_llm_tokens", "cost_usd")
+COMPARED_STAGE_KEYS = ("wall_s", "cpu_s", "peak_rss_mb", "worker_peak_rss_mb")
+# Changes smaller than this are not reported as regressions, whatever the percentage.
+MIN_REGRESSION = {"wall_s": 1.0, "cpu_s": 1.0, "peak_rss_mb": 50.0, "worker_peak_rss_mb": 50.0, "cost_usd": 0.001}
+
+
+def _maxrss_mb(who) -> Optional[float]:
+    """All-time peak RSS from getrusage (RUSAGE_SELF, or the largest RUSAGE_CHILDREN), in MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _current_rss_mb() -> Optional[float]:
+    """Current resident set size of this process in MB, from /proc (None elsewhere)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+
+class _RssSampler:
+    """Highest current RSS seen while a stage runs, sampled every RUN_REPORT_RSS_INTERVAL seconds."""
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.peak = _current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = None
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+            self._thread.start()
+
+    def _sample(self):
+        rss = _current_rss_mb()
+        if rss is not None and rss > self.peak:
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def stop(self) -> Optional[float]:
+        if self._thread is None:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return self.peak
+
+
+def _children_cpu_s() -> float:
+    """CPU time of finished child processes (e.g. PARSE_WORKERS), 0 where unsupported."""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class RunReport:
+    """
+    Structured report of one main.py run: per source file parse stats, per stage wall
+    time, CPU time and peak RSS, and totals for chunks, tokens and estimated API cost.
+
+    A stage's peak_rss_mb is sampled while it runs (Linux only, None elsewhere).
+    worker_peak_rss_mb is the largest parse worker process's peak, for stages that ran
+    worker processes; the totals also carry the run-wide peaks from getrusage.
+
+    finish() writes it as JSON to RUN_REPORT_PATH, next to the parsed data, after moving
+    the previous report to `<name>.prev.json`. With RUN_REPORT_COMPARE=1 (the default)
+    the totals and stage timings are compared with the previous report, and increases
+    of more than RUN_REPORT_REGRESSION_PCT percent are logged as warnings.
+
+    Costs use the per-million-token prices in EMBED_PRICE_PER_1M_TOKENS,
+    LLM_INPUT_PRICE_PER_1M_TOKENS and LLM_OUTPUT_PRICE_PER_1M_TOKENS.
+    """
+    def __init__(self, path: str = None, compare: bool = None):
+        self.path = path or os.environ.get('RUN_REPORT_PATH', 'static/parsed_data/run_report.json')
+        self.compare = compare if compare is not None else os.environ.get('RUN_REPORT_COMPARE', '1') == '1'
+        self.regression_pct = float(os.environ.get('RUN_REPORT_REGRESSION_PCT', 20))
+        self.rss_interval = float(os.environ.get('RUN_REPORT_RSS_INTERVAL', 0.1))
+        self.prices = {
+            "embedding": float(os.environ.get('EMBED_PRICE_PER_1M_TOKENS', 0.02)),
+            "llm_input": float(os.environ.get('LLM_INPUT_PRICE_PER_1M_TOKENS', 0.15)),
+            "llm_output": float(os.environ.get('LLM_OUTPUT_PRICE_PER_1M_TOKENS', 0.60)),
+        }
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        self._start = time.perf_counter()
+        self._start_cpu = time.process_time() + _children_cpu_s()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.files: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a stage; the yielded dict is stored with it, for the stage's own counts."""
+        details: Dict[str, Any] = {}
+        start, start_cpu, start_children = time.perf_counter(), time.process_time(), _children_cpu_s()
+        sampler = _RssSampler(self.rss_interval)
+        try:
+            yield details
+        except BaseException as e:
+            details["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            children_cpu = _children_cpu_s() - start_children
+            self.stages[name] = {
+                "wall_s": round(time.perf_counter() - start, 3),
+                "cpu_s": round(time.process_time() - start_cpu + children_cpu, 3),
+                "peak_rss_mb": sampler.stop(),
+                # RUSAGE_CHILDREN only counts workers that have exited, so this is set for
+                # stages that ran (and joined) worker processes.
+                **({"worker_peak_rss_mb": _maxrss_mb(resource.RUSAGE_CHILDREN)} if children_cpu > 0 else {}),
+                **details,
+            }
+
+    def add_file(self, file_path: str, status: str, detail: str = "", stats: Dict[str, Any] = None):
+        self.files[os.path.basename(file_path)] = {"status": status, **({"detail": detail} if detail else {}),
+                                                   **(stats or {})}
+
+    def _totals(self) -> Dict[str, Any]:
+        files = list(self.files.values())
+        prompt_tokens = sum(f.get("prompt_tokens", 0) for f in files)
+        completion_tokens = sum(f.get("completion_tokens", 0) for f in files)
+        ingest = self.stages.get("ingest", {})
+        embedding_tokens = ingest.get("embedding_tokens", 0)
+        cost = {
+            "embedding": embedding_tokens * self.prices["embedding"] / 1e6,
+            "table_llm": (prompt_tokens * self.prices["llm_input"] + completion_tokens * self.prices["llm_output"]) / 1e6,
+        }
+        return {
+            "wall_s": round(time.perf_counter() - self._start, 3),
+            "cpu_s": round(time.process_time() + _children_cpu_s() - self._start_cpu, 3),
+            "peak_rss_mb": _maxrss_mb(resource.RUSAGE_SELF) if resource else None,
+            "worker_peak_rss_mb": _maxrss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+            "files": len(files),
+            "files_failed": sum(f["status"] not in ("ok", "skipped") for f in files),
+            "pages": sum(f.get("pages", 0) for f in files),
+            "tables": sum(f.get("tables", 0) for f in files),
+            "table_llm_calls": sum(f.get("table_llm_calls", 0) for f in files),
+            "table_llm_tokens": prompt_tokens + completion_tokens,
+            "chunks": ingest.get("chunks", 0),
+            "chunks_by_source": ingest.get("by_source", {}),
+            "embedding_tokens": embedding_tokens,
+            "cost_usd": round(sum(cost.values()), 6),
+            "cost_breakdown_usd": {key: round(value, 6) for key, value in cost.items()},
+        }
+
+    def _compare(self, current: Dict[str, Any], previous: Dict[str, Any]) -> Dict[str, Any]:
+        pairs = [(f"totals.{key}", current["totals"].get(key), previous.get("totals", {}).get(key))
+                 for key in COMPARED_TOTALS]
+        for stage, values in current["stages"].items():
+            prev_stage = previous.get("stages", {}).get(stage, {})
+            pairs += [(f"stages.{stage}.{key}", values.get(key), prev_stage.get(key)) for key in COMPARED_STAGE_KEYS]
+        comparison = {"previous_started_at": previous.get("started_at"), "changes": {}, "regressions": []}
+        for name, now, before in pairs:
+            if not isinstance(now, (int, float)) or not isinstance(before, (int, float)):
+                continue
+            change_pct = round((now - before) / before * 100, 1) if before else None
+            comparison["changes"][name] = {"previous": before, "current": now, "change_pct": change_pct}
+            floor = MIN_REGRESSION.get(name.rsplit(".", 1)[-1], 0)
+            if change_pct is not None and change_pct > self.regression_pct and now - before > floor:
+                comparison["regressions"].append(name)
+        return comparison
+
+    def finish(self) -> Dict[str, Any]:
+        """Write the report (and comparison), log a summary and return it."""
+        report = {
+            "started_at": self.started_at,
+            "totals": self._totals(),
+            "stages": self.stages,
+            "files": self.files,
+        }
+        previous = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    previous = json.load(f)
+                os.replace(self.path, os.path.splitext(self.path)[0] + ".prev.json")
+            except (OSError, json.JSONDecodeError) as e:
+                logging.warning(f"Could not read previous run report {self.path}: {e}")
+        if self.compare and previous:
+            report["comparison"] = self._compare(report, previous)
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+        totals = report["totals"]
+        logging.info(
+            f"Run report: {totals['files']} files ({totals['files_failed']} failed), {totals['chunks']} chunks, "
+            f"{totals['embedding_tokens']} embedding tokens, {totals['table_llm_calls']} table LLM calls, "
+            f"~${totals['cost_usd']:.4f}, {totals['wall_s']:.1f}s wall. Written to {self.path}"
+        )
+        for name in report.get("comparison", {}).get("regressions", []):
+            change = report["comparison"]["changes"][name]
+            logging.warning(f"Regression vs previous run: {name} {change['previous']} -> {change['current']} "
+                            f"(+{change['change_pct']}%)")
+        return report
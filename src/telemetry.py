@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import secrets
+import logging
+import threading
+import contextvars
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+load_dotenv()
+
+# Upper bounds (seconds) of the stage duration histogram buckets.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("telemetry_span", default=None)
+
+
+class Span:
+    """One timed stage of a query, with attributes such as k, chunk counts or token usage."""
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attrs", "start", "start_ns", "duration",
+                 "error", "parent", "sink_state", "_token")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, **attrs):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attrs: Dict[str, Any] = attrs
+        self.start = time.perf_counter()
+        self.start_ns = time.time_ns()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self.sink_state: Dict[str, Any] = {}
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        for sink in _sinks:
+            sink.on_start(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.error = exc_type.__name__
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Ended in another context (e.g. a generator finished by a different thread).
+            _current.set(self.parent)
+        for sink in _sinks:
+            try:
+                sink.on_end(self)
+            except Exception as e:
+                logging.warning(f"Telemetry sink {sink.__class__.__name__} failed: {e}")
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "error": self.error,
+            **self.attrs,
+        }
+
+
+class _NoopSpan:
+    """Returned by span() when telemetry is off: every operation does nothing."""
+    __slots__ = ()
+    trace_id = span_id = parent_id = None
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, parent=None, **attrs):
+    """
+    Context manager timing one stage. Nested spans share the enclosing span's trace;
+    pass `parent` to continue a trace started elsewhere (e.g. from PreparedQuery.span).
+    With no sinks configured this returns a shared no-op span, so disabled telemetry
+    costs one function call per stage.
+    """
+    if not _sinks:
+        return NOOP_SPAN
+    if not isinstance(parent, Span):
+        parent = _current.get()
+    return Span(name, parent, **attrs)
+
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+
+def enabled() -> bool:
+    return bool(_sinks)
+
+
+# ---- sinks ---------------------------------------------------------------------------
+
+class Sink:
+    def on_start(self, span: Span):
+        pass
+
+    def on_end(self, span: Span):
+        pass
+
+
+class JsonLogSink(Sink):
+    """One JSON object per finished span, to the log or appended to a JSONL file."""
+    def __init__(self, path: str = None):
+        self.path = path
+        self._lock = threading.Lock()
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def on_end(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        if not self.path:
+            logging.info(line)
+            return
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items()) + "}"
+
+
+class PrometheusSink(Sink):
+    """
+    Aggregates finished spans into Prometheus metrics, rendered in the text exposition
+    format by render():
+
+        rag_stage_duration_seconds{stage}            histogram of span durations
+        rag_stage_errors_total{stage}                spans that ended with an exception
+        rag_stage_attribute_sum{stage,attribute}     running sum of numeric attributes (tokens, chunks, ...)
+        rag_stage_attribute_total{stage,attribute,value}  count of string/bool attribute values (cache hits, routes)
+
+    List attributes (e.g. distances) are only exported by the log and OpenTelemetry sinks.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, List[int]] = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+        self._duration_sum: Dict[str, float] = defaultdict(float)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._attr_sum: Dict[tuple, float] = defaultdict(float)
+        self._attr_count: Dict[tuple, int] = defaultdict(int)
+
+    def on_end(self, span: Span):
+        with self._lock:
+            buckets = self._buckets[span.name]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[-1] += 1
+            self._duration_sum[span.name] += span.duration
+            if span.error:
+                self._errors[span.name] += 1
+            for key, value in span.attrs.items():
+                if isinstance(value, bool) or isinstance(value, str):
+                    self._attr_count[(span.name, key, str(value).lower())] += 1
+                elif isinstance(value, (int, float)):
+                    self._attr_sum[(span.name, key)] += value
+
+    def render(self) -> str:
+        lines = [
+            "# HELP rag_stage_duration_seconds Duration of query path stages.",
+            "# TYPE rag_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for stage, buckets in sorted(self._buckets.items()):
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, buckets):
+                    cumulative += count
+                    lines.append(f"rag_stage_duration_seconds_bucket{_labels(stage=stage, le=bound)} {cumulative}")
+                cumulative += buckets[-1]
+                lines.append(f"rag_stage_duration_seconds_bucket{_labels(stage=stage, le='+Inf')} {cumulative}")
+                lines.append(f"rag_stage_duration_seconds_sum{_labels(stage=stage)} {self._duration_sum[stage]}")
+                lines.append(f"rag_stage_duration_seconds_count{_labels(stage=stage)} {cumulative}")
+            lines += ["# HELP rag_stage_errors_total Stages that raised.", "# TYPE rag_stage_errors_total counter"]
+            lines += [f"rag_stage_errors_total{_labels(stage=stage)} {n}" for stage, n in sorted(self._errors.items())]
+            lines += ["# HELP rag_stage_attribute_sum Sum of numeric stage attributes.",
+                      "# TYPE rag_stage_attribute_sum counter"]
+            lines += [f"rag_stage_attribute_sum{_labels(stage=stage, attribute=attr)} {total}"
+                      for (stage, attr), total in sorted(self._attr_sum.items())]
+            lines += ["# HELP rag_stage_attribute_total Count of categorical stage attribute values.",
+                      "# TYPE rag_stage_attribute_total counter"]
+            lines += [f"rag_stage_attribute_total{_labels(stage=stage, attribute=attr, value=value)} {n}"
+                      for (stage, attr, value), n in sorted(self._attr_count.items())]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0"):
+        """Serve render() at http://host:port/metrics from a background thread."""
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        logging.info(f"Serving Prometheus metrics on {host}:{server.server_address[1]}/metrics")
+        return server
+
+
+class OpenTelemetrySink(Sink):
+    """
+    Mirrors spans into OpenTelemetry. Only the API package is imported here; the tracer
+    provider and exporter are set up the usual OpenTelemetry way (SDK or auto-instrumentation).
+    """
+    def __init__(self, tracer_name: str = "rag_chatbot"):
+        from opentelemetry import trace  # imported lazily: optional dependency
+        self._trace = trace
+        self.tracer = trace.get_tracer(tracer_name)
+
+    def on_start(self, span: Span):
+        context = None
+        parent = span.parent.sink_state.get("otel") if span.parent is not None else None
+        if parent is not None:
+            context = self._trace.set_span_in_context(parent)
+        span.sink_state["otel"] = self.tracer.start_span(span.name, context=context, start_time=span.start_ns)
+
+    def on_end(self, span: Span):
+        otel_span = span.sink_state.get("otel")
+        if otel_span is None:
+            return
+        for key, value in span.attrs.items():
+            if isinstance(value, (list, tuple)):
+                value = [v for v in value if v is not None]
+            if value is not None:
+                otel_span.set_attribute(key, value)
+        if span.error:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        otel_span.end(end_time=span.start_ns + int(span.duration * 1e9))
+
+
+_sinks: List[Sink] = []
+
+
+def configure(names: str = None) -> List[Sink]:
+    """
+    Set up sinks from a comma-separated list (TELEMETRY_SINKS): 'log', 'prometheus',
+    'otel'. An empty list turns telemetry off. Sinks that can't be created are skipped
+    with a warning.
+
+    Not called on import: the query front-ends (serve.py, rag_chatbot.py, cmd_chat.py)
+    call it once at startup, so other entry points never start a metrics server.
+    """
+    names = names if names is not None else os.environ.get('TELEMETRY_SINKS', '')
+    sinks = []
+    for name in (n.strip().lower() for n in names.split(",")):
+        if not name:
+            continue
+        try:
+            if name == "log":
+                sinks.append(JsonLogSink(os.environ.get('TELEMETRY_LOG_PATH') or None))
+            elif name == "prometheus":
+                sink = PrometheusSink()
+                port = os.environ.get('TELEMETRY_PROMETHEUS_PORT')
+                if port:
+                    sink.serve(int(port))
+                sinks.append(sink)
+            elif name == "otel":
+                sinks.append(OpenTelemetrySink())
+            else:
+                logging.warning(f"Unknown telemetry sink '{name}'")
+        except Exception as e:
+            logging.warning(f"Telemetry sink '{name}' disabled: {e}")
+    _sinks[:] = sinks
+    return sinks
+
+
+def get_sink(kind: type) -> Optional[Sink]:
+    return next((sink for sink in _sinks if isinstance(sink, kind)), None)
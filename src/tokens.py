@@ -0,0 +1,59 @@
+import os
+import logging
+from functools import lru_cache
+from typing import Iterable, List
+
+# OpenAI's rule of thumb for English text: ~4 characters per token.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for a single text, without calling a tokenizer."""
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def estimate_total_tokens(texts: Iterable[str]) -> int:
+    """Cheap token estimate for a collection of texts."""
+    return sum(estimate_tokens(t) for t in texts)
+
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    """
+    The local tiktoken encoding named by CHUNK_TOKENIZER (cl100k_base, used by the
+    text-embedding-3 models), or None if tiktoken or its BPE file is unavailable.
+    """
+    name = os.environ.get('CHUNK_TOKENIZER', 'cl100k_base')
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as ex:
+        logging.warning(f"Tokenizer '{name}' unavailable ({ex}); falling back to the {CHARS_PER_TOKEN} chars/token estimate.")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Exact token count when the tokenizer is available, otherwise the estimate."""
+    encoding = get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode_ordinary(text)) if text else 0
+
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """Cut `text` into consecutive pieces of at most `max_tokens` tokens each."""
+    encoding = get_encoding()
+    if encoding is None:
+        size = max_tokens * CHARS_PER_TOKEN
+        pieces, start = [], 0
+        while start < len(text):
+            end = min(start + size, len(text))
+            # Prefer to cut at the last space inside the window.
+            cut = text.rfind(" ", start + 1, end) if end < len(text) else -1
+            end = cut if cut > start else end
+            pieces.append(text[start:end].strip())
+            start = end
+        return [p for p in pieces if p]
+    tokens = encoding.encode_ordinary(text)
+    pieces = (encoding.decode(tokens[i:i + max_tokens]).strip() for i in range(0, len(tokens), max_tokens))
+    return [p for p in pieces if p]
@@ -0,0 +1,46 @@
+from src.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+DOCS = [
+    ("a", "The 2500 Gold SOB plan has a deductible of 2,500 dollars.", "table"),
+    ("b", "Add funds to your account with UPI or net banking.", "faq"),
+    ("c", "The 7350 Copper SOB plan covers urgent care visits.", "text"),
+    ("d", "Withdraw funds from your account to a bank account.", "faq"),
+]
+
+
+def test_tokenize_keeps_numbers_whole():
+    assert tokenize("Plan 7350 costs 2,500.50 per year") == ["plan", "7350", "costs", "2,500.50", "per", "year"]
+
+
+def test_search_ranks_matching_terms_first():
+    index = BM25Index().build(DOCS)
+    ids = [doc_id for doc_id, _ in index.search("copper plan 7350", k=3)]
+    assert ids[0] == "c"
+    assert "b" not in ids
+
+
+def test_search_honours_source_filter():
+    index = BM25Index().build(DOCS)
+    assert {doc_id for doc_id, _ in index.search("funds account", where={"source": "faq"})} == {"b", "d"}
+    assert index.search("funds account", where={"source": {"$in": ["table", "text"]}}) == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = BM25Index().build(DOCS)
+    path = str(tmp_path / "bm25.json")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.search("gold deductible") == index.search("gold deductible")
+    assert BM25Index.load(str(tmp_path / "missing.json")) is None
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"]])
+    assert [doc_id for doc_id, _ in fused] == ["b", "a", "c"]
+
+
+def test_rrf_scores_follow_rank():
+    fused = dict(reciprocal_rank_fusion([["a", "b"], ["c"]], k=60))
+    assert fused["a"] == fused["c"] == 1 / 61
+    assert fused["b"] == 1 / 62
@@ -0,0 +1,76 @@
+from src.chunking import TextChunker, split_pages
+from src.tokens import count_tokens
+
+
+def _paragraph(n: int, words: int = 12) -> str:
+    return " ".join(f"word{n}x{i}" for i in range(words)) + "."
+
+
+def test_split_pages_reads_markers():
+    text = "intro\n--- Page: 1 ---\nfirst\n--- Page: 2 ---\nsecond"
+    assert [(page, body.strip()) for page, body in split_pages(text)] == [(None, "intro"), (1, "first"), (2, "second")]
+
+
+def test_short_text_is_one_chunk_without_page_metadata():
+    assert TextChunker(max_tokens=100).chunk("Just one paragraph.") == [("Just one paragraph.", {})]
+
+
+def test_chunks_are_cut_at_paragraph_boundaries_within_budget():
+    paragraphs = [_paragraph(n) for n in range(12)]
+    chunker = TextChunker(max_tokens=80)
+    chunks = chunker.chunk("\n\n".join(paragraphs))
+    assert len(chunks) > 1
+    for text, _ in chunks:
+        assert count_tokens(text) <= chunker.max_tokens + len(text.split("\n\n"))
+        assert all(part in paragraphs for part in text.split("\n\n"))
+    assert [p for text, _ in chunks for p in text.split("\n\n")] == paragraphs
+
+
+def test_long_paragraph_falls_back_to_sentences():
+    sentences = [f"Sentence number {i} talks about the premium of plan {i}." for i in range(30)]
+    chunks = TextChunker(max_tokens=40).chunk(" ".join(sentences))
+    assert len(chunks) > 1
+    for text, _ in chunks:
+        assert text.endswith(".")
+        assert text.startswith("Sentence number")
+
+
+def test_amounts_do_not_end_a_sentence():
+    text = "Pay Rs. 20 now. The fee is 0.5% of the amount. " * 20
+    chunks = TextChunker(max_tokens=30).chunk(text)
+    assert all(not text.startswith("20") and not text.startswith("5%") for text, _ in chunks)
+
+
+def test_unbroken_text_is_cut_into_token_windows():
+    text = " ".join(f"tok{i}" for i in range(400))
+    chunks = TextChunker(max_tokens=50).chunk(text)
+    assert len(chunks) > 1
+    assert " ".join(t for t, _ in chunks).split() == text.split()
+
+
+def test_page_markers_become_page_metadata():
+    text = "".join(f"--- Page: {page} ---\n{_paragraph(page)}\n\n{_paragraph(page + 100)}\n" for page in range(1, 5))
+    chunks = TextChunker(max_tokens=60).chunk(text)
+    assert all("--- Page" not in chunk for chunk, _ in chunks)
+    assert chunks[0][1]["page_start"] == 1
+    assert chunks[-1][1]["page_end"] == 4
+    for chunk, meta in chunks:
+        assert meta["page_start"] <= meta["page_end"]
+        assert f"word{meta['page_start']}x0" in chunk or f"word{meta['page_start'] + 100}x0" in chunk
+
+
+def test_page_break_is_preferred_once_chunk_is_half_full():
+    text = f"--- Page: 1 ---\n{_paragraph(1, 30)}\n--- Page: 2 ---\n{_paragraph(2, 5)}"
+    first_page = count_tokens(_paragraph(1, 30))
+    split = TextChunker(max_tokens=first_page * 2 - 2).chunk(text)
+    assert [meta for _, meta in split] == [{"page_start": 1, "page_end": 1}, {"page_start": 2, "page_end": 2}]
+    merged = TextChunker(max_tokens=first_page * 3).chunk(text)
+    assert [meta for _, meta in merged] == [{"page_start": 1, "page_end": 2}]
+
+
+def test_overlap_repeats_trailing_units():
+    paragraphs = [_paragraph(n, 8) for n in range(8)]
+    chunks = TextChunker(max_tokens=60, overlap_tokens=30).chunk("\n\n".join(paragraphs))
+    assert len(chunks) > 1
+    for (previous, _), (current, _) in zip(chunks, chunks[1:]):
+        assert current.split("\n\n")[0] == previous.split("\n\n")[-1]
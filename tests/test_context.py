@@ -0,0 +1,83 @@
+import numpy as np
+
+from src.chroma_manager import QueryResult
+from src.context import ContextAssembler, mmr_order, source_name, truncate_to_tokens
+from src.tokens import count_tokens
+
+
+def _sentences(n: int, tag: str) -> str:
+    return " ".join(f"Sentence {i} about {tag} coverage and the copay." for i in range(n))
+
+
+def _results(documents, embeddings, metadatas=None):
+    return QueryResult(
+        ids=[f"c{i}" for i in range(len(documents))],
+        documents=documents,
+        metadatas=metadatas or [{"file": f"doc{i}.txt"} for i in range(len(documents))],
+        distances=[0.0] * len(documents),
+        embeddings=np.asarray(embeddings, dtype=np.float32),
+    )
+
+
+def test_mmr_prefers_a_diverse_second_pick():
+    query = [1.0, 0.0, 0.0]
+    embeddings = np.array([[0.9, 0.1, 0.0], [0.89, 0.12, 0.0], [0.7, 0.0, 0.7]])
+    order = mmr_order(query, embeddings, lambda_mult=0.5, redundancy_threshold=1.1)
+    assert order[:2] == [0, 2]
+    assert sorted(order) == [0, 1, 2]
+
+
+def test_mmr_drops_near_identical_chunks():
+    embeddings = np.array([[1.0, 0.0], [1.0, 0.001], [0.0, 1.0]])
+    assert mmr_order([1.0, 0.0], embeddings, redundancy_threshold=0.95) == [0, 2]
+
+
+def test_truncate_cuts_at_a_sentence_boundary():
+    text = _sentences(20, "gold")
+    cut = truncate_to_tokens(text, 40)
+    assert cut.endswith(".")
+    assert text.startswith(cut)
+    assert count_tokens(cut) <= 40
+
+
+def test_assemble_respects_token_budget():
+    documents = [_sentences(12, tag) for tag in ("gold", "silver", "bronze", "copper", "hsa")]
+    embeddings = np.eye(5)
+    assembler = ContextAssembler(token_budget=300, redundancy_threshold=0.99)
+    context = assembler.assemble(_results(documents, embeddings), query_embedding=[1.0, 0.5, 0.4, 0.3, 0.2])
+    assert 0 < context.tokens <= 300
+    assert context.candidates == 5
+    assert context.source_ids == [f"S{i}" for i in range(1, len(context.chunk_ids) + 1)]
+    assert context.chunk_ids[0] == "c0"
+    assert len(context.chunk_ids) < 5
+
+
+def test_assemble_skips_a_chunk_too_big_for_what_is_left():
+    documents = [_sentences(6, "gold"), "huge " * 2000, _sentences(2, "copper")]  # no sentence to cut at
+    assembler = ContextAssembler(token_budget=200, min_truncated_tokens=30)
+    context = assembler.assemble(_results(documents, np.eye(3)), query_embedding=[1.0, 0.9, 0.8])
+    assert context.chunk_ids == ["c0", "c2"]
+    assert context.truncated == 0
+
+
+def test_assemble_truncates_the_last_block():
+    documents = [_sentences(10, "gold"), _sentences(40, "silver")]
+    assembler = ContextAssembler(token_budget=250, min_truncated_tokens=20)
+    context = assembler.assemble(_results(documents, np.eye(2)), query_embedding=[1.0, 0.5])
+    assert context.chunk_ids == ["c0", "c1"]
+    assert context.truncated == 1
+    assert context.tokens <= 250
+
+
+def test_without_embeddings_retrieval_order_is_kept():
+    documents = ["First.", "Second.", "Third."]
+    results = QueryResult(ids=["a", "b", "c"], documents=documents, metadatas=[{}, {}, {}], distances=[0.1, 0.2, 0.3])
+    context = ContextAssembler(token_budget=500).assemble(results, query_embedding=[1.0])
+    assert context.chunk_ids == ["a", "b", "c"]
+    assert context.text.startswith("[S1] ")
+
+
+def test_source_name_lists_duplicate_sources():
+    meta = {"file": "planA.txt", "page_start": 1, "page_end": 2, "duplicate_sources": "planB.txt p.1; planA.txt p.1-2"}
+    assert source_name(meta) == "planA.txt p.1-2; also in planB.txt p.1"
+    assert source_name({"url": "https://example.com", "duplicate_sources": ""}) == "https://example.com"
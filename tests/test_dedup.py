@@ -0,0 +1,64 @@
+from src.dedup import ChunkDeduplicator, DuplicateSources, MAX_LISTED_SOURCES, merge_duplicate_sources, source_label
+
+BASE = (
+    "The Gold plan covers primary care visits, specialist visits and urgent care. "
+    "Members pay a copay of 25 dollars for each primary care visit and 50 dollars "
+    "for each specialist visit after the deductible of 2500 dollars has been met in full."
+)
+
+
+def test_exact_duplicates_ignore_case_and_punctuation():
+    dedup = ChunkDeduplicator()
+    assert dedup.check("a", "Add funds with UPI.") is None
+    assert dedup.check("b", "add FUNDS with upi") == "a"
+    assert dedup.removed == {"exact": 1, "near": 0}
+
+
+def test_near_duplicate_with_same_numbers_is_matched():
+    dedup = ChunkDeduplicator(threshold=0.7)
+    assert dedup.check("a", BASE) is None
+    assert dedup.check("b", BASE.replace("in full.", "in full for the year.")) == "a"
+    assert dedup.removed["near"] == 1
+
+
+def test_near_duplicate_with_different_numbers_is_kept():
+    dedup = ChunkDeduplicator(threshold=0.7)
+    assert dedup.check("a", BASE) is None
+    assert dedup.check("b", BASE.replace("2500", "5000")) is None
+    assert dedup.check("c", BASE.replace("25 dollars", "30 dollars")) is None
+
+
+def test_short_chunks_are_only_matched_exactly():
+    dedup = ChunkDeduplicator(min_tokens=20)
+    assert dedup.check("a", "Open an account online today") is None
+    assert dedup.check("b", "Open an account online now") is None
+
+
+def test_unrelated_text_is_not_a_duplicate():
+    dedup = ChunkDeduplicator()
+    assert dedup.check("a", BASE) is None
+    assert dedup.check("b", " ".join(f"unrelated{i}" for i in range(40))) is None
+
+
+def test_source_label_prefers_location():
+    assert source_label({"source": "text", "file": "planA.txt", "page_start": 3}) == "planA.txt p.3"
+    assert source_label({"source": "table", "table_csv": "t.csv", "row_idx": 4}) == "t.csv row 4"
+    assert source_label({"source": "faq", "url": "https://example.com/faq"}) == "https://example.com/faq"
+
+
+def test_duplicate_sources_count_everything_but_list_a_capped_set():
+    duplicates = DuplicateSources()
+    for i in range(MAX_LISTED_SOURCES + 5):
+        duplicates.add({"file": f"f{i % (MAX_LISTED_SOURCES + 2)}.txt"})
+    duplicates.add({"file": "f0.txt"})
+    assert duplicates.count == MAX_LISTED_SOURCES + 6
+    assert len(duplicates.labels) == MAX_LISTED_SOURCES
+
+
+def test_merge_sets_and_clears_duplicate_fields():
+    duplicates = DuplicateSources()
+    duplicates.add({"file": "planB.txt", "page_start": 1})
+    duplicates.add({"file": "planC.txt", "page_start": 1})
+    merged = merge_duplicate_sources({"file": "planA.txt"}, duplicates)
+    assert merged == {"file": "planA.txt", "duplicate_count": 2, "duplicate_sources": "planB.txt p.1; planC.txt p.1"}
+    assert merge_duplicate_sources(merged, None) == {"file": "planA.txt", "duplicate_count": 0, "duplicate_sources": ""}
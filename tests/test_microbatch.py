@@ -0,0 +1,69 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.microbatch import MicroBatcher
+
+
+class Recorder:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def __call__(self, items):
+        with self.lock:
+            self.calls.append(list(items))
+        if self.fail:
+            raise RuntimeError("upstream failed")
+        return [item * 2 for item in items]
+
+
+def test_single_call_returns_its_own_result():
+    fn = Recorder()
+    assert MicroBatcher(fn, window_ms=1)(21) == 42
+    assert fn.calls == [[21]]
+
+
+def test_concurrent_calls_are_batched_and_each_gets_its_result():
+    fn = Recorder()
+    batcher = MicroBatcher(fn, window_ms=50, max_batch=64)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(batcher, range(8)))
+    assert results == [i * 2 for i in range(8)]
+    assert len(fn.calls) < 8
+    assert batcher.stats()["requests"] == 8
+    assert batcher.stats()["mean_batch"] > 1
+
+
+def test_max_batch_caps_the_batch_size():
+    fn = Recorder()
+    batcher = MicroBatcher(fn, window_ms=50, max_batch=3)
+    futures = [batcher.submit(i) for i in range(7)]
+    assert [f.result(timeout=5) for f in futures] == [i * 2 for i in range(7)]
+    assert all(len(call) <= 3 for call in fn.calls)
+
+
+def test_identical_items_are_sent_once():
+    fn = Recorder()
+    batcher = MicroBatcher(fn, window_ms=50)
+    futures = [batcher.submit("a") for _ in range(4)] + [batcher.submit("b")]
+    assert [f.result(timeout=5) for f in futures] == ["aa"] * 4 + ["bb"]
+    assert sorted(item for call in fn.calls for item in call) == ["a", "b"]
+
+
+def test_batch_exception_reaches_every_caller():
+    batcher = MicroBatcher(Recorder(fail=True), window_ms=20)
+    futures = [batcher.submit(i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+
+
+def test_low_traffic_waits_at_most_about_one_window():
+    batcher = MicroBatcher(Recorder(), window_ms=20)
+    start = time.perf_counter()
+    batcher(1)
+    assert time.perf_counter() - start < 1.0
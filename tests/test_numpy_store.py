@@ -0,0 +1,128 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.numpy_store import NumpyVectorStore
+
+
+def _store(path, **kwargs):
+    return NumpyVectorStore("test", str(path), **kwargs)
+
+
+def _add(store, n, dim=4, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim))
+    ids = [f"id{i}" for i in range(n)]
+    store.upsert(
+        ids, [f"doc {i}" for i in range(n)],
+        [{"source": "faq" if i % 2 else "text", "chunk_id": i} for i in range(n)], vectors.tolist()
+    )
+    return ids, vectors
+
+
+def test_query_returns_nearest_with_cosine_distance(tmp_path):
+    store = _store(tmp_path)
+    ids, vectors = _add(store, 8)
+    result = store.query([vectors[3] * 5], 3)[0]
+    assert result.ids[0] == "id3"
+    assert result.distances[0] == pytest.approx(0.0, abs=1e-6)
+    assert result.distances == sorted(result.distances)
+    assert result.documents[0] == "doc 3"
+    assert result.embeddings.shape == (3, 4)
+
+
+def test_query_filters_by_source(tmp_path):
+    store = _store(tmp_path)
+    _, vectors = _add(store, 8)
+    result = store.query([vectors[2]], 8, where={"source": {"$in": ["faq"]}})[0]
+    assert len(result.ids) == 4
+    assert all(meta["source"] == "faq" for meta in result.metadatas)
+
+
+def test_upsert_replaces_existing_id(tmp_path):
+    store = _store(tmp_path)
+    _, vectors = _add(store, 4)
+    store.upsert(["id0"], ["new doc"], [{"source": "text"}], [vectors[1].tolist()])
+    assert store.get(["id0"]) == [("id0", "new doc", {"source": "text"})]
+    assert store.get_existing_ids() == {"id0", "id1", "id2", "id3"}
+
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    store = _store(tmp_path)
+    _add(store, 2, dim=4)
+    with pytest.raises(ValueError):
+        store.upsert(["x"], ["x"], [{}], [[1.0, 2.0]])
+
+
+def test_delete_hides_rows_and_compacts(tmp_path):
+    store = _store(tmp_path)
+    _, vectors = _add(store, 10)
+    store.delete(["id1", "id2"])
+    assert store.generation == 0
+    assert "id1" not in store.query([vectors[1]], 10)[0].ids
+
+    store.delete([f"id{i}" for i in range(3, 8)])
+    assert store.generation == 1
+    assert store._n_rows() == 3
+    assert os.path.exists(store.vectors_path)
+    result = store.query([vectors[8]], 3)[0]
+    assert result.ids[0] == "id8"
+    assert sorted(result.ids) == ["id0", "id8", "id9"]
+    assert np.allclose(store.get(["id9"], include_embeddings=True)[0][3],
+                       vectors[9] / np.linalg.norm(vectors[9]), atol=1e-6)
+
+
+def test_compaction_keeps_previous_file_for_one_generation(tmp_path):
+    store = _store(tmp_path)
+    _add(store, 4)
+    store.delete(["id0", "id1", "id2"])
+    first = store.vectors_path
+    _add(store, 4, seed=1)  # ids id0..id3 again, appended to the compacted file
+    store.delete(["id0", "id1", "id2", "id3"])
+    files = sorted(f for f in os.listdir(store.dir) if f.startswith("vectors"))
+    assert store.generation == 2
+    assert files == sorted([os.path.basename(first), os.path.basename(store.vectors_path)])
+
+
+def test_uncommitted_compaction_file_is_ignored(tmp_path):
+    store = _store(tmp_path)
+    _, vectors = _add(store, 4)
+    # What a crash between writing the next generation and committing it leaves behind
+    with open(os.path.join(store.dir, "vectors.1.bin"), "wb") as f:
+        f.write(np.zeros((2, 4), dtype=np.float32).tobytes())
+    reopened = _store(tmp_path)
+    assert reopened.query([vectors[2]], 1)[0].ids == ["id2"]
+    assert reopened.generation == 0
+
+
+def test_other_handle_sees_writes_after_refresh(tmp_path):
+    writer = _store(tmp_path)
+    reader = _store(tmp_path)  # opened while the store is still empty
+    assert reader.dim is None
+    _, vectors = _add(writer, 10)
+    reader.refresh()
+    assert reader.query([vectors[4]], 1)[0].ids == ["id4"]
+
+    writer.delete([f"id{i}" for i in range(6)])  # compacts into a new generation
+    reader.refresh()
+    assert reader.query([vectors[7]], 1)[0].ids == ["id7"]
+    assert reader.generation == writer.generation == 1
+
+
+def test_reopen_reads_dtype_from_store(tmp_path):
+    store = _store(tmp_path, dtype="float16")
+    _, vectors = _add(store, 4)
+    reopened = _store(tmp_path, dtype="float32")
+    assert reopened.dtype == np.float16
+    assert reopened.query([vectors[0]], 1)[0].ids == ["id0"]
+
+
+def test_reset_removes_everything(tmp_path):
+    store = _store(tmp_path)
+    _add(store, 4)
+    store.delete(["id0", "id1", "id2"])
+    store.reset()
+    assert store.get_existing_ids() == set()
+    assert store.dim is None and store.generation == 0
+    assert not [f for f in os.listdir(store.dir) if f.startswith("vectors")]
+    assert store.query([[1.0, 0.0, 0.0, 0.0]], 3)[0].ids == []
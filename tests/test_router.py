@@ -0,0 +1,74 @@
+import pytest
+
+from src.router import QueryRouter, Route
+
+
+class FakeCentroids:
+    def __init__(self, centroids):
+        self.centroids = centroids
+
+    def get_source_centroids(self):
+        return self.centroids
+
+
+CENTROIDS = {
+    "text": {"centroid": [1.0, 0.0, 0.0]},
+    "faq": {"centroid": [0.0, 1.0, 0.0]},
+    "table": {"centroid": [0.0, 0.0, 1.0]},
+}
+
+
+@pytest.mark.parametrize("query", ["hi", "Hello there!", "good morning team", "namaste"])
+def test_greetings_are_small_talk(query):
+    route = QueryRouter().classify(query)
+    assert route.kind == "chitchat"
+    assert route.reply.startswith("Hello")
+
+
+def test_thanks_and_acknowledgements_get_different_replies():
+    router = QueryRouter()
+    thanks = router.classify("thank you so much")
+    ack = router.classify("ok")
+    assert thanks.kind == ack.kind == "chitchat"
+    assert thanks.reply.startswith("You're welcome")
+    assert not ack.reply.startswith("You're welcome")
+    assert router.classify("Cool!").reply == ack.reply
+
+
+@pytest.mark.parametrize("query", ["hi, how do I add funds?", "ok so what is the deductible", "bye bye policy details"])
+def test_questions_are_retrieved_even_with_small_talk_words(query):
+    assert QueryRouter().classify(query).kind == "retrieve"
+
+
+def test_nearest_source_is_preferred():
+    router = QueryRouter(FakeCentroids(CENTROIDS), margin=0.05, source_routing=True)
+    route = router.route_sources(Route(), [0.1, 0.9, 0.0], "how do I open an account")
+    assert route.sources == ["faq"]
+    assert route.where == {"source": "faq"}
+
+
+def test_sources_within_margin_are_preferred_together():
+    router = QueryRouter(FakeCentroids(CENTROIDS), margin=0.05, source_routing=True)
+    route = router.route_sources(Route(), [0.7, 0.69, 0.0], "account rules")
+    assert route.sources == ["text", "faq"]
+    assert route.where == {"source": {"$in": ["text", "faq"]}}
+
+
+def test_numeric_questions_always_include_tables():
+    router = QueryRouter(FakeCentroids(CENTROIDS), margin=0.05, source_routing=True)
+    route = router.route_sources(Route(), [1.0, 0.0, 0.0], "how much is the copay for a specialist")
+    assert route.sources == ["text", "table"]
+
+
+def test_ambiguous_queries_search_everything():
+    router = QueryRouter(FakeCentroids(CENTROIDS), margin=0.05, source_routing=True)
+    route = router.route_sources(Route(), [1.0, 1.0, 1.0], "plan")
+    assert route.sources == [] and route.where is None
+
+
+def test_routing_can_be_turned_off_or_skipped_without_centroids():
+    query = [0.0, 1.0, 0.0]
+    assert QueryRouter(FakeCentroids(CENTROIDS), source_routing=False).route_sources(Route(), query).where is None
+    assert QueryRouter(FakeCentroids(None), source_routing=True).route_sources(Route(), query).where is None
+    single = QueryRouter(FakeCentroids({"text": CENTROIDS["text"]}), source_routing=True)
+    assert single.route_sources(Route(), query).where is None